@@ -1,5 +1,12 @@
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+class PoolSettings(BaseModel):
+    pool_size: int = 10
+    max_overflow: int = 20
+    pool_timeout: float = 30
+    pool_recycle: int = 1800
+
 class Settings(BaseSettings):
 
     APP_NAME: str
@@ -14,10 +21,55 @@ class Settings(BaseSettings):
     DATABASE_HOST: str
     DATABASE_PORT: str
 
+    # optional streaming replica, same database name and credentials as the primary
+    DATABASE_REPLICA_HOST: str | None = None
+    DATABASE_REPLICA_PORT: str | None = None
+    READ_YOUR_WRITES_SECONDS: float = 10
+    REPLICA_MAX_LAG_SECONDS: float = 5
+    REPLICA_LAG_CHECK_INTERVAL: float = 2
+
+    # connection pool of every engine, by process role (api, mqtt, worker)
+    PROCESS_ROLE: str = "api"
+    DATABASE_POOLS: dict[str, PoolSettings] = {
+        "api": PoolSettings(pool_size=10, max_overflow=20, pool_timeout=30),
+        "mqtt": PoolSettings(pool_size=2, max_overflow=2, pool_timeout=10),
+        "worker": PoolSettings(pool_size=5, max_overflow=5, pool_timeout=30),
+    }
+    POOL_LONG_HOLD_MS: float = 500
+    # X-Query-Count response header, used by the tests to catch N+1 queries
+    QUERY_COUNT_HEADER: bool = False
+    QUERY_PROFILER_ENABLED: bool = False
+    QUERY_PROFILER_SAMPLE_RATE: float = 0.1
+    QUERY_SLOW_MS: float = 200
+
     # SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
     REFRESH_TOKEN_EXPIRE_MINUTES: int
+    TOKEN_CACHE_SIZE: int = 4096
+    PERMISSIONS_CACHE_TTL: int = 300
+    GUEST_CACHE_TTL: int = 300
+
+    PASSWORD_HASH_WORKERS: int = 4
+    SCRYPT_N: int = 16384
+    SCRYPT_R: int = 8
+    SCRYPT_P: int = 1
+
+    USER_IMPORT_CHUNK_SIZE: int = 500
+    PAGINATION_COUNT_CACHE_TTL: int = 30
+    CONTEST_OVERVIEW_CACHE_TTL: float = 10
+    CACHE_TTL: float = 300
+    CACHE_MAX_ENTRIES: int = 2048
+    CACHE_WAIT_TIMEOUT: float = 10
+    # shared cache of all the processes (needs the redis package), in-process when empty
+    CACHE_REDIS_URL: str = ""
+    STATISTICS_RECONCILE_INTERVAL: float = 300
+    STATISTICS_MAX_AGE: int = 60
+
+    BLOB_STORE_PATH: str = "./blobs"
+    TEST_CASE_MAX_BYTES: int = 256 * 1024 * 1024
+    TEST_CASE_ARCHIVE_MAX_BYTES: int = 1024 * 1024 * 1024
+    TEST_CASE_INLINE_BYTES: int = 64 * 1024
 
     RABBITMQ_HOST: str
     RABBITMQ_PORT: int
@@ -27,11 +79,24 @@ class Settings(BaseSettings):
     LOG_LEVEL: str
     LOGGER_URL: str
     CONSOLE_LOG: bool
+    LOG_ERROR_BODY_BYTES: int = 2048
+    LOG_BATCH_SIZE: int = 500
+    LOG_BATCH_INTERVAL: float = 1.0
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_PUSH_TIMEOUT: float = 5.0
+    LOG_RETRY_INTERVAL: float = 30.0
+    LOG_FALLBACK_FILE: str = ""
+    TRACE_OTLP_URL: str = ""
+    TRACE_SAMPLE_RATE: float = 1.0
+    TRACE_MAX_SPANS: int = 200
+    TRACE_EXPORT_INTERVAL: float = 5.0
+    TRACE_QUEUE_SIZE: int = 10000
 
     MQTT_HOST: str
     MQTT_PORT: int
     MQTT_USER: str
     MQTT_PASS: str
+    MQTT_METRICS_PORT: int = 9101
 
     PUBLIC_KEY: str
     PRIVATE_KEY: str
@@ -52,4 +117,25 @@ class Settings(BaseSettings):
     def get_connection_string(self):
         return f"postgresql+psycopg2://{self.DATABASE_USER}:{self.DATABASE_PASSWORD}@{self.DATABASE_HOST}:{self.DATABASE_PORT}/{self.DATABASE_NAME}"
 
+    @property
+    def get_async_connection_string(self):
+        return f"postgresql+asyncpg://{self.DATABASE_USER}:{self.DATABASE_PASSWORD}@{self.DATABASE_HOST}:{self.DATABASE_PORT}/{self.DATABASE_NAME}"
+
+    @property
+    def get_pool_options(self) -> dict:
+        pool = self.DATABASE_POOLS.get(self.PROCESS_ROLE) or PoolSettings()
+        return pool.model_dump()
+
+    @property
+    def get_replica_connection_string(self):
+        if not self.DATABASE_REPLICA_HOST:
+            return None
+        return f"postgresql+psycopg2://{self.DATABASE_USER}:{self.DATABASE_PASSWORD}@{self.DATABASE_REPLICA_HOST}:{self.DATABASE_REPLICA_PORT or self.DATABASE_PORT}/{self.DATABASE_NAME}"
+
+    @property
+    def get_async_replica_connection_string(self):
+        if not self.DATABASE_REPLICA_HOST:
+            return None
+        return f"postgresql+asyncpg://{self.DATABASE_USER}:{self.DATABASE_PASSWORD}@{self.DATABASE_REPLICA_HOST}:{self.DATABASE_REPLICA_PORT or self.DATABASE_PORT}/{self.DATABASE_NAME}"
+
 settings = Settings()
\ No newline at end of file
@@ -1,6 +1,8 @@
 from paho.mqtt.client import Client
 from paho.mqtt.enums import CallbackAPIVersion
 
+from app.util.metrics import MQTT_MESSAGES
+
 class MQTTClient:
     broker: str = None
     port: int = None
@@ -23,6 +25,7 @@ class MQTTClient:
 
     def publish(self, topic, payload):
         self.client.publish(topic, payload)
+        MQTT_MESSAGES.labels(topic=topic).inc()
 
     def start(self):
         self.client.loop_start()
@@ -1,6 +1,9 @@
 import pika
 import json
+from threading import Lock
+from anyio import to_thread
 from app.config import settings
+from app.util.tracing import span
 
 class RabbitMQConnection:
     host: str
@@ -17,6 +20,8 @@ class RabbitMQConnection:
         self.password = password
 
         self.connection = None
+        # the blocking connection is not thread safe, one publish at a time
+        self._lock = Lock()
 
     def try_connection(self):
         if self.connection != None and self.connection.is_open:
@@ -24,11 +29,20 @@ class RabbitMQConnection:
         
         try:
             credentials = pika.PlainCredentials(self.user, self.password) 
-            self.connection = pika.BlockingConnection(pika.ConnectionParameters(host=self.host, port=self.port, credentials=credentials))
+            with span("queue", "connect", host=self.host):
+                self.connection = pika.BlockingConnection(pika.ConnectionParameters(host=self.host, port=self.port, credentials=credentials))
         except Exception as ex:
             print(f'Error while connecting to RabbitMQ: {ex}')
 
-    def try_send_to_queue(self, queue_name: str, body):
+    def try_send_to_queue(self, queue_name: str, body) -> bool:
+        with self._lock:
+            return self._send_to_queue(queue_name, body)
+
+    async def try_send_to_queue_async(self, queue_name: str, body) -> bool:
+        """ Publish from the threadpool, a slow or unreachable broker does not stall the event loop """
+        return await to_thread.run_sync(self.try_send_to_queue, queue_name, body)
+
+    def _send_to_queue(self, queue_name: str, body) -> bool:
         connection_open = True
         if self.connection == None or self.connection.is_closed:
             connection_open = False
@@ -40,14 +54,17 @@ class RabbitMQConnection:
                     break
 
         if not connection_open:
-            return
+            return False
 
         try:
-            channel = self.connection.channel()
-            channel.queue_declare(queue=queue_name, durable=True)
-            channel.basic_publish(exchange='', routing_key=queue_name, body=json.dumps(body))
+            with span("queue", "publish", queue=queue_name):
+                channel = self.connection.channel()
+                channel.queue_declare(queue=queue_name, durable=True)
+                channel.basic_publish(exchange='', routing_key=queue_name, body=json.dumps(body))
+            return True
         except Exception as ex:
             print(f'Error while sending the message to the queue: {ex}')
+            return False
 
 rabbitmq_connection = RabbitMQConnection(
     settings.RABBITMQ_HOST, 
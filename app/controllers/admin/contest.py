@@ -1,7 +1,7 @@
 from fastapi import HTTPException
 from fastapi.responses import JSONResponse
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, Query
 from datetime import datetime
 from typing import List
 from sqlalchemy import or_
@@ -12,6 +12,11 @@ from app.schemas import (ContestCreate, ContestRead, ContestUpdate, ContestListR
     ContestBase, PaginationParams, ContestSubmissionRow, ContestSubmissions,
     SubmissionInfo, TestCaseResult)
 from app.database import get_object_by_id
+from app.util.pagination import Keyset, count_rows
+from app.util.search import Search
+from app.models.loading import CONTEST_SUBMISSION_LIST, SUBMISSION_CODE
+from app.util.cache import cache
+from app.util.statistics import increment
 
 def read(id: int, session: Session) -> ContestRead:
     """
@@ -103,8 +108,10 @@ def create(contest: ContestCreate, session: Session):
             created_contest.contest_problems.append(contest_problem)
 
         session.add(created_contest)
+        increment(session, "contests")
         session.commit()
         session.refresh(created_contest)
+        cache.invalidate("contests")
 
         return created_contest
     
@@ -134,7 +141,9 @@ def delete(id: int, session: Session) -> bool:
             raise HTTPException(status_code=404, detail="Contest not found")
         
         session.delete(contest)
+        increment(session, "contests", -1)
         session.commit()
+        cache.invalidate("contests", f"contest:{id}")
         return True
     
     except SQLAlchemyError as e:
@@ -207,6 +216,7 @@ def update(id: int, contest_update: ContestUpdate, session: Session):
 
         session.commit()
         session.refresh(contest)
+        cache.invalidate("contests", f"contest:{id}")
         # return the update status code
         return JSONResponse(status_code=200, content={"message": "Contest updated successfully"})
 
@@ -223,13 +233,12 @@ def update(id: int, contest_update: ContestUpdate, session: Session):
         session.rollback()
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
-def list(limit : int, offset : int, searchFilter: str, user : User, session : Session) -> ContestListResponse:
+def list(pagination: PaginationParams, user : User, session : Session) -> ContestListResponse:
     """
     List contests
     
     Args:
-        limit: limit in sql query
-        offset: offset in sql query
+        pagination: page size, cursor (or offset), search filter and count mode
         user: User
         session: Session
     
@@ -240,16 +249,20 @@ def list(limit : int, offset : int, searchFilter: str, user : User, session : Se
 
         query = session.query(Contest)
 
-        if searchFilter:
-            query = query.filter(Contest.name.ilike(f"%{searchFilter}%"))
-        query.join(Contest.contest_problems)
-        count = query.count()
-        query = query.limit(limit).offset(offset)
-        contests : List[Contest] = query.all()
+        search = Search(pagination.search_filter, Contest.name) if pagination.search_filter else None
+        if search:
+            query = query.filter(search.clause())
+        count = count_rows(session, query, pagination, None if search else Contest.__tablename__)
+        if search:
+            contests, next_cursor = search.page(query, pagination, Contest.id)
+        else:
+            keyset = Keyset(Contest.id)
+            contests, next_cursor = keyset.page(keyset.apply(query, pagination).all(), pagination)
 
         return ContestListResponse(
             contests=[ContestBase.model_validate(obj=contest) for contest in contests],
-            count=count
+            count=count,
+            next_cursor=next_cursor
         )
         
     except SQLAlchemyError as e:
@@ -259,6 +272,16 @@ def list(limit : int, offset : int, searchFilter: str, user : User, session : Se
     except Exception as e:
         raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
 
+def _contest_submissions_query(id: int, search_filter: str | None, session: Session) -> Query:
+    # join Submission, User, Contest
+    query = session.query(ContestSubmission).filter(ContestSubmission.contest_id == id)
+    query = query.join(Submission).join(Contest).join(User).join(SubmissionResult).options(*CONTEST_SUBMISSION_LIST)
+
+    # usernames and source code, the submissions stay in chronological order
+    if search_filter:
+        query = query.filter(Search(search_filter, User.username, Submission.submitted_code).clause())
+    return query
+
 def get_submissions(id: int, pagination: PaginationParams, session: Session) -> ContestSubmissions:
     """
     Get contest submissions by id
@@ -275,22 +298,14 @@ def get_submissions(id: int, pagination: PaginationParams, session: Session) ->
         if not contest:
             raise HTTPException(status_code=404, detail="Contest not found")
         
-        # join Submission, User, Contest
-        query = session.query(ContestSubmission).filter(ContestSubmission.contest_id == id)
-        query = query.join(Submission).join(Contest).join(User).join(SubmissionResult).order_by(Submission.created_at.desc())
-        count = query.count()
-        
-        if pagination.search_filter:
-            query = query.filter(
-                or_(
-                    User.username.ilike(f"%{pagination.search_filter}%"),
-                    Submission.code.ilike(f"%{pagination.search_filter}%")
-                )
-            )
-        query = query.limit(pagination.limit).offset(pagination.offset)
-        submissions: List[ContestSubmission] = query.all()
+        query = _contest_submissions_query(id, pagination.search_filter, session)
+        count = count_rows(session, query, pagination)
+
+        keyset = Keyset(Submission.created_at, Submission.id, descending=True)
+        submissions, next_cursor = keyset.page(keyset.apply(query, pagination).all(), pagination,
+                                               key=lambda cs: (cs.submission.created_at, cs.submission.id))
         if not submissions:
-            return ContestSubmissions(submissions=[], count=0)
+            return ContestSubmissions(submissions=[], count=0 if count is not None else None)
         contest_submissions = []
         for cs in submissions:
             contest_submissions.append(
@@ -306,7 +321,7 @@ def get_submissions(id: int, pagination: PaginationParams, session: Session) ->
                 )
 
             )
-        return ContestSubmissions(submissions=contest_submissions, count=count)
+        return ContestSubmissions(submissions=contest_submissions, count=count, next_cursor=next_cursor)
         
 
     except SQLAlchemyError as e:
@@ -329,7 +344,7 @@ def get_submission_info(id: int, session: Session) -> SubmissionInfo:
         SubmissionInfo: submission info
     """
     try:
-        submission: Submission = get_object_by_id(Submission, session, id)
+        submission: Submission = get_object_by_id(Submission, session, id, list(SUBMISSION_CODE))
         if not submission:
             raise HTTPException(status_code=404, detail="Submission not found")
         
@@ -5,10 +5,13 @@ from fastapi import HTTPException
 from hashlib import sha256
 from app.models.mapping import User, UserType
 from app.models.role import Role
-from app.schemas import JudgeResponse, JudgeCreate, JudgeListResponse
+from app.schemas import JudgeResponse, JudgeCreate, JudgeListResponse, PaginationParams
+from app.util.pagination import Keyset, count_rows
+from app.util.search import Search
+from app.util.statistics import increment
 
 
-def get_judges(limit : int, offset : int, searchFilter: str, session: Session) -> JudgeListResponse:
+def get_judges(pagination: PaginationParams, session: Session) -> JudgeListResponse:
     """
     Get the judge list
     """
@@ -21,12 +24,17 @@ def get_judges(limit : int, offset : int, searchFilter: str, session: Session) -
             raise HTTPException(status_code=404, detail="Judge role not found")
         
         query = session.query(User).where(User.user_type_id == judge_role.id)
-        if searchFilter:
-            query = query.filter(User.username.ilike(f"%{searchFilter}%"))
+        search = Search(pagination.search_filter, User.username) if pagination.search_filter else None
+        if search:
+            query = query.filter(search.clause())
         
         
-        count = query.count()
-        judges = query.limit(limit).offset(offset).all()
+        count = count_rows(session, query, pagination)
+        if search:
+            judges, next_cursor = search.page(query, pagination, User.id)
+        else:
+            keyset = Keyset(User.id)
+            judges, next_cursor = keyset.page(keyset.apply(query, pagination).all(), pagination)
 
         dto = []
         for judge in judges:
@@ -36,7 +44,7 @@ def get_judges(limit : int, offset : int, searchFilter: str, session: Session) -
                 status = True
             dto.append(JudgeResponse(id=judge.id, name=judge.username, status=status, last_connection=judge.registered_at))
         
-        return JudgeListResponse(judges=dto, count=count)
+        return JudgeListResponse(judges=dto, count=count, next_cursor=next_cursor)
 
     except HTTPException as e:
         raise e
@@ -72,6 +80,7 @@ def create_judge(judge: JudgeCreate, session: Session):
         )
 
         session.add(new_judge)
+        increment(session, "users")
         session.commit()
         return {"message": "Judge added successfully"}, 201
 
@@ -99,6 +108,7 @@ def delete_judge(id: int, session: Session):
 
         # delete the judge
         session.delete(judge)
+        increment(session, "users", -1)
         session.commit()
         
     except SQLAlchemyError as e:
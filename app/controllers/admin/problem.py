@@ -1,23 +1,121 @@
+import os
+import re
+import json
+import zipfile
 from datetime import datetime
-from typing import List
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from typing import AsyncIterator, Dict, List, Tuple
+from anyio import to_thread
+from sqlalchemy import func, insert, select, update as update_statement
+from sqlalchemy.orm import Session, Query, selectinload
 from sqlalchemy.exc import SQLAlchemyError
 from fastapi import HTTPException
-from app.models.mapping import User, Problem, ProblemConstraint, ProblemTestCase, Language
-from app.schemas import ProblemListResponse, ProblemInfo, ProblemCreate, ProblemUpdate, ProblemRead
-from app.database import get_object_by_id
-
+from app.models.mapping import User, Problem, ProblemConstraint, ProblemTestCase, Language, Submission
+from app.schemas import ProblemListResponse, ProblemInfo, ProblemCreate, ProblemUpdate, ProblemRead, PaginationParams
+from app.schemas import ProblemTestCase as ProblemTestCaseDTO, ProblemTestCaseRead, ProblemTestCasesUpload
+from app.database import get_object_by_id, SessionLocal
+from app.util.pagination import Keyset, count_rows
+from app.util.search import Search
+from app.models.loading import PROBLEM_LIST, PROBLEM_DESCRIPTION, TEST_CASE_FILES
+from app.util.cache import cache
+from app.util.statistics import increment
+from app.util.blob_store import Blob, BlobTooLarge, blob_store, digest_of, fill_contents
+from app.config import settings
+
+# <number>.in and <number>.out in the test case archives, in any directory
+_ARCHIVE_FILE = re.compile(r"^(\d+)\.(in|out)$")
+_MANIFEST = "manifest.json"
+_MANIFEST_MAX_BYTES = 1024 * 1024
+
+def _stored_file(content: str | None, digest: str | None, name: str, session: Session) -> Blob:
+    # inline content goes to the blob store (unless already there), a hash must refer to an uploaded blob.
+    # A reused blob is touched, it may be old enough for gcblobs until the commit references it
+    if content is not None:
+        blob = digest_of(content)
+        return blob if blob_store.touch(blob.digest) else blob_store.put_text(content)
+    if not blob_store.touch(digest):
+        # the hash of a file still stored inline (read back from a problem), moved to the store now
+        column = getattr(ProblemTestCase, name)
+        inline = session.scalar(select(column).filter(getattr(ProblemTestCase, f"{name}_hash") == digest, column != None).limit(1))
+        if inline is None:
+            raise HTTPException(status_code=400, detail=f"Unknown {name}_hash {digest}")
+        return blob_store.put_text(inline)
+    return Blob(digest, os.path.getsize(blob_store.path(digest)))
+
+def _test_case_files(test_case_dto: ProblemTestCaseDTO, session: Session) -> dict:
+    """ The columns of the files of a test case, stored as blobs """
+    input_blob = _stored_file(test_case_dto.input, test_case_dto.input_hash, "input", session)
+    output_blob = _stored_file(test_case_dto.output, test_case_dto.output_hash, "output", session)
+    return {
+        "input_hash": input_blob.digest,
+        "input_size": input_blob.size,
+        "output_hash": output_blob.digest,
+        "output_size": output_blob.size,
+    }
+
+def _sync_test_cases(problem: Problem, incoming: List[dict], session: Session) -> bool:
+    """
+    Make the test cases of a problem the incoming ones, matched by number: only the new, changed
+    and removed test cases are written, with one bulk statement each. The files are compared by hash
 
+    Args:
+        problem (Problem): the problem
+        incoming (List[dict]): the columns of the test cases, the files as blobs (see _test_case_files).
+            The notes of an existing test case are left alone when the row has none
+        session (Session): the session
 
-def list_problems(limit: int, offset: int, searchFilter: str, user: User, session: Session) -> ProblemListResponse:
+    Returns:
+        bool: whether something the judges use changed (files, points, pretests, the set of test cases)
+    """
+    numbers = [row["number"] for row in incoming]
+    if len(set(numbers)) != len(numbers):
+        raise HTTPException(status_code=400, detail="Duplicate test case numbers")
+
+    existing = {
+        test_case.number: test_case
+        for test_case in session.scalars(select(ProblemTestCase).filter(ProblemTestCase.problem_id == problem.id))
+    }
+
+    inserts, updates = [], []
+    judged = False
+    for row in incoming:
+        current = existing.pop(row["number"], None)
+        if current is None:
+            inserts.append({"notes": None, **row, "problem_id": problem.id})
+            continue
+
+        changes = {column: row[column] for column in ("points", "is_pretest", "notes") if column in row and getattr(current, column) != row[column]}
+        for kind in ("input", "output"):
+            if getattr(current, f"{kind}_hash") != row[f"{kind}_hash"]:
+                changes.update({kind: None, f"{kind}_hash": row[f"{kind}_hash"], f"{kind}_size": row[f"{kind}_size"]})
+        if changes:
+            judged = judged or set(changes) != {"notes"}
+            updates.append({"id": current.id, **changes})
+
+    deleted_ids = [test_case.id for test_case in existing.values()]
+    if deleted_ids:
+        session.query(ProblemTestCase).filter(ProblemTestCase.id.in_(deleted_ids)).delete(synchronize_session=False)
+    if updates:
+        # bulk UPDATE by primary key, grouped by the set of changed columns
+        session.execute(update_statement(ProblemTestCase), updates)
+    if inserts:
+        session.execute(insert(ProblemTestCase), inserts)
+    session.expire(problem, ["test_cases"])
+
+    return judged or bool(deleted_ids) or bool(inserts)
+
+def _problems_query(search_filter: str | None, session: Session) -> Tuple[Query, Search | None]:
+    query = session.query(Problem).options(*PROBLEM_LIST)
+    search = Search(search_filter, Problem.title, Problem.description) if search_filter else None
+    if search:
+        query = query.filter(search.clause())
+    return query, search
+
+def list_problems(pagination: PaginationParams, user: User, session: Session) -> ProblemListResponse:
     """
     List problems according to visibility with correct counting in SQLAlchemy.
     
     Args:
-        limit (int): Number of problems per page.
-        offset (int): Pagination offset.
-        searchFilter (str): Search keyword.
+        pagination (PaginationParams): Page size, cursor (or offset), search keyword and count mode.
         user (User): Logged-in user.
         session (Session): Database session.
 
@@ -26,14 +124,15 @@ def list_problems(limit: int, offset: int, searchFilter: str, user: User, sessio
     """
 
     try:
-        query = session.query(Problem)
-
-        if searchFilter:
-            query = query.filter(Problem.title.ilike(f"%{searchFilter}%"))
+        query, search = _problems_query(pagination.search_filter, session)
 
-        count = query.count()
+        count = count_rows(session, query, pagination, None if search else Problem.__tablename__)
 
-        problems = query.distinct().limit(limit).offset(offset).all()
+        if search:
+            problems, next_cursor = search.page(query, pagination, Problem.id)
+        else:
+            keyset = Keyset(Problem.id)
+            problems, next_cursor = keyset.page(keyset.apply(query, pagination).all(), pagination)
         
         problem_infos: List[ProblemInfo] = []
 
@@ -50,6 +149,7 @@ def list_problems(limit: int, offset: int, searchFilter: str, user: User, sessio
 
         return ProblemListResponse(
             count=count,
+            next_cursor=next_cursor,
             problems=problem_infos
         )
 
@@ -117,19 +217,20 @@ def create(problemDTO: ProblemCreate, user: User, session: Session):
             # Increment problem version (if this is intended to happen per test case)
             problem.increment_version_number()
             
-            # Create the test case instance. Use getattr to retrieve notes if available.
+            # Create the test case instance
             test_case = ProblemTestCase(
                 number=test_case_number,
-                notes=getattr(test_case_dto, "notes", None),
-                input=test_case_dto.input,
-                output=test_case_dto.output,
+                notes=test_case_dto.notes,
                 points=test_case_points,
                 is_pretest=test_case_dto.is_pretest,
-                problem_id=problem.id
+                problem_id=problem.id,
+                **_test_case_files(test_case_dto, session)
             )
             session.add(test_case)
             test_case_number += 1
 
+        if problem.is_public:
+            increment(session, "problems")
         session.commit()
         return problem
 
@@ -159,8 +260,16 @@ def delete(id: int, session: Session) -> bool:
         if not problem:
             raise HTTPException(status_code=404, detail="Problem not found")
         
+        # its submissions are deleted with it
+        submissions = session.scalar(select(func.count()).select_from(Submission).filter(Submission.problem_id == id))
+        increment(session, "submissions", -submissions)
+        if problem.is_public:
+            increment(session, "problems", -1)
+
         session.delete(problem)
         session.commit()
+        # the problem leaves the contests it was part of
+        cache.invalidate(f"problem:{id}", "problems", "contests")
         return True
     
     except SQLAlchemyError as e:
@@ -182,7 +291,7 @@ def update(id: int, problem_update: ProblemUpdate, session: Session):
         session (Session): SQLAlchemy session
 
     Returns:
-        ProblemUpdate: the updated problem data
+        Problem: the updated problem
     """
     try:
         # Retrieve the problem by id
@@ -209,15 +318,15 @@ def update(id: int, problem_update: ProblemUpdate, session: Session):
                 raise HTTPException(status_code=400, detail="Points cannot be negative")
             problem.points = problem_update.points
         if problem_update.is_public is not None:
+            if problem_update.is_public != problem.is_public:
+                increment(session, "problems", 1 if problem_update.is_public else -1)
             problem.is_public = problem_update.is_public
 
         if problem_update.difficulty is not None:
             problem.difficulty = problem_update.difficulty
 
-        # Increment version for any change
-        problem.increment_version_number()
-
         # --- Update Constraints ---
+        judged_changes = False
         if problem_update.constraints is not None:
             # Keep track of which language_ids were updated
             updated_lang_ids = set()
@@ -229,6 +338,8 @@ def update(id: int, problem_update: ProblemUpdate, session: Session):
                 )
                 if new_constraint:
                     updated_lang_ids.add(new_constraint.language_id)
+                    if (constraint.time_limit, constraint.memory_limit) != (new_constraint.time_limit, new_constraint.memory_limit):
+                        judged_changes = True
                     constraint.time_limit = new_constraint.time_limit
                     constraint.memory_limit = new_constraint.memory_limit
 
@@ -237,6 +348,7 @@ def update(id: int, problem_update: ProblemUpdate, session: Session):
                 c for c in problem_update.constraints if c.language_id not in updated_lang_ids
             ]
             if constraints_to_add:
+                judged_changes = True
                 problem.constraints.extend([
                     ProblemConstraint(
                         language_id=c.language_id,
@@ -246,65 +358,33 @@ def update(id: int, problem_update: ProblemUpdate, session: Session):
                     for c in constraints_to_add
                 ])
 
-        # Delete the saved test cases
-        session.query(ProblemTestCase).filter(ProblemTestCase.problem_id == problem.id).delete()
-
         # --- Update Test Cases ---
         if problem_update.test_cases is not None:
-            # Determine the next test case number from existing test cases.
-            last_test_case = (
-                session.query(ProblemTestCase)
-                .filter(ProblemTestCase.problem_id == problem.id)
-                .order_by(ProblemTestCase.number.desc())
-                .first()
-            )
-            next_test_case_number = last_test_case.number + 1 if last_test_case else 1
-
+            incoming = []
             for test_case_dto in problem_update.test_cases:
                 if test_case_dto.points < 0:
                     raise HTTPException(status_code=400, detail="Points cannot be negative")
-                
-                # If an id is provided, update the existing test case.
-                if getattr(test_case_dto, "id", None):
-                    test_case: ProblemTestCase = get_object_by_id(ProblemTestCase, session, test_case_dto.id)
-                    if not test_case:
-                        raise HTTPException(
-                            status_code=404,
-                            detail=f"Test case with id {test_case_dto.id} not found"
-                        )
-                    if test_case.problem_id != problem.id:
-                        raise HTTPException(
-                            status_code=404,
-                            detail="Problem and test case do not match"
-                        )
-                    
+                row = {
+                    "number": test_case_dto.number,
                     # For pretests, force points to 0.
-                    test_case_points = 0 if test_case_dto.is_pretest else test_case_dto.points
-                    test_case.notes = getattr(test_case_dto, "notes", None)
-                    test_case.input = test_case_dto.input
-                    test_case.output = test_case_dto.output
-                    test_case.points = test_case_points
-                    test_case.is_pretest = test_case_dto.is_pretest
-
-                # Otherwise, create a new test case.
-                else:
-                    test_case_points = 0 if test_case_dto.is_pretest else test_case_dto.points
-                    new_test_case = ProblemTestCase(
-                        number=next_test_case_number,
-                        notes=getattr(test_case_dto, "notes", None),
-                        input=test_case_dto.input,
-                        output=test_case_dto.output,
-                        points=test_case_points,
-                        is_pretest=test_case_dto.is_pretest,
-                        problem_id=problem.id
-                    )
-                    session.add(new_test_case)
-                    next_test_case_number += 1
-
+                    "points": 0 if test_case_dto.is_pretest else test_case_dto.points,
+                    "is_pretest": test_case_dto.is_pretest,
+                    **_test_case_files(test_case_dto, session),
+                }
+                # notes not sent: the stored ones are kept
+                if "notes" in test_case_dto.model_fields_set:
+                    row["notes"] = test_case_dto.notes
+                incoming.append(row)
+            if _sync_test_cases(problem, incoming, session):
+                judged_changes = True
+
+        # the judges download the problem again only when what they run changed
+        if judged_changes:
+            problem.increment_version_number()
         
         session.commit()
-        # Validate and return the updated problem using your DTO validation method.
-        return ProblemUpdate.model_validate(obj=problem)
+        cache.invalidate(f"problem:{id}", "problems")
+        return problem
 
     except SQLAlchemyError as e:
         session.rollback()
@@ -316,25 +396,29 @@ def update(id: int, problem_update: ProblemUpdate, session: Session):
         session.rollback()
         raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
 
-def list_available_languages(session: Session):
+def list_available_languages():
     """
-    List problems according to visibility
-    
-    Args:
-        limit (int):
-        offset (int):
-        user (User):
-        session (Session):
+    List the available languages, cached (tag: languages), computed on the primary
     
     Returns:
-        [ListResponse]: list of problems
+        [dict]: list of languages
     """
 
     try:
-        query = session.query(Language)
-        languages : List[Language] = query.all()
-
-        return languages
+        def compute():
+            session = SessionLocal()
+            try:
+                languages : List[Language] = session.query(Language).all()
+                return [{
+                    "id": language.id,
+                    "name": language.name,
+                    "file_extension": language.file_extension,
+                    "code": language.code
+                } for language in languages]
+            finally:
+                session.close()
+
+        return cache.get_or_compute_sync("languages", compute, tags=["languages"])
     
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail="Database error: " + str(e))
@@ -357,7 +441,10 @@ def read(id: int, user: User, session: Session) -> ProblemRead:
     """
 
     try:
-        problem: Problem = get_object_by_id(Problem, session, id)
+        problem: Problem = get_object_by_id(Problem, session, id, [
+            *PROBLEM_DESCRIPTION,
+            selectinload(Problem.test_cases).options(*TEST_CASE_FILES),
+        ])
         if not problem:
             raise HTTPException(status_code=404, detail="Problem not found")
 
@@ -365,7 +452,9 @@ def read(id: int, user: User, session: Session) -> ProblemRead:
         constraints : List[ProblemConstraint] = query.all()
         problem.constraints = constraints
 
-        return ProblemRead.model_validate(obj=problem)
+        problem_dto = ProblemRead.model_validate(obj=problem)
+        fill_contents(problem_dto.test_cases)
+        return problem_dto
     
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail="Database error: " + str(e))
@@ -373,3 +462,136 @@ def read(id: int, user: User, session: Session) -> ProblemRead:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
+
+def _extract_archive(path: str) -> Tuple[Dict[int, Dict[str, Blob]], dict]:
+    """
+    Store the files of a test case archive in the blob store, one member at a time
+
+    Returns:
+        Tuple[Dict[int, Dict[str, Blob]], dict]: the blobs by test case number ("in", "out"), and the manifest
+    """
+    files: Dict[int, Dict[str, Blob]] = {}
+    manifest = {}
+    try:
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                name = os.path.basename(info.filename)
+                if info.is_dir() or info.filename.startswith("__MACOSX/") or name.startswith("."):
+                    continue
+
+                if name == _MANIFEST:
+                    if info.file_size > _MANIFEST_MAX_BYTES:
+                        raise HTTPException(status_code=400, detail="The manifest is too large")
+                    manifest = json.loads(archive.read(info))
+                    if not isinstance(manifest, dict):
+                        raise HTTPException(status_code=400, detail="The manifest must be an object by test case number")
+                    continue
+
+                match = _ARCHIVE_FILE.match(name)
+                if not match:
+                    raise HTTPException(status_code=400, detail=f"Unexpected file {info.filename}, expected <number>.in and <number>.out")
+                number, kind = int(match.group(1)), match.group(2)
+                if kind in files.get(number, {}):
+                    raise HTTPException(status_code=400, detail=f"Duplicate file {name}")
+
+                # the declared size can lie, the store checks the actual bytes
+                with archive.open(info) as member:
+                    files.setdefault(number, {})[kind] = blob_store.put_file(member)
+
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Invalid zip archive")
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid manifest: {e.msg}")
+
+    for number, blobs in files.items():
+        if len(blobs) != 2:
+            raise HTTPException(status_code=400, detail=f"Test case {number} needs both {number}.in and {number}.out")
+    if not files:
+        raise HTTPException(status_code=400, detail="The archive has no test cases")
+    return files, manifest
+
+def _load_test_cases(id: int, session: Session) -> Tuple[Problem, Dict[int, ProblemTestCase]]:
+    """ The problem and its current test cases by number (blocking) """
+    problem: Problem = get_object_by_id(Problem, session, id)
+    if not problem:
+        raise HTTPException(status_code=404, detail="Problem not found")
+
+    return problem, {test_case.number: test_case for test_case in problem.test_cases}
+
+def _save_test_cases(problem: Problem, rows: List[dict], session: Session) -> int:
+    """
+    Write the test cases and commit (blocking)
+
+    Returns:
+        int: the config version number of the problem
+    """
+    # uploading the same archive again changes nothing
+    if _sync_test_cases(problem, rows, session):
+        problem.increment_version_number()
+    session.commit()
+    return problem.config_version_number
+
+async def upload_test_cases(id: int, chunks: AsyncIterator[bytes], session: Session) -> ProblemTestCasesUpload:
+    """
+    Replace the test cases of a problem with the ones of a streamed zip archive: <number>.in and
+    <number>.out files, and an optional manifest.json with the points, is_pretest and notes by
+    number (a test case without an entry keeps the ones of the same number, if any).
+    The archive is spooled to disk and its files are streamed to the blob store, the session
+    is only used from the threadpool
+
+    Args:
+        id (int): the problem id
+        chunks (AsyncIterator[bytes]): the request body
+        session (Session): the session
+
+    Returns:
+        ProblemTestCasesUpload: the new test cases and the version of the problem
+    """
+    try:
+        problem, existing = await to_thread.run_sync(_load_test_cases, id, session)
+
+        path = await blob_store.spool(chunks, settings.TEST_CASE_ARCHIVE_MAX_BYTES)
+        try:
+            files, manifest = await to_thread.run_sync(_extract_archive, path)
+        finally:
+            os.unlink(path)
+
+        rows = []
+        for number in sorted(files):
+            entry = manifest.get(str(number), {})
+            if not isinstance(entry, dict):
+                raise HTTPException(status_code=400, detail=f"Invalid manifest entry for test case {number}")
+            previous = existing.get(number)
+            is_pretest = bool(entry.get("is_pretest", previous.is_pretest if previous else False))
+            points = entry.get("points", previous.points if previous else 0)
+            if not isinstance(points, int) or points < 0:
+                raise HTTPException(status_code=400, detail=f"Invalid points for test case {number}")
+            rows.append({
+                "number": number,
+                "notes": entry.get("notes", previous.notes if previous else None),
+                "points": 0 if is_pretest else points,
+                "is_pretest": is_pretest,
+                "input_hash": files[number]["in"].digest,
+                "input_size": files[number]["in"].size,
+                "output_hash": files[number]["out"].digest,
+                "output_size": files[number]["out"].size,
+            })
+
+        config_version_number = await to_thread.run_sync(_save_test_cases, problem, rows, session)
+        cache.invalidate(f"problem:{id}", "problems")
+
+        test_cases = [ProblemTestCaseRead.model_validate(obj=row) for row in rows]
+        return ProblemTestCasesUpload(config_version_number=config_version_number, test_cases=test_cases)
+
+    except BlobTooLarge as e:
+        await to_thread.run_sync(session.rollback)
+        raise HTTPException(status_code=413, detail=str(e))
+    except SQLAlchemyError as e:
+        await to_thread.run_sync(session.rollback)
+        raise HTTPException(status_code=500, detail="Database error: " + str(e))
+    except HTTPException as e:
+        await to_thread.run_sync(session.rollback)
+        raise e
+    except Exception as e:
+        await to_thread.run_sync(session.rollback)
+        raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
@@ -1,19 +1,28 @@
+import asyncio
 from datetime import datetime
-from typing import List
+from anyio import to_thread
+from typing import AsyncIterator, List, Tuple
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy.exc import SQLAlchemyError
-from app.models.mapping import User, UserType
+from sqlalchemy import func, insert, or_, select
+from sqlalchemy.orm import Session, Query
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from app.config import settings
+from app.models.mapping import User, UserType, Contest, ContestUser
 from app.schemas import UserCreate, UserResponse, UserUpdate
-from app.util.pwd import _hash_password
+from app.util.pwd import password_hasher
 from app.database import get_object_by_id
 from app.models.role import Role
 from app.util.role_checker import RoleChecker
-from app.schemas import PaginationParams, UserListResponse
-from app.models.mapping import User, UserType
+from app.util.guest import refresh_guest_principal
+from app.util.upload import ParsedRow
+from app.util.pagination import Keyset, count_rows
+from app.util.search import Search
+from app.util.cache import cache
+from app.util.statistics import increment
+from app.schemas import PaginationParams, UserListResponse, UserImportError, UserImportResponse
 
 
-def create_user(user: UserCreate, session: Session) -> UserResponse:
+async def create_user(user: UserCreate, session: Session) -> UserResponse:
     """
     create a new user
 
@@ -29,7 +38,7 @@ def create_user(user: UserCreate, session: Session) -> UserResponse:
         if not user_type:
             raise HTTPException(status_code=404, detail="User type not found")
         
-        hash, salt = _hash_password(user.password)
+        hash, salt = await password_hasher.hash(user.password)
         user = User(
             username=user.username,
             password_hash=hash,
@@ -38,6 +47,7 @@ def create_user(user: UserCreate, session: Session) -> UserResponse:
             user_type_id=user.user_type_id
         )
         session.add(user)
+        increment(session, "users")
         session.commit()
         return user
     
@@ -126,6 +136,13 @@ def available_user_types_list(session: Session) -> List[UserType]:
         raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
     
 
+def _users_query(search_filter: str | None, excluded_type_ids: List[int], session: Session) -> Tuple[Query, Search | None]:
+    query = session.query(User).filter(User.deletion_date == None, User.user_type_id.notin_(excluded_type_ids))
+    search = Search(search_filter, User.username) if search_filter else None
+    if search:
+        query = query.filter(search.clause())
+    return query, search
+
 def list_user(pagination: PaginationParams, session: Session) -> UserListResponse:
     """
     List all users
@@ -149,13 +166,15 @@ def list_user(pagination: PaginationParams, session: Session) -> UserListRespons
         if not guest_type:
             raise HTTPException(status_code=500, detail="Guest user type not found")
         
-        builder = session.query(User).filter(User.deletion_date == None, User.user_type_id != judge_type.id, User.user_type_id != guest_type.id)
-        if pagination.search_filter:
-            builder = builder.filter(User.username.ilike(f"%{pagination.search_filter}%"))
-        users: List[User] = builder.limit(pagination.limit).offset(pagination.offset).all()
-        count = builder.count()
+        builder, search = _users_query(pagination.search_filter, [judge_type.id, guest_type.id], session)
+        if search:
+            users, next_cursor = search.page(builder, pagination, User.id)
+        else:
+            keyset = Keyset(User.id)
+            users, next_cursor = keyset.page(keyset.apply(builder, pagination).all(), pagination)
+        count = count_rows(session, builder, pagination)
 
-        return UserListResponse(users=[UserResponse.model_validate(obj=obj) for obj in users], count=count)
+        return UserListResponse(users=[UserResponse.model_validate(obj=obj) for obj in users], count=count, next_cursor=next_cursor)
     
 
     except SQLAlchemyError as e:
@@ -189,11 +208,18 @@ def update_user(id: int, updated_user: UserUpdate, session: Session) -> UserResp
         if not user_type:
             raise HTTPException(status_code=404, detail="User type not found")
 
+        was_guest = user.user_type.permissions == Role.GUEST
+
         user.username = updated_user.username
         user.email = updated_user.email
         user.user_type_id = updated_user.user_type_id
 
         session.commit()
+
+        # keep the cached guest principal in sync
+        if was_guest or user_type.permissions == Role.GUEST:
+            refresh_guest_principal(session)
+
         return UserUpdate.model_validate(obj=user)
     
     except SQLAlchemyError as e:
@@ -206,3 +232,188 @@ def update_user(id: int, updated_user: UserUpdate, session: Session) -> UserResp
         raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
 
 
+def _parse_import_row(data: dict) -> Tuple[dict | None, str | None]:
+    username = str(data.get("username") or "").strip()
+    email = str(data.get("email") or "").strip()
+    password = str(data.get("password") or "")
+
+    if not username:
+        return None, "Missing username"
+    if not email or "@" not in email:
+        return None, "Invalid email"
+    if not password:
+        return None, "Missing password"
+
+    return {"username": username, "email": email, "password": password}, None
+
+def _check_import_chunk(chunk: List[Tuple[int, dict]], session: Session, errors: List[UserImportError]) -> List[Tuple[int, dict]]:
+    """
+    Validate a chunk of rows against the existing users with a single query (blocking)
+
+    Returns:
+        List[Tuple[int, dict]]: the rows that can be inserted
+    """
+    usernames = [candidate["username"].lower() for _, candidate in chunk]
+    emails = [candidate["email"].lower() for _, candidate in chunk]
+
+    existing = session.execute(
+        select(func.lower(User.username), func.lower(User.email))
+        .where(or_(func.lower(User.username).in_(usernames), func.lower(User.email).in_(emails)))
+    ).all()
+    taken_usernames = {username for username, _ in existing}
+    taken_emails = {email for _, email in existing}
+
+    valid: List[Tuple[int, dict]] = []
+    for row_number, candidate in chunk:
+        if candidate["username"].lower() in taken_usernames:
+            errors.append(UserImportError(row=row_number, username=candidate["username"], detail="Username already exists"))
+        elif candidate["email"].lower() in taken_emails:
+            errors.append(UserImportError(row=row_number, username=candidate["username"], detail="Email already exists"))
+        else:
+            valid.append((row_number, candidate))
+
+    return valid
+
+def _insert_import_chunk(valid: List[Tuple[int, dict]], values: List[dict], contest_id: int | None, session: Session, errors: List[UserImportError]) -> Tuple[int, int]:
+    """
+    Insert the users of a chunk in one statement (blocking)
+
+    Returns:
+        Tuple[int, int]: the number of created users and contest registrations
+    """
+    try:
+        user_ids = session.scalars(insert(User).returning(User.id, sort_by_parameter_order=True), values).all()
+        if contest_id is not None:
+            session.execute(insert(ContestUser), [{"contest_id": contest_id, "user_id": user_id} for user_id in user_ids])
+        increment(session, "users", len(user_ids))
+        session.commit()
+        return len(user_ids), len(user_ids) if contest_id is not None else 0
+
+    except IntegrityError:
+        # a concurrent insert won the race, fall back to one savepoint per row to find the culprits
+        session.rollback()
+
+    created = 0
+    for (row_number, candidate), value in zip(valid, values):
+        try:
+            with session.begin_nested():
+                user_id = session.scalar(insert(User).values(**value).returning(User.id))
+                if contest_id is not None:
+                    session.execute(insert(ContestUser).values(contest_id=contest_id, user_id=user_id))
+            created += 1
+        except IntegrityError:
+            errors.append(UserImportError(row=row_number, username=candidate["username"], detail="Username or email already exists"))
+    increment(session, "users", created)
+    session.commit()
+
+    return created, created if contest_id is not None else 0
+
+async def _import_chunk(chunk: List[Tuple[int, dict]], user_type_id: int, contest_id: int | None, session: Session, errors: List[UserImportError]) -> Tuple[int, int]:
+    """
+    Validate a chunk of rows, hash the passwords in parallel and insert the users.
+    The session is only used from the threadpool, one step at a time
+
+    Returns:
+        Tuple[int, int]: the number of created users and contest registrations
+    """
+    valid = await to_thread.run_sync(_check_import_chunk, chunk, session, errors)
+    if not valid:
+        return 0, 0
+
+    hashes = await asyncio.gather(*(password_hasher.hash(candidate["password"]) for _, candidate in valid))
+    values = [
+        {
+            "username": candidate["username"],
+            "email": candidate["email"],
+            "password_hash": password_hash,
+            "salt": salt,
+            "user_type_id": user_type_id
+        }
+        for (_, candidate), (password_hash, salt) in zip(valid, hashes)
+    ]
+
+    return await to_thread.run_sync(_insert_import_chunk, valid, values, contest_id, session, errors)
+
+def _import_user_type(user_type_id: int | None, contest_id: int | None, session: Session) -> int:
+    if user_type_id is None:
+        user_type = session.query(UserType).filter(UserType.permissions == Role.USER).one_or_none()
+    else:
+        user_type = session.query(UserType).filter(UserType.id == user_type_id).one_or_none()
+    if not user_type:
+        raise HTTPException(status_code=404, detail="User type not found")
+
+    if contest_id is not None and not get_object_by_id(Contest, session, contest_id):
+        raise HTTPException(status_code=404, detail="Contest not found")
+
+    return user_type.id
+
+async def import_users(rows: AsyncIterator[ParsedRow], user_type_id: int | None, contest_id: int | None, session: Session) -> UserImportResponse:
+    """
+    Bulk import users from a streamed upload, optionally registering them to a contest.
+    Invalid rows are reported and skipped without aborting the import
+
+    Args:
+        rows (AsyncIterator[ParsedRow]): the parsed rows of the upload
+        user_type_id (int): the user type of the imported users, the registered user type if not given
+        contest_id (int): an optional contest to register the users to
+        session (Session): the session
+
+    Returns:
+        UserImportResponse: the import report
+    """
+    try:
+        import_type_id = await to_thread.run_sync(_import_user_type, user_type_id, contest_id, session)
+
+        created = 0
+        registered = 0
+        errors: List[UserImportError] = []
+        seen_usernames = set()
+        seen_emails = set()
+        chunk: List[Tuple[int, dict]] = []
+
+        async for row_number, data, error in rows:
+            if error:
+                errors.append(UserImportError(row=row_number, detail=error))
+                continue
+
+            candidate, error = _parse_import_row(data)
+            if error:
+                username = data.get("username")
+                errors.append(UserImportError(row=row_number, username=str(username) if username is not None else None, detail=error))
+                continue
+
+            # duplicates inside the upload itself
+            if candidate["username"].lower() in seen_usernames:
+                errors.append(UserImportError(row=row_number, username=candidate["username"], detail="Duplicate username in the upload"))
+                continue
+            if candidate["email"].lower() in seen_emails:
+                errors.append(UserImportError(row=row_number, username=candidate["username"], detail="Duplicate email in the upload"))
+                continue
+            seen_usernames.add(candidate["username"].lower())
+            seen_emails.add(candidate["email"].lower())
+
+            chunk.append((row_number, candidate))
+            if len(chunk) >= settings.USER_IMPORT_CHUNK_SIZE:
+                chunk_created, chunk_registered = await _import_chunk(chunk, import_type_id, contest_id, session, errors)
+                created += chunk_created
+                registered += chunk_registered
+                chunk = []
+
+        if chunk:
+            chunk_created, chunk_registered = await _import_chunk(chunk, import_type_id, contest_id, session, errors)
+            created += chunk_created
+            registered += chunk_registered
+
+        if registered:
+            cache.invalidate("contests", f"contest:{contest_id}")
+
+        return UserImportResponse(created=created, registered=registered, errors=errors)
+
+    except SQLAlchemyError as e:
+        await to_thread.run_sync(session.rollback)
+        raise HTTPException(status_code=500, detail="Database error: " + str(e))
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        await to_thread.run_sync(session.rollback)
+        raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
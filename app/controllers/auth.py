@@ -15,11 +15,12 @@ from app.schemas import (
 )
 from app.models.mapping import User
 from app.util.jwt import get_tokens
-from app.util.pwd import _hash_password
+from app.util.pwd import password_hasher
+from app.util.statistics import increment
 from app.util.mail import MailSender
 from app.config import settings
 
-def login(user_login: LoginRequest, session: Session):
+async def login(user_login: LoginRequest, session: Session):
     try:
         user_db = session.query(User).filter(
             (func.lower(User.username) == func.lower(user_login.username)) |
@@ -31,11 +32,17 @@ def login(user_login: LoginRequest, session: Session):
         
         if user_db.deletion_date is not None:
             raise HTTPException(status_code=404, detail="User not found")
-        password_hash, _ = _hash_password(password=user_login.password, salt=bytes.fromhex(user_db.salt))
+        valid, needs_rehash = await password_hasher.verify(user_login.password, user_db.password_hash, user_db.salt)
 
-        if password_hash != user_db.password_hash:
+        if not valid:
             raise HTTPException(status_code=401, detail="Invalid password")
 
+        # transparently upgrade legacy (or outdated cost) hashes, except the judge ones:
+        # get_judge matches the stored sha256("name:key") verbatim
+        if needs_rehash and user_db.salt and user_db.user_type.permissions != Role.JUDGE:
+            user_db.password_hash, user_db.salt = await password_hasher.hash(user_login.password)
+            session.commit()
+
         return LoginResponse.model_validate(
             get_tokens(user_db.id, user_db.username, user_db.user_type.permissions)
         )
@@ -88,7 +95,7 @@ def reset_password(data: ResetPasswordRequest, session: Session):
         session.rollback()
         raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
 
-def change_reset_password(data: ChangeResetPasswordRequest, session: Session):
+async def change_reset_password(data: ChangeResetPasswordRequest, session: Session):
     try:
         user_db = session.query(User).filter(User.reset_password_token == data.token).one_or_none()
 
@@ -98,7 +105,7 @@ def change_reset_password(data: ChangeResetPasswordRequest, session: Session):
         if user_db.reset_password_token_expiration < datetime.now():
             raise HTTPException(status_code=400, detail="Token expired")
         
-        password_hash, salt = _hash_password(password=data.password)
+        password_hash, salt = await password_hasher.hash(data.password)
         user_db.password_hash = password_hash
         user_db.salt = salt
         user_db.reset_password_token = None
@@ -152,6 +159,7 @@ def create_github_user(user_json: dict, session: Session):
                 user_type_id=user_type.id
             )
             session.add(user_db)
+            increment(session, "users")
             session.commit()
         
         else:
@@ -193,11 +201,11 @@ def change_pwd(body: ChangePasswordRequest, user: User, session: Session):
             raise HTTPException(status_code=422, detail="Unprocessable Entity (you need to specify the old password)")
         # check the password only if the user has a password set
         elif user.password_hash != '':
-            password_hash, _ = _hash_password(password=body.old_password, salt=bytes.fromhex(user.salt))
-            if password_hash != user.password_hash:
+            valid, _ = password_hasher.verify_sync(body.old_password, user.password_hash, user.salt)
+            if not valid:
                 raise HTTPException(status_code=401, detail="Invalid password")
 
-        password_hash, salt = _hash_password(password=body.new_password)
+        password_hash, salt = password_hasher.hash_sync(body.new_password)
         user.password_hash = password_hash
         user.salt = salt
         session.commit()
@@ -1,14 +1,20 @@
 from datetime import datetime
 from fastapi.responses import JSONResponse
-from sqlalchemy import and_, func, or_
+from sqlalchemy import and_, func, literal, or_, select, union_all, Select
 from sqlalchemy.orm import Session, aliased
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 from fastapi import HTTPException
 from typing import List
 
+from app.config import settings
 from app.models.role import Role
 from app.util.role_checker import RoleChecker
-from app.database import get_object_by_id
+from app.util.replica import replica_router
+from app.util.cache import cache
+from app.util.metrics import SCOREBOARD_DURATION
+from app.models.loading import PROBLEM_SUMMARY
+from app.database import get_object_by_id, get_object_by_id_async, in_own_session
 from app.models.mapping import User, ContestUser, Contest
 from app.models.mapping import Problem, ContestProblem, ProblemConstraint, Language
 from app.models.mapping import Submission, ContestSubmission, SubmissionTestCase
@@ -18,46 +24,62 @@ from app.schemas import (
     ProblemInfo, PastContest, UpcomingContest
 )
 
+def _scoreboard_statement(id: int) -> Select:
+    cs = aliased(ContestSubmission)
+    s = aliased(Submission)
+    stc = aliased(SubmissionTestCase)
+    c = aliased(Contest)
+    u = aliased(User)
+
+    return select(
+        s.user_id,
+        u.username,
+        s.problem_id,
+        func.max(s.score).label("max_score"))\
+        .join(cs, cs.submission_id == s.id)\
+        .join(c, c.id == cs.contest_id)\
+        .join(stc, stc.submission_id == s.id)\
+        .join(u, u.id == s.user_id)\
+        .filter(c.id == id)\
+        .filter(s.is_pretest_run == False)\
+        .group_by(s.user_id, u.username, s.problem_id)\
+        .order_by(s.user_id, s.problem_id)
+
+def _build_scoreboard(result) -> Scoreboard:
+    # create a list of problems resolved by each user and the total score
+    user_scores = {}
+    for user_id, username, problem_id, max_score in result:
+        if username not in user_scores:
+            user_scores[username] = {
+                "user_id": user_id,
+                "problems": {},
+                "total_score": 0
+            }
+        user_scores[username]["problems"][problem_id] = max_score
+        user_scores[username]["total_score"] += max_score
+    # sort the users by total score
+    sorted_user_scores = sorted(user_scores.values(), key=lambda x: x["total_score"], reverse=True)
+
+    # create the scoreboard
+    return Scoreboard(rankings=sorted_user_scores)
+
 def get_scoreboard(id: int, session: Session) -> Scoreboard:
+    """ Synchronous scoreboard, used outside of the request handlers (e.g. the mqtt publisher) """
     try:
-        cs = aliased(ContestSubmission)
-        s = aliased(Submission)
-        stc = aliased(SubmissionTestCase)
-        c = aliased(Contest)
-        u = aliased(User)
-
-        result = session.query(
-            s.user_id,
-            u.username,
-            s.problem_id,
-            func.max(s.score).label("max_score"))\
-            .join(cs, cs.submission_id == s.id)\
-            .join(c, c.id == cs.contest_id)\
-            .join(stc, stc.submission_id == s.id)\
-            .join(u, u.id == s.user_id)\
-            .filter(c.id == id)\
-            .filter(s.is_pretest_run == False)\
-            .group_by(s.user_id, u.username, s.problem_id)\
-            .order_by(s.user_id, s.problem_id)\
-            .all()
-        
-        # create a list of problems resolved by each user and the total score
-        user_scores = {}
-        for user_id, username, problem_id, max_score in result:
-            if username not in user_scores:
-                user_scores[username] = {
-                    "user_id": user_id,
-                    "problems": {},
-                    "total_score": 0
-                }
-            user_scores[username]["problems"][problem_id] = max_score
-            user_scores[username]["total_score"] += max_score
-        # sort the users by total score
-        sorted_user_scores = sorted(user_scores.values(), key=lambda x: x["total_score"], reverse=True)
-
-        # create the scoreboard
-        return Scoreboard(rankings=sorted_user_scores)
+        with SCOREBOARD_DURATION.time():
+            return _build_scoreboard(session.execute(_scoreboard_statement(id)).all())
 
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=500, detail="Database error: " + str(e))
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
+
+async def get_scoreboard_async(id: int, session: AsyncSession) -> Scoreboard:
+    try:
+        with SCOREBOARD_DURATION.time():
+            return _build_scoreboard((await session.execute(_scoreboard_statement(id))).all())
 
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail="Database error: " + str(e))
@@ -112,40 +134,105 @@ def list_problems(id: int, user: User, session: Session) -> ContestListResponse:
     except Exception as e:
         raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
 
-def get_contest_info(session: Session, contests: List[Contest]) -> List[ContestInfo]:
-    """Helper function to fetch contest details"""
-    result = []
-    for contest in contests:
-        problems_count = session.query(ContestProblem).filter(ContestProblem.contest_id == contest.id).count()
-        users_count = session.query(ContestUser).filter(ContestUser.contest_id == contest.id).count()
-        submissions_count = session.query(ContestSubmission).filter(ContestSubmission.contest_id == contest.id).count()
-
-        result.append(ContestInfo(
-            id=contest.id,
-            name=contest.name,
-            description=contest.description,
-            start_datetime=contest.start_datetime,
-            end_datetime=contest.end_datetime,
-            duration=int((contest.end_datetime - contest.start_datetime).total_seconds() / 3600),
-            n_problems=problems_count,
-            n_participants=users_count,
-            n_submissions=submissions_count
-        ))
-    return result
-
-def list_with_info(session: Session) -> ContestInfos:
-    """List contests with additional data"""
+async def _count(session: AsyncSession, model, contest_id: int) -> int:
+    return await session.scalar(select(func.count()).select_from(model).filter(model.contest_id == contest_id))
+
+async def _problem_languages(session: AsyncSession, problem_ids: List[int]) -> dict[int, List[str]]:
+    rows = (await session.execute(
+        select(ProblemConstraint.problem_id, Language.name)
+        .join(Language, ProblemConstraint.language_id == Language.id)
+        .filter(ProblemConstraint.problem_id.in_(problem_ids))
+    )).all()
+
+    languages = {}
+    for problem_id, language_name in rows:
+        if problem_id not in languages:
+            languages[problem_id] = []
+        languages[problem_id].append(language_name)
+    return languages
+
+async def _contest_users(session: AsyncSession, contest_id: int) -> List[ContestUserInfo]:
+    # only the columns of ContestUserInfo, not the whole users
+    rows = (await session.execute(
+        select(User.id, User.username)
+        .join(ContestUser, ContestUser.user_id == User.id)
+        .filter(ContestUser.contest_id == contest_id)
+    )).all()
+    return [ContestUserInfo(id=user_id, username=username) for user_id, username in rows]
+
+# contests listed per status in the overview
+_OVERVIEW_SIZE = 5
+
+def _ttl_until(ttl: float, moments: List[datetime]) -> float:
+    # a cached page expires when a contest on it starts or ends
+    future = [(moment - datetime.now()).total_seconds() for moment in moments]
+    return max(min([ttl] + future), 0)
+
+def _overview_statement(now: datetime) -> Select:
+    public = Contest.is_public == True
+    listed = union_all(
+        select(Contest.id, literal("ongoing").label("status"))
+            .filter(public, Contest.start_datetime <= now, Contest.end_datetime > now)
+            .order_by(Contest.end_datetime).limit(_OVERVIEW_SIZE),
+        select(Contest.id, literal("past").label("status"))
+            .filter(public, Contest.end_datetime <= now)
+            .order_by(Contest.end_datetime.desc()).limit(_OVERVIEW_SIZE),
+        select(Contest.id, literal("upcoming").label("status"))
+            .filter(public, Contest.start_datetime > now)
+            .order_by(Contest.start_datetime).limit(_OVERVIEW_SIZE),
+    ).cte("listed")
+
+    # one grouped count per table, restricted to the listed contests
+    def grouped_count(model):
+        return select(model.contest_id, func.count().label("n"))\
+            .filter(model.contest_id.in_(select(listed.c.id)))\
+            .group_by(model.contest_id).subquery()
+
+    problems = grouped_count(ContestProblem)
+    users = grouped_count(ContestUser)
+    submissions = grouped_count(ContestSubmission)
+
+    return select(
+        Contest.id, Contest.name, Contest.description, Contest.start_datetime, Contest.end_datetime,
+        listed.c.status,
+        func.coalesce(problems.c.n, 0).label("n_problems"),
+        func.coalesce(users.c.n, 0).label("n_participants"),
+        func.coalesce(submissions.c.n, 0).label("n_submissions"),
+    ).join(listed, listed.c.id == Contest.id)\
+        .outerjoin(problems, problems.c.contest_id == Contest.id)\
+        .outerjoin(users, users.c.contest_id == Contest.id)\
+        .outerjoin(submissions, submissions.c.contest_id == Contest.id)
+
+async def list_with_info() -> ContestInfos:
+    """List contests with additional data, cached for CONTEST_OVERVIEW_CACHE_TTL seconds (tag: contests)"""
+    def ttl(overview: ContestInfos) -> float:
+        return _ttl_until(settings.CONTEST_OVERVIEW_CACHE_TTL,
+                          [contest.end_datetime for contest in overview.ongoing] + [contest.start_datetime for contest in overview.upcoming])
+
+    return await cache.get_or_compute("contests:overview", in_own_session(_contest_overview), tags=["contests"], ttl=ttl)
+
+async def _contest_overview(session: AsyncSession) -> ContestInfos:
     try:
         now = datetime.now()
-        ongoing_contests = session.query(Contest).filter(Contest.start_datetime <= now, Contest.end_datetime > now, Contest.is_public == True).limit(5).all()
-        past_contests = session.query(Contest).filter(Contest.end_datetime <= now, Contest.is_public == True).limit(5).all()
-        upcoming_contests = session.query(Contest).filter(Contest.start_datetime > now, Contest.is_public == True).limit(5).all()
-
-        return ContestInfos(
-            ongoing=get_contest_info(session, ongoing_contests),
-            past=get_contest_info(session, past_contests),
-            upcoming=get_contest_info(session, upcoming_contests)
-        )
+        rows = (await session.execute(_overview_statement(now))).all()
+
+        contests = {"ongoing": [], "past": [], "upcoming": []}
+        for row in rows:
+            contests[row.status].append(ContestInfo(
+                id=row.id,
+                name=row.name,
+                description=row.description,
+                start_datetime=row.start_datetime,
+                end_datetime=row.end_datetime,
+                duration=int((row.end_datetime - row.start_datetime).total_seconds() / 3600),
+                n_problems=row.n_problems,
+                n_participants=row.n_participants,
+                n_submissions=row.n_submissions
+            ))
+        contests["ongoing"].sort(key=lambda contest: contest.end_datetime)
+        contests["past"].sort(key=lambda contest: contest.end_datetime, reverse=True)
+        contests["upcoming"].sort(key=lambda contest: contest.start_datetime)
+        return ContestInfos(**contests)
     
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -154,33 +241,29 @@ def list_with_info(session: Session) -> ContestInfos:
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
-def read_past(id: int, session: Session):
+async def read_past(id: int):
     """
-    Return a past contest by id
+    Return a past contest by id, cached (tags: contest:{id}, problems)
 
     Args:
         id: int
-        session: Session
 
     Returns:
         contest: PastContest
     """
+    return await cache.get_or_compute(f"contest:{id}:past", in_own_session(lambda session: _read_past(id, session)), tags=[f"contest:{id}", "problems"])
+
+async def _read_past(id: int, session: AsyncSession) -> PastContest:
     try:
-        contest = session.query(Contest).filter(Contest.id == id).first()
+        contest = await get_object_by_id_async(Contest, session, id)
         if not contest:
             raise HTTPException(status_code=404, detail="Contest not found")
         # check if it is a past contest
         if contest.end_datetime > datetime.now():
             raise HTTPException(status_code=400, detail="Contest is not yet finished")
         
-        problems = session.query(Problem).join(ContestProblem, Problem.id == ContestProblem.problem_id).filter(ContestProblem.contest_id == id).all()
-        problem_languages = session.query(ProblemConstraint).join(Language, ProblemConstraint.language_id == Language.id).filter(ProblemConstraint.problem_id.in_([problem.id for problem in problems])).all()
-
-        languages = {}
-        for problem_language in problem_languages:
-            if problem_language.problem_id not in languages:
-                languages[problem_language.problem_id] = []
-            languages[problem_language.problem_id].append(problem_language.language_name)
+        problems = (await session.scalars(select(Problem).options(*PROBLEM_SUMMARY).join(ContestProblem, Problem.id == ContestProblem.problem_id).filter(ContestProblem.contest_id == id))).all()
+        languages = await _problem_languages(session, [problem.id for problem in problems])
         
         problems_info = []
         for problem in problems:
@@ -190,11 +273,11 @@ def read_past(id: int, session: Session):
                 languages=languages[problem.id]
             ))
             
-        user_infos = [ContestUserInfo.model_validate(obj=user) for user in contest.users]
+        user_infos = await _contest_users(session, id)
 
-        number_of_submissions = session.query(ContestSubmission).filter(ContestSubmission.contest_id == id).count()
+        number_of_submissions = await _count(session, ContestSubmission, id)
 
-        scoreboard = get_scoreboard(id, session)
+        scoreboard = await get_scoreboard_async(id, session)
 
         return PastContest(
             id=contest.id,
@@ -216,34 +299,30 @@ def read_past(id: int, session: Session):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
-def read_upcoming(id: int, session: Session) -> UpcomingContest:
+async def read_upcoming(id: int) -> UpcomingContest:
     """
-    Return an upcoming contest by id
+    Return an upcoming contest by id, cached until it starts (tags: contest:{id}, problems)
 
     Args:
         id: int
-        session: Session
 
     Returns:
         contest: ContestRead
     """
+    return await cache.get_or_compute(f"contest:{id}:upcoming", in_own_session(lambda session: _read_upcoming(id, session)), tags=[f"contest:{id}", "problems"],
+                                      ttl=lambda contest: _ttl_until(cache.ttl, [contest.start_datetime]))
+
+async def _read_upcoming(id: int, session: AsyncSession) -> UpcomingContest:
     try:
-        contest = session.query(Contest).filter(Contest.id == id).first()
+        contest = await get_object_by_id_async(Contest, session, id)
         if not contest:
             raise HTTPException(status_code=404, detail="Contest not found")
         # check if it is an upcoming contest
         if contest.start_datetime < datetime.now():
             raise HTTPException(status_code=400, detail="Contest has already started")
         
-        problems = session.query(Problem).join(ContestProblem, Problem.id == ContestProblem.problem_id).filter(ContestProblem.contest_id == id).all()
-        problem_languages = session.query(ProblemConstraint).join(Language, ProblemConstraint.language_id == Language.id).filter(ProblemConstraint.problem_id.in_([problem.id for problem in problems])).all()
-
-        languages = {}
-        
-        for problem_language in problem_languages:
-            if problem_language.problem_id not in languages:
-                languages[problem_language.problem_id] = []
-            languages[problem_language.problem_id].append(problem_language.language_name)
+        problems = (await session.scalars(select(Problem).options(*PROBLEM_SUMMARY).join(ContestProblem, Problem.id == ContestProblem.problem_id).filter(ContestProblem.contest_id == id))).all()
+        languages = await _problem_languages(session, [problem.id for problem in problems])
         
         problems_info = [ProblemInfo(title=problem.title, points=problem.points, languages=languages[problem.id]) for problem in problems]
 
@@ -254,7 +333,7 @@ def read_upcoming(id: int, session: Session) -> UpcomingContest:
             start_datetime=contest.start_datetime,
             end_datetime=contest.end_datetime,
             duration=int((contest.end_datetime - contest.start_datetime).total_seconds() / 3600),
-            n_participants=len(contest.users),
+            n_participants=await _count(session, ContestUser, id),
             n_problems=len(problems),
             problems=problems_info,
             is_registration_open=contest.is_registration_open
@@ -267,25 +346,26 @@ def read_upcoming(id: int, session: Session) -> UpcomingContest:
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
     
-def read_ongoing(id: int, user: User, session: Session):
+async def read_ongoing(id: int, user: User, session: AsyncSession):
     """
     Return an ongoing contest by id
 
     Args:
         id: int
         user: User
-        session: Session
+        session: AsyncSession
 
     Returns:
         contest: ContestRead
     """
     try:
-        contest = session.query(Contest).filter(Contest.id == id).first()
+        contest = await get_object_by_id_async(Contest, session, id)
         if not contest:
             raise HTTPException(status_code=404, detail="Contest not found")
         
-        # check if user is registered to the contest
-        if user not in contest.users:
+        # check if user is registered to the contest (the user is loaded by the authentication session)
+        user_infos = await _contest_users(session, id)
+        if user.id not in [contest_user.id for contest_user in user_infos]:
             raise HTTPException(status_code=400, detail="User is not registered to the contest")
         
         # check if it is an ongoing contest
@@ -295,28 +375,18 @@ def read_ongoing(id: int, user: User, session: Session):
         now = datetime.now()
 
         # get all problems that has publication delay minor than the time passed since the start of the contest
-        problems = session.query(Problem).join(ContestProblem, Problem.id == ContestProblem.problem_id).filter(
+        problems = (await session.scalars(select(Problem).options(*PROBLEM_SUMMARY).join(ContestProblem, Problem.id == ContestProblem.problem_id).filter(
             ContestProblem.contest_id == id,
             ContestProblem.publication_delay <= (now - contest.start_datetime).total_seconds() / 60
-        ).order_by(ContestProblem.publication_delay, Problem.title).all()
+        ).order_by(ContestProblem.publication_delay, Problem.title))).all()
 
-        # problems = session.query(Problem).join(ContestProblem, Problem.id == ContestProblem.problem_id).filter(ContestProblem.contest_id == id).all()
-        problem_languages = session.query(ProblemConstraint).join(Language, ProblemConstraint.language_id == Language.id).filter(ProblemConstraint.problem_id.in_([problem.id for problem in problems])).all()
-
-        languages = {}
-        
-        for problem_language in problem_languages:
-            if problem_language.problem_id not in languages:
-                languages[problem_language.problem_id] = []
-            languages[problem_language.problem_id].append(problem_language.language_name)
+        languages = await _problem_languages(session, [problem.id for problem in problems])
         
         problems_info = [ProblemInfo(id=problem.id, title=problem.title, points=problem.points, languages=languages[problem.id], difficulty=problem.difficulty) for problem in problems]
 
-        user_infos = [ContestUserInfo.model_validate(obj=user) for user in contest.users]
-
-        number_of_submissions = session.query(ContestSubmission).filter(ContestSubmission.contest_id == id).count()
+        number_of_submissions = await _count(session, ContestSubmission, id)
 
-        scoreboard = get_scoreboard(id, session)
+        scoreboard = await get_scoreboard_async(id, session)
 
         return PastContest(
             id=contest.id,
@@ -369,6 +439,8 @@ def register_to_contest(contest_id: int, user: User, session: Session):
         contest_user = ContestUser(contest_id=contest_id, user_id=user.id)
         session.add(contest_user)
         session.commit()
+        replica_router.mark_write(user.id)
+        cache.invalidate("contests", f"contest:{contest_id}")
 
         return JSONResponse(status_code=200, content={"message": "User registered to contest successfully"})
     
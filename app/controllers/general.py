@@ -1,27 +1,21 @@
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models.mapping import Contest, Problem, Submission, User
 from app.schemas.general import Statistics
+from app.util.statistics import read_statistics
 
-def get_dashboard_stats(session: Session):
+async def get_dashboard_stats(session: AsyncSession):
     """
-    Get dashboard statistics
+    Get dashboard statistics, read from the counters (see app/util/statistics.py)
     """
     try:
-        users = session.query(User).count()
-
-        problems = session.query(Problem).filter(Problem.is_public == True).count()
-
-        contests = session.query(Contest).count()
-
-        submissions = session.query(Submission).count()
+        statistics = await read_statistics(session)
 
         return Statistics(
-            users=users,
-            problems=problems,
-            contests=contests,
-            submissions=submissions
+            users=statistics["users"],
+            problems=statistics["problems"],
+            contests=statistics["contests"],
+            submissions=statistics["submissions"]
         )
     except Exception as e:
-        raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
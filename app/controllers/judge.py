@@ -1,31 +1,51 @@
 from fastapi import HTTPException
 from hashlib import sha256
+from anyio import to_thread
+from sqlalchemy import select, update, Select
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import selectinload, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from app.models.mapping import Problem, User, UserType
 from app.database import get_object_by_id_joined_with
 from app.models.role import Role
-from app.models.mapping import Submission, SubmissionResult, SubmissionTestCase, SubmissionTestCase, ProblemTestCase
+from app.models.mapping import Submission, SubmissionResult, SubmissionTestCase, SubmissionTestCase, ProblemTestCase, ProblemConstraint
+from app.models.mapping import ContestSubmission
 from app.schemas import SubmissionCompleteResult, JudgeProblem, Constraint, TestCase, SubmissionTestCaseResult, WSResult
-from app.database import get_object_by_id
+from app.database import get_object_by_id_async
 from app.util.websocket import websocket_manager
+from app.util.replica import replica_router
+from app.util.cache import cache
+from app.models.loading import TEST_CASE_FILES
+from app.util.blob_store import blob_store, fill_contents
+from app.config import settings
+from app.util.metrics import SUBMISSION_QUEUE_LAG, VERDICT_LATENCY, VERDICTS, seconds_since
+
+def _test_case_id_statement(problem_id: int, number: int) -> Select:
+    return select(ProblemTestCase.id).filter(ProblemTestCase.problem_id == problem_id, ProblemTestCase.number == number)
+
+def _submission_test_cases_statement(submission_id: int) -> Select:
+    return select(SubmissionTestCase).filter(SubmissionTestCase.submission_id == submission_id)
 
 #regiorn Judge
 
-def get_versions(session: Session, judge: User):
+async def _touch_judge(session: AsyncSession, judge: User):
+    # the judge is loaded by the authentication session, update it by id
+    await session.execute(update(User).where(User.id == judge.id).values(registered_at=datetime.now()))
+    await session.commit()
+
+async def get_versions(session: AsyncSession, judge: User):
     """
     Get the problem versions
     """
 
     try:
-        problems = session.query(Problem).all()
+        problems = (await session.execute(select(Problem.id, Problem.config_version_number))).all()
         response = {}
-        for problem in problems:
-            response[problem.id] = problem.config_version_number
+        for problem_id, config_version_number in problems:
+            response[problem_id] = config_version_number
 
-        judge.registered_at = datetime.now()
-        session.commit()
+        await _touch_judge(session, judge)
 
         return response
         
@@ -36,17 +56,21 @@ def get_versions(session: Session, judge: User):
     except Exception as e:
         raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
     
-def get_problem_info(id: int, session: Session, judge: User):
+async def get_problem_info(id: int, session: AsyncSession, judge: User, blobs: bool = False):
     """
     Get the problem configuration
     
     Args:
         id: int
+        blobs: bool (the judge downloads the files above TEST_CASE_INLINE_BYTES by hash,
+            otherwise every file is inline as in the first protocol)
     """
 
     try:
-        # problem: Problem = get_object_by_id_joined_with(Problem, session, id, [Problem.constraints])
-        problem: Problem = get_object_by_id(Problem, session, id)
+        problem: Problem = await get_object_by_id_async(Problem, session, id, [
+            selectinload(Problem.constraints).joinedload(ProblemConstraint.language),
+            selectinload(Problem.test_cases).options(*TEST_CASE_FILES)
+        ])
 
         if not problem:
             raise HTTPException(status_code=404, detail="Problem not found")
@@ -65,9 +89,10 @@ def get_problem_info(id: int, session: Session, judge: User):
             )
         # problem_dto.constraints = [Constraint.model_validate(obj=constraint) for constraint in problem.constraints]
         problem_dto.test_cases = [TestCase.model_validate(obj=test_case) for test_case in problem.test_cases]
+        max_bytes = settings.TEST_CASE_INLINE_BYTES if blobs else None
+        await to_thread.run_sync(fill_contents, problem_dto.test_cases, max_bytes)
 
-        judge.registered_at = datetime.now()
-        session.commit()
+        await _touch_judge(session, judge)
         
         return problem_dto
     
@@ -78,28 +103,42 @@ def get_problem_info(id: int, session: Session, judge: User):
     except Exception as e:
         raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
 
-async def accept(submission_id: int, submission_test_case: SubmissionTestCaseResult, session: Session):
+def get_blob_path(digest: str) -> str:
+    """
+    The file of a test case blob, for the ones too large to be inlined in the problem configuration
+
+    Args:
+        digest: str
+    """
+    if not blob_store.exists(digest):
+        raise HTTPException(status_code=404, detail="Blob not found")
+    return blob_store.path(digest)
+
+async def accept(submission_id: int, submission_test_case: SubmissionTestCaseResult, session: AsyncSession):
     try:
         # check if the submission exists
-        submission: Submission = get_object_by_id(Submission, session, submission_id)
+        submission: Submission = await get_object_by_id_async(Submission, session, submission_id)
         if not submission:
             raise HTTPException(status_code=400, detail="Submission not found")
         
-        result: SubmissionResult = get_object_by_id(SubmissionResult, session, submission_test_case.result_id)
+        result: SubmissionResult = await get_object_by_id_async(SubmissionResult, session, submission_test_case.result_id)
 
         if not result:
             raise HTTPException(status_code=400, detail="Result not found")
 
 
-        test_case = session.query(ProblemTestCase).filter(ProblemTestCase.problem_id == submission.problem_id, ProblemTestCase.number == submission_test_case.number).first()
+        test_case = (await session.scalars(_test_case_id_statement(submission.problem_id, submission_test_case.number))).first()
         if not test_case:
             raise HTTPException(status_code=400, detail="Test case not found")
+
+        # the first result tells how long the submission waited for a judge
+        if submission_test_case.number == 1:
+            SUBMISSION_QUEUE_LAG.observe(seconds_since(submission.created_at))
         
         if not submission_test_case.is_pretest_run:
             submission_test_case_db = SubmissionTestCase(
-                submission=submission,
-                result=result,
-                result_id=submission_test_case.result_id,
+                submission_id=submission.id,
+                result_id=result.id,
                 number=submission_test_case.number,
                 notes=submission_test_case.notes,
                 memory=submission_test_case.memory,
@@ -107,7 +146,7 @@ async def accept(submission_id: int, submission_test_case: SubmissionTestCaseRes
             )
 
             session.add(submission_test_case_db)
-            session.commit()
+            await session.commit()
 
         tmp = submission_test_case.model_dump()
         tmp["type"] = "partial"
@@ -116,30 +155,30 @@ async def accept(submission_id: int, submission_test_case: SubmissionTestCaseRes
         await websocket_manager.send_message(submission.user_id, ws_message.model_dump())
 
     except SQLAlchemyError as e:
-        session.rollback()
+        await session.rollback()
         raise e
     except HTTPException as e:
         raise e
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         raise e
 
-async def save_total(submission_id: int, result: SubmissionCompleteResult, session: Session):
+async def save_total(submission_id: int, result: SubmissionCompleteResult, session: AsyncSession):
     try:
         # check if the submission exists
-        submission: Submission = get_object_by_id(Submission, session, submission_id)
+        submission: Submission = await get_object_by_id_async(Submission, session, submission_id)
         if not submission:
             raise HTTPException(status_code=400, detail="Submission not found")
         if result.stderr != "":
             submission.notes = result.stderr
         
-        submission_result: SubmissionResult = get_object_by_id(SubmissionResult, session, result.result_id)
+        submission_result: SubmissionResult = await get_object_by_id_async(SubmissionResult, session, result.result_id)
         if not submission_result:
             raise HTTPException(status_code=400, detail="Result not found")
 
-        sub_test_cases = session.query(SubmissionTestCase).filter(SubmissionTestCase.submission_id == submission_id).all()
+        sub_test_cases = (await session.scalars(_submission_test_cases_statement(submission_id))).all()
 
-        problem_test_cases = session.query(ProblemTestCase).filter(ProblemTestCase.problem_id == submission.problem_id).all()
+        problem_test_cases = (await session.scalars(select(ProblemTestCase).filter(ProblemTestCase.problem_id == submission.problem_id))).all()
 
         # calculate the total score of the submission
         total_score = 0
@@ -152,16 +191,23 @@ async def save_total(submission_id: int, result: SubmissionCompleteResult, sessi
 
         submission.score = total_score
         submission.submission_result_id = submission_result.id
-
-        session.commit()
+        contest_ids = (await session.scalars(select(ContestSubmission.contest_id).filter(ContestSubmission.submission_id == submission_id))).all()
+
+        await session.commit()
+        await replica_router.mark_write_async(submission.user_id)
+        # the cached contest pages hold the scoreboard
+        if contest_ids:
+            cache.invalidate(*(f"contest:{contest_id}" for contest_id in contest_ids))
+        VERDICT_LATENCY.observe(seconds_since(submission.created_at))
+        VERDICTS.labels(result=submission_result.code).inc()
         
         await websocket_manager.send_message(submission.user_id, {"type": "total", "submission_id": submission.id, "score": total_score, "result": submission.notes, 'is_pretest_run': submission.is_pretest_run})
 
     except SQLAlchemyError as e:
-        session.rollback()
+        await session.rollback()
         raise e
     except HTTPException as e:
         raise e
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         raise e
@@ -1,16 +1,29 @@
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, Query
 from sqlalchemy import func
 from sqlalchemy.exc import SQLAlchemyError
 from fastapi import HTTPException
-from typing import List
+from typing import List, Tuple
 
-from app.database import get_object_by_id
+from app.database import get_object_by_id, SessionLocal
 from app.models.mapping.contest import Contest
 from app.schemas import ProblemListResponse
 from app.schemas import PaginationParams
 from app.models.mapping import User, Problem, ProblemConstraint, ProblemTestCase, ContestProblem
 from app.schemas.problem import ProblemRead
+from app.util.blob_store import fill_contents
+from app.util.pagination import Keyset, count_rows
+from app.util.search import Search
+from app.models.loading import PROBLEM_LIST, PROBLEM_DESCRIPTION, TEST_CASE_FILES
+from app.util.cache import cache
+
+def _visible_problems_query(search_filter: str | None, session: Session) -> Tuple[Query, Search | None]:
+    # only the problems with at least one language
+    query = session.query(Problem).options(*PROBLEM_LIST).filter(Problem.is_public == True, Problem.constraints.any())
+    search = Search(search_filter, Problem.title, Problem.description) if search_filter else None
+    if search:
+        query = query.filter(search.clause())
+    return query, search
 
 def list_visible_problems(pagination: PaginationParams, session: Session) -> ProblemListResponse:
     """
@@ -20,19 +33,16 @@ def list_visible_problems(pagination: PaginationParams, session: Session) -> Pro
         ProblemListResponse: problems
     """
     try:
-        query = session.query(Problem).filter(Problem.is_public == True)
-        # apply search filter
-        if pagination.search_filter:
-            query = query.filter(Problem.title.ilike(f"%{pagination.search_filter}%"))
+        query, search = _visible_problems_query(pagination.search_filter, session)
 
-        # get total count        
-        count = query.count()
-        # apply pagination
-        query = query.join(Problem.constraints)
-        query = query.join(ProblemConstraint.language)
-        query = query.order_by(Problem.id).offset(pagination.offset).limit(pagination.limit)
-
-        problems = query.all()
+        # get total count
+        count = count_rows(session, query, pagination)
+        # apply pagination, best matches first when searching
+        if search:
+            problems, next_cursor = search.page(query, pagination, Problem.id)
+        else:
+            keyset = Keyset(Problem.id)
+            problems, next_cursor = keyset.page(keyset.apply(query, pagination).all(), pagination)
 
         problems_info = []
         for problem in problems:
@@ -45,57 +55,39 @@ def list_visible_problems(pagination: PaginationParams, session: Session) -> Pro
                 "is_public": problem.is_public
             })
 
-        return ProblemListResponse(problems=problems_info, count=count)
+        return ProblemListResponse(problems=problems_info, count=count, next_cursor=next_cursor)
     
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
     
 
-def read(id: int, user: User, session: Session) -> ProblemRead:
+def read(id: int, user: User) -> ProblemRead:
     """
-    Get problem by id according to visibility
+    Get problem by id according to visibility, cached (tags: problem:{id}, contests)
 
     Args:
         id (int):
         user (User):
-        session (Session):
 
     Returns:
         ProblemDTO: problem
     """
 
     try:
-        problem: Problem = get_object_by_id(Problem, session, id)
-        if not problem:
-            raise HTTPException(status_code=404, detail="Problem not found")
-        
+        problem, contest_windows = cache.get_or_compute_sync(f"problem:{id}", lambda: _load_on_primary(id), tags=[f"problem:{id}", "contests"])
+
         # check if the problem is in an active contest and the publication delay is not met
         now = datetime.now()
-        contest_problem = session.query(ContestProblem).join(Contest).filter(
-            ContestProblem.problem_id == problem.id,
-            Contest.is_public == True,
-            Contest.start_datetime <= now,
-            Contest.end_datetime >= now,
-        ).first()
-
-        # ContestProblem.publication_delay <= (now - Contest.start_datetime).total_seconds() / 60
-        if contest_problem and contest_problem.publication_delay > 0:
-            if contest_problem.contest.start_datetime + timedelta(minutes=contest_problem.publication_delay) > now:
-                raise HTTPException(status_code=403, detail="Problem is in an active contest and not yet visible")
-
+        for start_datetime, end_datetime, publication_delay in contest_windows:
+            if start_datetime <= now <= end_datetime and publication_delay > 0:
+                if start_datetime + timedelta(minutes=publication_delay) > now:
+                    raise HTTPException(status_code=403, detail="Problem is in an active contest and not yet visible")
 
-        query = session.query(ProblemConstraint).filter(ProblemConstraint.problem_id == problem.id)
-        constraints : List[ProblemConstraint] = query.all()
-        problem.constraints = constraints
-
-        visible_test_cases = session.query(ProblemTestCase).filter(ProblemTestCase.problem_id == problem.id, ProblemTestCase.is_pretest == True).all()
-        problem.test_cases = visible_test_cases
-
-        query = session.query(ProblemTestCase)
-
-        return ProblemRead.model_validate(obj=problem)
+        return problem
     
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail="Database error: " + str(e))
@@ -103,3 +95,32 @@ def read(id: int, user: User, session: Session) -> ProblemRead:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
+
+def _load_on_primary(id: int) -> Tuple[ProblemRead, List[tuple]]:
+    # cached values are computed on the primary, a lagging replica would cache the state before an invalidation
+    session = SessionLocal()
+    try:
+        return _load(id, session)
+    finally:
+        session.close()
+
+def _load(id: int, session: Session) -> Tuple[ProblemRead, List[tuple]]:
+    # the problem with its visible test cases, and the public contests it is part of (visibility is checked per request)
+    problem: Problem = get_object_by_id(Problem, session, id, list(PROBLEM_DESCRIPTION))
+    if not problem:
+        raise HTTPException(status_code=404, detail="Problem not found")
+
+    contest_windows = session.query(Contest.start_datetime, Contest.end_datetime, ContestProblem.publication_delay)\
+        .join(ContestProblem, ContestProblem.contest_id == Contest.id)\
+        .filter(ContestProblem.problem_id == problem.id, Contest.is_public == True).all()
+
+    query = session.query(ProblemConstraint).filter(ProblemConstraint.problem_id == problem.id)
+    constraints : List[ProblemConstraint] = query.all()
+    problem.constraints = constraints
+
+    visible_test_cases = session.query(ProblemTestCase).options(*TEST_CASE_FILES).filter(ProblemTestCase.problem_id == problem.id, ProblemTestCase.is_pretest == True).all()
+    problem.test_cases = visible_test_cases
+
+    problem_dto = ProblemRead.model_validate(obj=problem)
+    fill_contents(problem_dto.test_cases)
+    return problem_dto, [tuple(window) for window in contest_windows]
@@ -1,30 +1,54 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select, Select
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 from fastapi import HTTPException
 from datetime import datetime, timedelta
 from typing import List
 
-from app.database import get_object_by_id, get_object_by_id_joined_with
+from app.database import get_object_by_id_async, in_own_session
 from app.models.mapping import Submission, User, Problem, Language, Contest
 from app.models.mapping import ContestSubmission, ContestProblem, SubmissionResult
 from app.connections.rabbitmq import rabbitmq_connection
+from app.util.replica import replica_router
+from app.util.cache import cache
+from app.util.statistics import increment_async
+from app.util.metrics import SUBMISSIONS
+from app.util.pagination import Keyset, count_rows_async
+from app.models.loading import SUBMISSION_CODE
 from app.schemas import SubmissionCreate, ProblemSubmissions, PaginationParams, SubmissionResponse
 
-def create(submission_in: SubmissionCreate, session: Session, user: User):
+# newest first, the id breaks the ties between submissions sent in the same instant
+_SUBMISSION_KEYSET = Keyset(Submission.created_at, Submission.id, descending=True)
+
+def _contests_of_problem_statement(problem_id: int) -> Select:
+    return select(Contest).join(ContestProblem).filter(ContestProblem.problem_id == problem_id)
+
+def _recent_submissions_statement(user_id: int, since: datetime) -> Select:
+    return select(func.count(Submission.id)).filter(Submission.user_id == user_id,
+                                                    Submission.created_at >= since,
+                                                    Submission.is_pretest_run == False)
+
+def _problem_submissions_statement(problem_id: int, user_id: int) -> Select:
+    return select(Submission).filter(Submission.problem_id == problem_id,
+                                     Submission.user_id == user_id,
+                                     Submission.submission_result_id != None,
+                                     Submission.is_pretest_run == False)
+
+async def create(submission_in: SubmissionCreate, session: AsyncSession, user: User):
     """
     Create a submission
 
     Args:
         submission (SubmissionCreate): The submission data
-        session (Session): The database session
+        session (AsyncSession): The database session
     
     Returns:
         created (bool): Whether the submission was created
     """
     
     try:        
-        language: Language = session.query(Language).filter(Language.id == submission_in.language_id).first()
-        _validate_submission(submission_in, session, user)
+        language: Language = await _validate_submission(submission_in, session, user)
 
         # TO CHANGE: force is_pretest_run to False (for now)
         submission_in.is_pretest_run = False
@@ -39,8 +63,8 @@ def create(submission_in: SubmissionCreate, session: Session, user: User):
             is_pretest_run=submission_in.is_pretest_run
         )
         session.add(submission)
-        session.commit()
-        session.refresh(submission)
+        await increment_async(session, "submissions")
+        await session.commit()
 
         # create the contest submission
         if submission_in.contest_id:
@@ -50,37 +74,43 @@ def create(submission_in: SubmissionCreate, session: Session, user: User):
             )
             session.add(contest_submission)
 
-        session.commit()
+        await session.commit()
+        # the user reads their own submission (and the scoreboard) from the primary for a while
+        await replica_router.mark_write_async(user.id)
+        if submission_in.contest_id:
+            cache.invalidate("contests", f"contest:{submission_in.contest_id}")
 
         body = {
-            'code' : submission.submitted_code,
+            # the code is deferred, not reloaded after the commit
+            'code' : submission_in.submitted_code,
             'problem_id' : submission.problem_id,
-            'language' : submission.language.name.strip(),
+            'language' : language.name.strip(),
             'submission_id' : submission.id,
             'is_pretest_run' : submission.is_pretest_run,
         }
         # send the submission to the queue
-        rabbitmq_connection.try_send_to_queue('submissions', body)
+        queued = await rabbitmq_connection.try_send_to_queue_async('submissions', body)
+        SUBMISSIONS.labels(queued=str(queued).lower()).inc()
 
         return True
     
     except SQLAlchemyError as e:
-        session.rollback()
+        await session.rollback()
         raise e
     except HTTPException as e:
         raise e
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         raise e
 
-def _validate_submission(submission_dto: SubmissionCreate, session: Session, user: User):
+async def _validate_submission(submission_dto: SubmissionCreate, session: AsyncSession, user: User) -> Language:
     # check if the problem exists
-    problem: Problem = get_object_by_id(Problem, session, submission_dto.problem_id)
+    problem: Problem = await get_object_by_id_async(Problem, session, submission_dto.problem_id, [selectinload(Problem.constraints)])
     if not problem:
         raise HTTPException(status_code=400, detail="Problem not found")
     
     # check if the language exists
-    language: Language = session.query(Language).filter(Language.id == submission_dto.language_id).first()
+    language: Language = await get_object_by_id_async(Language, session, submission_dto.language_id)
     if not language:
         raise HTTPException(status_code=400, detail="Language not found")
     
@@ -89,7 +119,7 @@ def _validate_submission(submission_dto: SubmissionCreate, session: Session, use
         raise HTTPException(status_code=400, detail="Language not supported by problem")
     
     # check if the problem is in a contest and if the contest is active
-    contests = session.query(Contest).join(ContestProblem).filter(ContestProblem.problem_id == problem.id).all()
+    contests = (await session.scalars(_contests_of_problem_statement(problem.id))).all()
     
     # if at least one contest is active, the problem is in a contest
     there_are_active_contests = False
@@ -101,7 +131,7 @@ def _validate_submission(submission_dto: SubmissionCreate, session: Session, use
 
     if submission_dto.contest_id and there_are_active_contests:
         # check if the contest exists
-        contest: Contest = get_object_by_id_joined_with(Contest, session, submission_dto.contest_id, [Contest.problems, Contest.users])
+        contest: Contest = await get_object_by_id_async(Contest, session, submission_dto.contest_id, [selectinload(Contest.problems), selectinload(Contest.users)])
         if not contest:
             raise HTTPException(status_code=400, detail="Contest not found")
         
@@ -110,13 +140,13 @@ def _validate_submission(submission_dto: SubmissionCreate, session: Session, use
             raise HTTPException(status_code=400, detail="Problem not in contest")
         
         # check if problem has been published
-        contest_problem : ContestProblem = session.query(ContestProblem).filter(ContestProblem.contest_id == contest.id,
-                                                                                ContestProblem.problem_id == problem.id).first()
-        if not contest_problem or contest_problem.publication_delay > (datetime.now() - contest_problem.contest.start_datetime).total_seconds() / 60:
+        contest_problem : ContestProblem = (await session.scalars(select(ContestProblem).filter(ContestProblem.contest_id == contest.id,
+                                                                                                ContestProblem.problem_id == problem.id))).first()
+        if not contest_problem or contest_problem.publication_delay > (datetime.now() - contest.start_datetime).total_seconds() / 60:
             raise HTTPException(status_code=400, detail="Problem not published yet")
         
-        # check if the user is in the contest
-        if contest.users and user not in contest.users:
+        # check if the user is in the contest (the user is loaded by the authentication session)
+        if contest.users and user.id not in [x.id for x in contest.users]:
             raise HTTPException(status_code=400, detail="User not in contest")
         
         # check if the contest is active
@@ -127,10 +157,7 @@ def _validate_submission(submission_dto: SubmissionCreate, session: Session, use
     last_minute = datetime.now() - timedelta(minutes=1)
 
     try:
-        submissions_count = session.query(Submission).filter(Submission.user_id == user.id,
-                                                             Submission.is_pretest_run == False,
-                                                         Submission.created_at >= last_minute,
-                                                         Submission.is_pretest_run == False).count()
+        submissions_count = await session.scalar(_recent_submissions_statement(user.id, last_minute))
 
         if submissions_count >= 5:
             raise HTTPException(status_code=403, detail="Too many submissions")
@@ -142,12 +169,16 @@ def _validate_submission(submission_dto: SubmissionCreate, session: Session, use
     except Exception as e:
         raise e
 
-def get_submission_results(session: Session):
-    try:
-        query = session.query(SubmissionResult)
-        submission_results : List[SubmissionResult] = query.all()
+    return language
 
-        return submission_results
+async def get_submission_results():
+    """ The possible results of a submission, cached (tag: submission_results) """
+    async def compute(own_session: AsyncSession):
+        submission_results : List[SubmissionResult] = (await own_session.scalars(select(SubmissionResult))).all()
+        return [{"id": result.id, "code": result.code, "description": result.description} for result in submission_results]
+
+    try:
+        return await cache.get_or_compute("submission_results", in_own_session(compute), tags=["submission_results"])
 
     except SQLAlchemyError as e:
         raise e
@@ -156,18 +187,15 @@ def get_submission_results(session: Session):
     except Exception as e:
         raise e
 
-def submission_by_problem(pagination: PaginationParams, problem_id: int, user: User, session: Session):
+async def submission_by_problem(pagination: PaginationParams, problem_id: int, user: User, session: AsyncSession):
     try:
-        query = session.query(Submission).filter(Submission.problem_id == problem_id,
-                                                 Submission.user_id == user.id,
-                                                 Submission.submission_result_id != None,
-                                                 Submission.is_pretest_run == False)
-        count = query.count()
-        query = query.offset(pagination.offset).limit(pagination.limit).all()
+        query = _problem_submissions_statement(problem_id, user.id).options(*SUBMISSION_CODE)
+        count = await count_rows_async(session, query, pagination)
+        query, next_cursor = _SUBMISSION_KEYSET.page((await session.scalars(_SUBMISSION_KEYSET.apply(query, pagination))).all(), pagination)
 
         submissions = [SubmissionResponse.model_validate(obj=submission) for submission in query]
 
-        result = ProblemSubmissions(count=count, submissions=submissions)
+        result = ProblemSubmissions(count=count, submissions=submissions, next_cursor=next_cursor)
         return result
 
     except SQLAlchemyError as e:
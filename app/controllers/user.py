@@ -1,13 +1,43 @@
 from datetime import datetime
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import func, select, case
+from sqlalchemy import func, select, case, Select
 from fastapi import HTTPException
 
 from app.database import get_object_by_id
 from app.schemas import UserResponse, ProfileResponse, PaginationParams, SubmissionHistory, SubmissionRecord
 from app.models.mapping import User, Submission, SubmissionResult, Problem, Language, SubmissionTestCase
+from app.util.pagination import Keyset, count_rows
 
+# newest first, the id breaks the ties between submissions sent in the same instant
+_SUBMISSION_KEYSET = Keyset(Submission.created_at, Submission.id, descending=True)
+
+def _submission_history_statement(user_id: int) -> Select:
+    return (
+        select(
+            Submission.id,
+            Submission.created_at,
+            Submission.problem_id,
+            Problem.title.label("problem_title"),
+            SubmissionResult.code.label("result_code"),
+            func.max(SubmissionTestCase.time).label("execution_time"),
+            func.max(SubmissionTestCase.memory).label("memory"),
+            Language.name.label("language_name")
+        )
+        .join(Problem, Submission.problem)
+        .join(SubmissionResult, Submission.result)
+        .join(Language, Submission.language)
+        .join(SubmissionTestCase, SubmissionTestCase.submission_id == Submission.id)
+        .where(Submission.user_id == user_id, Submission.is_pretest_run == False)
+        .group_by(
+            Submission.id,
+            Submission.created_at,
+            Submission.problem_id,
+            Problem.title,
+            SubmissionResult.code,
+            Language.name
+        )
+    )
 
 def read_me(current_user: User, session: Session) -> UserResponse:
     """
@@ -114,44 +144,20 @@ def get_submission_history(pagination: PaginationParams, current_user: User, ses
     """
     
     try:
-        stmt = (
-            select(
-                Submission.created_at,
-                Submission.problem_id,
-                Problem.title.label("problem_title"),
-                SubmissionResult.code.label("result_code"),
-                func.max(SubmissionTestCase.time).label("execution_time"),
-                func.max(SubmissionTestCase.memory).label("memory"),
-                Language.name.label("language_name")
-            )
-            .join(Problem, Submission.problem)
-            .join(SubmissionResult, Submission.result)
-            .join(Language, Submission.language)
-            .join(SubmissionTestCase, SubmissionTestCase.submission_id == Submission.id)
-            .where(Submission.user_id == current_user.id, Submission.is_pretest_run == False)
-            .group_by(
-                Submission.id,
-                Submission.created_at,
-                Submission.problem_id,
-                Problem.title,
-                SubmissionResult.code,
-                Language.name
-            )
-            .order_by(Submission.created_at.desc())
-        )
+        stmt = _submission_history_statement(current_user.id)
         count_stmt = (
-            select(func.count(func.distinct(Submission.id)))
+            select(Submission.id)
             .join(SubmissionTestCase, SubmissionTestCase.submission_id == Submission.id)
             .where(Submission.user_id == current_user.id, Submission.is_pretest_run == False)
+            .distinct()
         )
-        total_count = session.execute(count_stmt).scalar_one()
-
-        stmt = stmt.offset(pagination.offset).limit(pagination.limit)
+        total_count = count_rows(session, count_stmt, pagination)
 
-        results = session.execute(stmt).all()
+        results, next_cursor = _SUBMISSION_KEYSET.page(session.execute(_SUBMISSION_KEYSET.apply(stmt, pagination)).all(), pagination)
 
         return SubmissionHistory(
             count=total_count,
+            next_cursor=next_cursor,
             submissions=[SubmissionRecord.model_validate(obj=result) for result in results]
         )
     
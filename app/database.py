@@ -1,14 +1,55 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, func, select, Select
 from sqlalchemy.orm import declarative_base, sessionmaker, Session
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from .config import settings
-from typing import Any
+from .util.pool_metrics import InstrumentedQueuePool, InstrumentedAsyncQueuePool, instrument
+from .util.query_counter import count_queries
+from .util.tracing import trace_engine
+from .util.query_profiler import profile_queries
+from typing import Any, Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
 
 SQLALCHEMY_DATABASE_URL = settings.get_connection_string
+SQLALCHEMY_ASYNC_DATABASE_URL = settings.get_async_connection_string
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_size=10, max_overflow=20, pool_timeout=30, pool_recycle=1800)
+# pool sizes depend on the process role (settings.PROCESS_ROLE)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, poolclass=InstrumentedQueuePool, **settings.get_pool_options)
+instrument(engine, "primary")
+count_queries(engine)
+trace_engine(engine)
+profile_queries(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# the async engine runs on asyncpg, so the queries do not block the event loop
+async_engine = create_async_engine(SQLALCHEMY_ASYNC_DATABASE_URL, poolclass=InstrumentedAsyncQueuePool, **settings.get_pool_options)
+instrument(async_engine, "primary_async")
+count_queries(async_engine)
+trace_engine(async_engine)
+profile_queries(async_engine)
+# objects stay loaded after commit, lazy loading is not available on async sessions
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+# read replica, only when configured (see app/util/replica.py for the routing)
+replica_engine = None
+ReplicaSessionLocal = None
+async_replica_engine = None
+AsyncReplicaSessionLocal = None
+if settings.get_replica_connection_string:
+    replica_engine = create_engine(settings.get_replica_connection_string, poolclass=InstrumentedQueuePool, **settings.get_pool_options)
+    instrument(replica_engine, "replica")
+    count_queries(replica_engine)
+    trace_engine(replica_engine)
+    profile_queries(replica_engine)
+    ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+    async_replica_engine = create_async_engine(settings.get_async_replica_connection_string, poolclass=InstrumentedAsyncQueuePool, **settings.get_pool_options)
+    instrument(async_replica_engine, "replica_async")
+    count_queries(async_replica_engine)
+    trace_engine(async_replica_engine)
+    profile_queries(async_replica_engine)
+    AsyncReplicaSessionLocal = async_sessionmaker(bind=async_replica_engine, autoflush=False, expire_on_commit=False)
+
 def get_session():
     db = SessionLocal()
     try:
@@ -16,6 +57,28 @@ def get_session():
     finally:
         db.close()
 
+async def get_async_session():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def in_own_session(compute: Callable[[AsyncSession], Awaitable[T]]) -> Callable[[], Awaitable[T]]:
+    """
+    Wrap a computation so it runs in a session of its own on the primary. Used by the shared
+    cache computations, which can outlive the request that started them, and must not read
+    from a lagging replica: a value computed right after an invalidation would be cached
+    stale for its whole ttl
+
+    Args:
+        compute (Callable): coroutine function of the session
+
+    Returns:
+        Callable: coroutine function without arguments
+    """
+    async def run() -> T:
+        async with AsyncSessionLocal() as own_session:
+            return await compute(own_session)
+    return run
+
 class QueryBuilder():
     """
     A class to build list queries
@@ -48,7 +111,46 @@ class QueryBuilder():
     def getCount(self):
         return self.record_count
     
-def get_object_by_id(model, session: Session, id: int) -> Any:
+class AsyncQueryBuilder():
+    """
+    A class to build list queries on an async session
+
+    Usage:
+        builder = await AsyncQueryBuilder(select(Model), session, limit, offset).build()
+        rows = await builder.all()
+    """
+
+    statement: Select = None
+    session: AsyncSession = None
+    limit: int = None
+    offset: int = None
+    record_count: int = None
+
+    def __init__(self, statement, session: AsyncSession, limit, offset):
+        # a model class is accepted as well, like QueryBuilder
+        self.statement = statement if isinstance(statement, Select) else select(statement)
+        self.session = session
+        self.limit = limit
+        self.offset = offset
+
+    async def build(self) -> "AsyncQueryBuilder":
+        self.record_count = await self.session.scalar(select(func.count()).select_from(self.statement.order_by(None).subquery()))
+        if self.limit:
+            self.statement = self.statement.limit(self.limit)
+        if self.offset:
+            self.statement = self.statement.offset(self.offset)
+        return self
+
+    def getQuery(self) -> Select:
+        return self.statement
+
+    def getCount(self):
+        return self.record_count
+
+    async def all(self) -> list:
+        return (await self.session.scalars(self.statement)).all()
+
+def get_object_by_id(model, session: Session, id: int, options: list = None) -> Any:
     """
     Get an object by its ID
 
@@ -56,11 +158,15 @@ def get_object_by_id(model, session: Session, id: int) -> Any:
         model (Base): The model class (has to be a subclass of Base)
         session (Session): The session
         id (int): The ID of the object
+        options (list): Loader options (e.g. undefer for the deferred columns that will be accessed)
 
     Returns:
         Base: The object
     """
-    return session.query(model).filter(model.id == id).first()
+    query = session.query(model).filter(model.id == id)
+    if options:
+        query = query.options(*options)
+    return query.first()
 
 def get_object_by_id_joined_with(model, session: Session, id: int, join_fields: list[str]) -> Any:
     """
@@ -79,3 +185,22 @@ def get_object_by_id_joined_with(model, session: Session, id: int, join_fields:
     for field in join_fields:
         query = query.join(field)
     return query.filter(model.id == id).first()
+
+async def get_object_by_id_async(model, session: AsyncSession, id: int, options: list = None) -> Any:
+    """
+    Get an object by its ID from an async session
+
+    Args:
+        model (Base): The model class (has to be a subclass of Base)
+        session (AsyncSession): The async session
+        id (int): The ID of the object
+        options (list): Loader options (e.g. selectinload) for the relationships that will be accessed,
+            lazy loading is not available on async sessions
+
+    Returns:
+        Base: The object
+    """
+    statement = select(model).filter(model.id == id)
+    if options:
+        statement = statement.options(*options)
+    return (await session.scalars(statement)).first()
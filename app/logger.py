@@ -1,15 +1,19 @@
 import time
 import uuid
 import json
+import sys
+import hashlib
 import logging
-from logging_loki import LokiQueueHandler
-from multiprocessing import Queue
 from contextvars import ContextVar
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import StreamingResponse
-from fastapi import Request, Response
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from .config import settings
+from .util.log_shipping import LokiShippingHandler
+from .util.pool_metrics import current_scope
+from .util.metrics import REQUESTS, REQUEST_DURATION
+from .util.query_counter import counting
+from .util.tracing import tracing, finish_trace
 
 request_id_context: ContextVar[str] = ContextVar("request_id", default="")
 
@@ -22,11 +26,15 @@ class LokiLogger:
         self._configure_logging()
 
     def _configure_logging(self):
-        loki_handler = LokiQueueHandler(
-            Queue(-1),
-            url=self.url,
-            tags={"application": self.name},
-            version="1"
+        loki_handler = LokiShippingHandler(
+            self.url,
+            labels={"application": self.name},
+            batch_size=settings.LOG_BATCH_SIZE,
+            batch_interval=settings.LOG_BATCH_INTERVAL,
+            queue_size=settings.LOG_QUEUE_SIZE,
+            timeout=settings.LOG_PUSH_TIMEOUT,
+            retry_interval=settings.LOG_RETRY_INTERVAL,
+            fallback=self._fallback_handler(),
         )
 
         handlers = [loki_handler]
@@ -47,6 +55,14 @@ class LokiLogger:
         self.logger = logger
         self.logger.info(f"Logger initialized with level {self.level} and url {self.url}")
 
+    def _fallback_handler(self):
+        # where the records go while Loki is unreachable, none when they are already on the console
+        if settings.LOG_FALLBACK_FILE:
+            return logging.FileHandler(settings.LOG_FALLBACK_FILE)
+        if not self.CONSOLE_LOG:
+            return logging.StreamHandler(sys.stdout)
+        return None
+
     def get_logger(self):
         return self.logger
     
@@ -60,105 +76,168 @@ def get_logger():
     return logger_instance.get_logger()
 
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: callable) -> Response:
+class LogEvent:
+    """
+    Structured log record, serialized to JSON only when a handler emits it
+
+    Attributes:
+        fields (dict): The fields of the record
+    """
+    __slots__ = ("fields",)
+
+    def __init__(self, **fields):
+        self.fields = fields
+
+    def __str__(self) -> str:
+        return json.dumps(self.fields, default=str)
+
+def _token_fingerprint(headers: Headers) -> str:
+    # the session token is a credential, the records only identify it
+    token = None
+    for cookie in headers.get("cookie", "").split(";"):
+        name, _, value = cookie.strip().partition("=")
+        if name == "token":
+            token = value
+            break
+    if token is None:
+        authorization = headers.get("authorization", "")
+        if authorization.startswith("Bearer "):
+            token = authorization[7:]
+    if not token:
+        return "unknown"
+    return hashlib.sha256(token.encode()).hexdigest()[:12]
+
+class LoggingMiddleware:
+    """
+    Logs the start and the end of every request, and the body of the error responses.
+    The messages of the response are forwarded as they come, only the first
+    LOG_ERROR_BODY_BYTES of an error body are copied for its log record.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
         request_id = str(uuid.uuid4())
         request_id_context.set(request_id)
 
         logger = get_logger()
-
-        client_ip = request.client.host if request.client else "unknown"
-        user_agent = request.headers.get("user-agent", "unknown")
-        user_token = request.cookies.get("token", "unknown")
-        method = request.method
-        path = str(request.url.path)
-        query = str(request.url.query)
-
-        logger.debug(
-            json.dumps({
-                "event": "request_start",
-                "request_id": request_id,
-                "method": method,
-                "path": path,
-                "query": query,
-                "client_ip": client_ip,
-                "user_agent": user_agent,
-            })
-        )
-
-        start_time = time.time()
-
-        response = await call_next(request)
-
-        process_time = round((time.time() - start_time) * 1000, 2)
-
-        if response.status_code >= 400:
-            if isinstance(response, StreamingResponse):
-                response_body = b"".join([chunk async for chunk in response.body_iterator])
-
-                response = StreamingResponse(iter([response_body]), status_code=response.status_code, headers=dict(response.headers))
-
-                try:
-                    response_text = response_body.decode("utf-8")
-                    response_json = json.loads(response_text)
-
-                    logger.error(
-                        json.dumps({
-                            "event": "response_error",
-                            "request_id": request_id,
-                            "status_code": response.status_code,
-                            "response_body": response_json,
-                            "path": path,
-                            "client_ip": client_ip,
-                            "process_time_ms": process_time,
-                            "user_token": user_token,
-                            "tags": {
-                                "request_id": request_id,
-                                "status_code": response.status_code,
-                                "client_ip": client_ip,
-                                "path": path
-                            }
-                        })
-                    )
-
-                    if response.status_code >= 500:
-                        logger.critical(
-                            json.dumps({
-                                "event": "critical_error",
-                                "request_id": request_id,
-                                "status_code": response.status_code,
-                                "response_body": response_json,
-                                "path": path
-                            })
-                        )
-
-                except json.JSONDecodeError:
-                    logger.critical(
-                        json.dumps({
-                            "event": "response_error_non_json",
-                            "request_id": request_id,
-                            "status_code": response.status_code,
-                            "response_text": response_text
-                        })
-                    )
-
-        logger.info(
-            json.dumps({
-                "event": "request_end",
-                "request_id": request_id,
-                "method": method,
-                "path": path,
-                "status_code": response.status_code,
-                "process_time_ms": process_time,
-                "client_ip": client_ip,
-                "user_token": user_token,
-                "tags": {
+        method = scope["method"]
+        path = scope["path"]
+        current_scope.set(scope)
+        client_ip = scope["client"][0] if scope.get("client") else "unknown"
+        headers = Headers(scope=scope)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(LogEvent(
+                event="request_start",
+                request_id=request_id,
+                method=method,
+                path=path,
+                query=scope.get("query_string", b"").decode("latin-1"),
+                client_ip=client_ip,
+                user_agent=headers.get("user-agent", "unknown"),
+            ))
+
+        status_code = 500
+        error_body = bytearray()
+        error_body_size = 0
+        counter = None
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code, error_body_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if counter is not None:
+                    MutableHeaders(scope=message).append("X-Query-Count", str(counter.count))
+            elif message["type"] == "http.response.body" and status_code >= 400:
+                chunk = message.get("body", b"")
+                error_body_size += len(chunk)
+                missing = settings.LOG_ERROR_BODY_BYTES - len(error_body)
+                if missing > 0:
+                    error_body.extend(chunk[:missing])
+            await send(message)
+
+        start_time = time.perf_counter()
+        with tracing(request_id) as trace:
+            try:
+                if settings.QUERY_COUNT_HEADER:
+                    with counting() as counter:
+                        await self.app(scope, receive, send_wrapper)
+                else:
+                    await self.app(scope, receive, send_wrapper)
+            finally:
+                elapsed = time.perf_counter() - start_time
+                process_time = round(elapsed * 1000, 2)
+                # the route template, not the path: one series per endpoint
+                route = getattr(scope.get("route"), "path", "unmatched")
+                REQUEST_DURATION.labels(method=method, route=route).observe(elapsed)
+                REQUESTS.labels(method=method, route=route, status=str(status_code)).inc()
+                user = _token_fingerprint(headers)
+                tags = {"request_id": request_id, "status_code": status_code, "path": path, "client_ip": client_ip}
+
+                if status_code >= 400:
+                    self._log_error(logger, request_id, status_code, path, client_ip, process_time, user, tags,
+                                    bytes(error_body), truncated=error_body_size > len(error_body))
+
+                logger.info(LogEvent(
+                    event="request_end",
+                    request_id=request_id,
+                    method=method,
+                    path=path,
+                    status_code=status_code,
+                    process_time_ms=process_time,
+                    client_ip=client_ip,
+                    user=user,
+                    **trace.summary(),
+                    tags=tags,
+                ))
+                finish_trace(trace, f"{method} {path}", {
+                    "http.method": method,
+                    "http.target": path,
+                    "http.status_code": status_code,
                     "request_id": request_id,
-                    "status_code": response.status_code,
-                    "path": path,
-                    "client_ip": client_ip
-                }
-            })
-        )
-
-        return response
+                })
+
+    @staticmethod
+    def _log_error(logger: logging.Logger, request_id: str, status_code: int, path: str, client_ip: str,
+                   process_time: float, user: str, tags: dict, body: bytes, truncated: bool):
+        if not body and status_code < 500:
+            return
+        text = body.decode("utf-8", errors="replace")
+        try:
+            if truncated:
+                raise ValueError("truncated body")
+            response_body = json.loads(text)
+        except ValueError:
+            logger.critical(LogEvent(
+                event="response_error_non_json",
+                request_id=request_id,
+                status_code=status_code,
+                response_text=text,
+                truncated=truncated,
+            ))
+            return
+
+        logger.error(LogEvent(
+            event="response_error",
+            request_id=request_id,
+            status_code=status_code,
+            response_body=response_body,
+            path=path,
+            client_ip=client_ip,
+            process_time_ms=process_time,
+            user=user,
+            tags=tags,
+        ))
+        if status_code >= 500:
+            logger.critical(LogEvent(
+                event="critical_error",
+                request_id=request_id,
+                status_code=status_code,
+                response_body=response_body,
+                path=path,
+            ))
@@ -0,0 +1,43 @@
+"""added trigram indexes for the text search
+
+Revision ID: 7c2e9a41f5b8
+Revises: e4b1c7d2a9f3
+Create Date: 2026-10-19 18:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2e9a41f5b8'
+down_revision: Union[str, None] = 'e4b1c7d2a9f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# name, table, column
+INDEXES = [
+    ('ix_problems_title_trgm', 'problems', 'title'),
+    ('ix_problems_description_trgm', 'problems', 'description'),
+    ('ix_users_username_trgm', 'users', 'username'),
+    ('ix_contests_name_trgm', 'contests', 'name'),
+    ('ix_submissions_submitted_code_trgm', 'submissions', 'submitted_code'),
+]
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    with op.get_context().autocommit_block():
+        for name, table, column in INDEXES:
+            op.create_index(name, table, [column], unique=False, postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'},
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    # the extension is left installed, other objects may depend on it
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,39 @@
+"""added the statistics table for the dashboard counters
+
+Revision ID: b3f8d1e6c4a7
+Revises: 7c2e9a41f5b8
+Create Date: 2026-10-19 20:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3f8d1e6c4a7'
+down_revision: Union[str, None] = '7c2e9a41f5b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('statistics',
+    sa.Column('name', sa.String(length=32), nullable=False),
+    sa.Column('value', sa.BigInteger(), nullable=False),
+    sa.Column('reconciled_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+    # first count, then the controllers keep the counters up to date
+    op.execute("""
+        INSERT INTO statistics (name, value, reconciled_at) VALUES
+            ('users', (SELECT count(*) FROM users), now()),
+            ('problems', (SELECT count(*) FROM problems WHERE is_public), now()),
+            ('contests', (SELECT count(*) FROM contests), now()),
+            ('submissions', (SELECT count(*) FROM submissions), now())
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('statistics')
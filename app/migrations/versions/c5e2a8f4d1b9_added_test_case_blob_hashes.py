@@ -0,0 +1,46 @@
+"""added the blob hashes and sizes of the test case files
+
+Revision ID: c5e2a8f4d1b9
+Revises: b3f8d1e6c4a7
+Create Date: 2026-10-19 23:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e2a8f4d1b9'
+down_revision: Union[str, None] = 'b3f8d1e6c4a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('problem_test_cases', sa.Column('input_hash', sa.String(length=64), nullable=True))
+    op.add_column('problem_test_cases', sa.Column('output_hash', sa.String(length=64), nullable=True))
+    op.add_column('problem_test_cases', sa.Column('input_size', sa.BigInteger(), nullable=True))
+    op.add_column('problem_test_cases', sa.Column('output_size', sa.BigInteger(), nullable=True))
+    op.alter_column('problem_test_cases', 'input', existing_type=sa.String(), nullable=True)
+    op.alter_column('problem_test_cases', 'output', existing_type=sa.String(), nullable=True)
+    # the hashes of the inline files, "python manage.py moveblobs" moves them to the blob store
+    op.execute("""
+        UPDATE problem_test_cases SET
+            input_hash = encode(sha256(convert_to(input, 'UTF8')), 'hex'),
+            input_size = octet_length(convert_to(input, 'UTF8')),
+            output_hash = encode(sha256(convert_to(output, 'UTF8')), 'hex'),
+            output_size = octet_length(convert_to(output, 'UTF8'))
+    """)
+
+
+def downgrade() -> None:
+    # only the test cases still inline can be kept
+    op.execute("DELETE FROM problem_test_cases WHERE input IS NULL OR output IS NULL")
+    op.alter_column('problem_test_cases', 'output', existing_type=sa.String(), nullable=False)
+    op.alter_column('problem_test_cases', 'input', existing_type=sa.String(), nullable=False)
+    op.drop_column('problem_test_cases', 'output_size')
+    op.drop_column('problem_test_cases', 'input_size')
+    op.drop_column('problem_test_cases', 'output_hash')
+    op.drop_column('problem_test_cases', 'input_hash')
@@ -0,0 +1,41 @@
+"""added indexes for the hot query paths
+
+Revision ID: e4b1c7d2a9f3
+Revises: 0d8403687bdb
+Create Date: 2026-10-19 18:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b1c7d2a9f3'
+down_revision: Union[str, None] = '0d8403687bdb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# name, table, columns
+INDEXES = [
+    ('ix_submissions_user_id_created_at', 'submissions', ['user_id', 'created_at', 'id']),
+    ('ix_submissions_problem_id_user_id', 'submissions', ['problem_id', 'user_id', 'created_at', 'id']),
+    ('ix_submission_test_cases_submission_id', 'submission_test_cases', ['submission_id', 'number']),
+    ('ix_problem_test_cases_problem_id_number', 'problem_test_cases', ['problem_id', 'number']),
+    ('ix_contest_problems_problem_id', 'contest_problems', ['problem_id']),
+    ('ix_contest_submissions_submission_id', 'contest_submissions', ['submission_id']),
+]
+
+
+def upgrade() -> None:
+    # built concurrently, so the submissions table is not locked while the indexes are created
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,32 @@
+"""
+Loading profiles of the listing endpoints, passed to Query.options()
+
+Every relationship read while building a list response is loaded here up front,
+so a page costs a fixed number of queries instead of one (or more) per row.
+"""
+from sqlalchemy.orm import selectinload, joinedload, contains_eager, load_only, undefer
+
+from app.models.mapping import User, Problem, ProblemConstraint, ProblemTestCase, Submission, ContestSubmission
+
+# the heavy text columns are deferred (and raise when lazy loaded), the endpoints returning them undefer them
+PROBLEM_DESCRIPTION = (undefer(Problem.description),)
+TEST_CASE_FILES = (undefer(ProblemTestCase.input), undefer(ProblemTestCase.output))
+SUBMISSION_CODE = (undefer(Submission.submitted_code),)
+
+# problem lists: the languages of all the problems of the page in one query
+PROBLEM_LIST = (
+    selectinload(Problem.constraints).joinedload(ProblemConstraint.language),
+)
+
+# problems of a contest page: the columns of ProblemInfo, not the statement
+PROBLEM_SUMMARY = (
+    load_only(Problem.id, Problem.title, Problem.points, Problem.difficulty),
+)
+
+# admin contest submissions: the query already joins Submission, User and SubmissionResult,
+# of the users and the problems only the listed columns are loaded
+CONTEST_SUBMISSION_LIST = (
+    contains_eager(ContestSubmission.submission).contains_eager(Submission.user).load_only(User.id, User.username),
+    contains_eager(ContestSubmission.submission).contains_eager(Submission.result),
+    contains_eager(ContestSubmission.submission).joinedload(Submission.problem).load_only(Problem.id, Problem.title),
+)
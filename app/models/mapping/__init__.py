@@ -14,4 +14,5 @@ from .problem_constraint import ProblemConstraint
 from .contest_submission import ContestSubmission
 from .team_user import TeamUser
 from .contest_team import ContestTeam
-from .contest_submission import ContestSubmission
\ No newline at end of file
+from .contest_submission import ContestSubmission
+from .statistic import Statistic
\ No newline at end of file
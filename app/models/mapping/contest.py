@@ -1,5 +1,5 @@
 from sqlalchemy.orm import mapped_column, Mapped, relationship
-from sqlalchemy import ForeignKey as FK, Integer, String, DateTime, Boolean
+from sqlalchemy import ForeignKey as FK, Integer, String, DateTime, Boolean, Index
 from typing import Optional, List
 from datetime import datetime
 from app.database import Base
@@ -7,6 +7,9 @@ from . import *
 
 class Contest(Base):
     __tablename__ = 'contests'
+    __table_args__ = (
+        Index('ix_contests_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
     id : Mapped[int] = mapped_column(Integer, primary_key=True, index=True, autoincrement=True)
     name : Mapped[str] = mapped_column(String, nullable=False)
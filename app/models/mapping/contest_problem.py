@@ -1,10 +1,14 @@
 from sqlalchemy.orm import mapped_column, Mapped, relationship
-from sqlalchemy import ForeignKey as FK, Integer
+from sqlalchemy import ForeignKey as FK, Integer, Index
 from app.database import Base
 from . import *
 
 class ContestProblem(Base):
     __tablename__ = 'contest_problems'
+    # the primary key starts with contest_id, the contests of a problem need their own index
+    __table_args__ = (
+        Index('ix_contest_problems_problem_id', 'problem_id'),
+    )
 
     contest_id : Mapped[int] = mapped_column(Integer, FK('contests.id', ondelete='cascade'), nullable=False, primary_key=True)
     problem_id : Mapped[int] = mapped_column(Integer, FK('problems.id', ondelete='cascade'), nullable=False, primary_key=True)
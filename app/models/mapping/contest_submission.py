@@ -1,11 +1,15 @@
 from sqlalchemy.orm import mapped_column, Mapped, relationship
-from sqlalchemy import ForeignKey as FK, Integer, String
+from sqlalchemy import ForeignKey as FK, Integer, String, Index
 from typing import List
 from app.database import Base
 from . import *
 
 class ContestSubmission(Base):
     __tablename__ = 'contest_submissions'
+    # the primary key starts with contest_id, the contests of a submission need their own index
+    __table_args__ = (
+        Index('ix_contest_submissions_submission_id', 'submission_id'),
+    )
 
     contest_id : Mapped[int] = mapped_column(Integer, FK('contests.id', ondelete='cascade'), nullable=False, primary_key=True)
     submission_id : Mapped[int] = mapped_column(Integer, FK('submissions.id', ondelete='cascade'), nullable=False, primary_key=True)
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import mapped_column, Mapped, relationship
-from sqlalchemy import ForeignKey as FK, Integer, String, Boolean, DateTime, Enum
+from sqlalchemy import ForeignKey as FK, Integer, String, Boolean, DateTime, Enum, Index
 from datetime import datetime
 from typing import Optional, List
 from app.database import Base
@@ -9,10 +9,16 @@ from . import *
 
 class Problem(Base):
     __tablename__ = 'problems'
+    # trigram indexes for the search (app/util/search.py)
+    __table_args__ = (
+        Index('ix_problems_title_trgm', 'title', postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'}),
+        Index('ix_problems_description_trgm', 'description', postgresql_using='gin', postgresql_ops={'description': 'gin_trgm_ops'}),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True, autoincrement=True)
     title: Mapped[str] = mapped_column(String, nullable=False, unique=True)
-    description: Mapped[Optional[str]] = mapped_column(String)
+    # deferred: loaded only by the endpoints returning it (see app/models/loading.py)
+    description: Mapped[Optional[str]] = mapped_column(String, deferred=True, deferred_raiseload=True)
     points: Mapped[int] = mapped_column(Integer, nullable=False)
     is_public: Mapped[bool] = mapped_column(Boolean, default=False)
     config_version_number: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
@@ -1,21 +1,39 @@
-from sqlalchemy.orm import mapped_column, Mapped, relationship
-from sqlalchemy import ForeignKey as FK, String, Integer, Boolean
+from hashlib import sha256
+from sqlalchemy.orm import mapped_column, Mapped, relationship, validates
+from sqlalchemy import ForeignKey as FK, String, Integer, BigInteger, Boolean, Index
 from typing import List, Optional
 from app.database import Base
 from . import *
 
 class ProblemTestCase(Base):
     __tablename__ = 'problem_test_cases'
+    __table_args__ = (
+        Index('ix_problem_test_cases_problem_id_number', 'problem_id', 'number'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True, autoincrement=True)
     number: Mapped[int] = mapped_column(Integer, nullable=False)
     notes: Mapped[Optional[str]] = mapped_column(String, nullable=True)
-    input: Mapped[str] = mapped_column(String, nullable=False)
-    output: Mapped[str] = mapped_column(String, nullable=False)
+    # the files are in the blob store (app/util/blob_store.py), the older test cases keep them inline,
+    # deferred: loaded only by the endpoints returning them (see app/models/loading.py)
+    input: Mapped[Optional[str]] = mapped_column(String, nullable=True, deferred=True, deferred_raiseload=True)
+    output: Mapped[Optional[str]] = mapped_column(String, nullable=True, deferred=True, deferred_raiseload=True)
+    input_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    output_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    input_size: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    output_size: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
     points: Mapped[int] = mapped_column(Integer, nullable=False)
     is_pretest: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
     problem_id: Mapped[int] = mapped_column(Integer, FK('problems.id', ondelete='cascade'), nullable=False)
     
     # connected fields
-    problem = relationship('Problem', back_populates='test_cases')    
-    
\ No newline at end of file
+    problem = relationship('Problem', back_populates='test_cases')
+
+    @validates('input', 'output')
+    def _hash_inline_file(self, key: str, value: Optional[str]) -> Optional[str]:
+        # the inline files are hashed as the uploaded ones, so the test cases always compare by hash
+        if value is not None:
+            data = value.encode()
+            setattr(self, f'{key}_hash', sha256(data).hexdigest())
+            setattr(self, f'{key}_size', len(data))
+        return value
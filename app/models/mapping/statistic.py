@@ -0,0 +1,22 @@
+from sqlalchemy.orm import mapped_column, Mapped
+from sqlalchemy import BigInteger, String, DateTime
+from app.database import Base
+from datetime import datetime
+from . import *
+
+class Statistic(Base):
+    """
+    A counter of the dashboard statistics, kept up to date by the controllers
+    and periodically recounted (see app/util/statistics.py)
+
+    Attributes:
+
+        name (str): The name of the counter (users, problems, contests, submissions)
+        value (int): The current value
+        reconciled_at (datetime): The date and time of the last recount
+    """
+    __tablename__ = 'statistics'
+
+    name: Mapped[str] = mapped_column(String(32), primary_key=True)
+    value: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    reconciled_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import mapped_column, Mapped, relationship
-from sqlalchemy import ForeignKey as FK, Integer, String, DateTime, Boolean
+from sqlalchemy import ForeignKey as FK, Integer, String, DateTime, Boolean, Index
 from typing import Optional, List
 from datetime import datetime
 from app.database import Base
@@ -7,12 +7,21 @@ from . import *
 
 class Submission(Base):
     __tablename__ = 'submissions'
+    __table_args__ = (
+        # submission history and rate limit of a user, newest first
+        Index('ix_submissions_user_id_created_at', 'user_id', 'created_at', 'id'),
+        # submissions of a user to a problem, newest first
+        Index('ix_submissions_problem_id_user_id', 'problem_id', 'user_id', 'created_at', 'id'),
+        # source code search
+        Index('ix_submissions_submitted_code_trgm', 'submitted_code', postgresql_using='gin', postgresql_ops={'submitted_code': 'gin_trgm_ops'}),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True, autoincrement=True)
     notes: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, nullable=False)
     score: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
-    submitted_code: Mapped[str] = mapped_column(String, nullable=False)
+    # deferred: loaded only by the endpoints returning it (see app/models/loading.py)
+    submitted_code: Mapped[str] = mapped_column(String, nullable=False, deferred=True, deferred_raiseload=True)
     problem_id: Mapped[int] = mapped_column(Integer, FK('problems.id', ondelete='cascade'), nullable=False)
     user_id: Mapped[int] = mapped_column(Integer, FK('users.id'), nullable=False)
     language_id: Mapped[int] = mapped_column(Integer, FK('languages.id'), nullable=False)
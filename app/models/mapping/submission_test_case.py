@@ -1,5 +1,5 @@
 from sqlalchemy.orm import mapped_column, Mapped, relationship
-from sqlalchemy import ForeignKey as FK, Integer, String, Float
+from sqlalchemy import ForeignKey as FK, Integer, String, Float, Index
 from typing import Optional
 from app.database import Base
 from . import *
@@ -25,6 +25,9 @@ class SubmissionTestCase(Base):
     """
 
     __tablename__ = 'submission_test_cases'
+    __table_args__ = (
+        Index('ix_submission_test_cases_submission_id', 'submission_id', 'number'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True, autoincrement=True)
     number: Mapped[int] = mapped_column(Integer, nullable=False)
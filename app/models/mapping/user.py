@@ -1,5 +1,5 @@
 from sqlalchemy.orm import mapped_column, Mapped, relationship
-from sqlalchemy import ForeignKey as FK, Integer, String, DateTime
+from sqlalchemy import ForeignKey as FK, Integer, String, DateTime, Index
 from app.database import Base
 from datetime import datetime
 from typing import List
@@ -19,6 +19,9 @@ class User(Base):
         deletion_date (datetime): The date and time of the deletion
     """
     __tablename__ = 'users'
+    __table_args__ = (
+        Index('ix_users_username_trgm', 'username', postgresql_using='gin', postgresql_ops={'username': 'gin_trgm_ops'}),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True, autoincrement=True)
     username: Mapped[str] = mapped_column(String, nullable=False, unique=True)
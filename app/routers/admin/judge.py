@@ -19,7 +19,7 @@ async def list_judges(pagination : PaginationParams = Depends(get_pagination_par
     """
 
     try:
-        return get_judges(pagination.limit, pagination.offset, pagination.search_filter, session)
+        return get_judges(pagination, session)
     
     except HTTPException as e:
         raise e
@@ -0,0 +1,71 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app.models.role import Role
+from app.schemas import QueryProfilerUpdate
+from app.util.role_checker import RoleChecker
+from app.util.pool_metrics import get_pool_metrics
+from app.util.query_profiler import profiler
+
+router = APIRouter(
+    tags=["Metrics"],
+    prefix="/admin"
+)
+
+@router.get("/metrics/pool", summary="Get the database connection pool metrics", dependencies=[Depends(RoleChecker([Role.ADMIN]))])
+async def pool_metrics():
+    """
+    Get the connection pool metrics of this process: checkouts, wait time histogram,
+    overflow usage and the routes that held a connection longer than POOL_LONG_HOLD_MS
+    """
+
+    try:
+        return get_pool_metrics()
+
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
+
+@router.get("/metrics/queries", summary="Get the query profiler statistics", dependencies=[Depends(RoleChecker([Role.ADMIN]))])
+async def query_profile(top: int = Query(default=20, ge=1, le=200)):
+    """
+    Get the profiler settings of this process, its top statements by total (sampled) time
+    with the code that issued them, and the latest statements slower than the threshold
+    """
+
+    try:
+        return profiler.snapshot(top)
+
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
+
+@router.put("/metrics/queries", summary="Switch or tune the query profiler", dependencies=[Depends(RoleChecker([Role.ADMIN]))])
+async def configure_query_profile(update: QueryProfilerUpdate):
+    """
+    Switch the profiler on or off, or change its sample rate and slow threshold, in this process
+    """
+
+    try:
+        profiler.configure(update.enabled, update.sample_rate, update.slow_ms)
+        return profiler.snapshot(0)
+
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
+
+@router.delete("/metrics/queries", summary="Reset the query profiler statistics", dependencies=[Depends(RoleChecker([Role.ADMIN]))])
+async def reset_query_profile():
+    """
+    Start collecting the statistics of this process again from now
+    """
+
+    try:
+        profiler.reset()
+        return {"message": "Query profile reset"}
+
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Body, Depends, HTTPException
+from fastapi import APIRouter, Body, Depends, HTTPException, Request
 from fastapi.responses import JSONResponse
-from app.schemas import ProblemCreate, ProblemUpdate, ProblemListResponse, PaginationParams, get_pagination_params, ProblemRead
-from app.controllers.admin.problem import create, delete, update, list_available_languages, list_problems, read
+from app.schemas import ProblemCreate, ProblemUpdate, ProblemListResponse, PaginationParams, get_pagination_params, ProblemRead, ProblemTestCasesUpload
+from app.controllers.admin.problem import create, delete, update, list_available_languages, list_problems, read, upload_test_cases
 from app.database import get_session
 from app.models.role import Role
 from app.util.role_checker import RoleChecker
@@ -95,8 +95,34 @@ async def update_problem(id: int, problem: ProblemUpdate = Body(), session=Depen
     except Exception as e:
         raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
 
+@router.post("/{id}/test_cases", response_model=ProblemTestCasesUpload, summary="Upload the test cases of a problem", dependencies=[Depends(RoleChecker([Role.PROBLEM_MAINTAINER]))])
+async def upload_problem_test_cases(id: int, request: Request, session=Depends(get_session)):
+    """
+    Replace the test cases of a problem with a streamed zip archive (application/zip) of
+    <number>.in and <number>.out files, with an optional manifest.json:
+    {"1": {"points": 0, "is_pretest": true}, "2": {"points": 50}, ...}
+
+    Args:
+        id: int
+
+    Returns:
+        ProblemTestCasesUpload: the stored test cases with their hashes
+    """
+
+    try:
+        content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+        if content_type not in ("application/zip", "application/x-zip-compressed"):
+            raise HTTPException(status_code=415, detail="Unsupported content type, use application/zip")
+
+        return await upload_test_cases(id, request.stream(), session)
+
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
+
 @router.get("/languages/available", summary="Get the available languages", dependencies=[Depends(RoleChecker([Role.PROBLEM_MAINTAINER]))])
-async def list_languages(session=Depends(get_session)):
+async def list_languages():
     """
     Get all available languages
 
@@ -105,7 +131,7 @@ async def list_languages(session=Depends(get_session)):
     """
 
     try:
-        languages = list_available_languages(session)
+        languages = list_available_languages()
         return languages
     
     except HTTPException as e:
@@ -123,7 +149,7 @@ async def problem_list(pagination : PaginationParams = Depends(get_pagination_pa
     """
 
     try:
-        problems = list_problems(pagination.limit, pagination.offset, pagination.search_filter, user, session)
+        problems = list_problems(pagination, user, session)
         return problems
     
     except HTTPException as e:
@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Request
 from app.util.role_checker import RoleChecker
 from app.util.jwt import get_current_user
-from app.controllers.admin.user import available_user_types_list, read_user, delete_user, update_user as update, list_user, create_user
+from app.controllers.admin.user import available_user_types_list, read_user, delete_user, update_user as update, list_user, create_user, import_users
 from app.schemas import get_pagination_params, PaginationParams, UserListResponse, UserUpdate, UserCreate
 from app.database import get_session
 from app.models import Role
-from app.schemas import UserResponse, UserUpdate
+from app.schemas import UserResponse, UserUpdate, UserImportResponse
+from app.util.upload import iter_csv_rows, iter_json_lines
 from fastapi import APIRouter, Depends, HTTPException, Body
 from fastapi.responses import JSONResponse
 
@@ -124,10 +125,40 @@ async def create(user: UserCreate = Body(), session=Depends(get_session)):
     """
 
     try:
-        created_user = create_user(user, session)
+        created_user = await create_user(user, session)
         return JSONResponse(status_code=201, content={"message": "User created successfully", "id": created_user.id})
 
     except HTTPException as e:
         raise e
     except Exception as e:
-        raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
+
+@router.post("/import", response_model=UserImportResponse, summary="Bulk import users", dependencies=[Depends(RoleChecker([Role.USER_MAINTAINER]))])
+async def bulk_import(request: Request, user_type_id: int | None = Query(None), contest_id: int | None = Query(None), session=Depends(get_session)):
+    """
+    Bulk import users from a streamed upload, either CSV (text/csv, with a
+    username,email,password header) or JSON lines (application/x-ndjson)
+
+    Args:
+        user_type_id: int
+        contest_id: int (the users are also registered to this contest)
+
+    Returns:
+        UserImportResponse: created users and per row errors
+    """
+
+    try:
+        content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+        if content_type == "text/csv":
+            rows = iter_csv_rows(request.stream())
+        elif content_type in ("application/x-ndjson", "application/jsonl"):
+            rows = iter_json_lines(request.stream())
+        else:
+            raise HTTPException(status_code=415, detail="Unsupported content type, use text/csv or application/x-ndjson")
+
+        return await import_users(rows, user_type_id, contest_id, session)
+
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
@@ -38,7 +38,7 @@ async def login(response: Response, body: LoginRequest = Body(), session = Depen
     """
 
     try:
-        result: LoginResponse = login_controller(body, session)
+        result: LoginResponse = await login_controller(body, session)
         response.set_cookie('token', result.access_token, httponly=True)
         return result
         
@@ -108,7 +108,7 @@ async def change_reset_password(body: ChangeResetPasswordRequest = Body(), sessi
         JSONResponse: response
     """
     try:
-        return change_reset_pwd(body, session)
+        return await change_reset_pwd(body, session)
 
     except HTTPException as e:
         return JSONResponse(status_code=e.status_code, content={"detail": e.detail})
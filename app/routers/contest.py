@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
 from app.models.role import Role
-from app.controllers.contest import get_scoreboard, list_with_info, read_past, read_upcoming, read_ongoing, register_to_contest
+from app.controllers.contest import get_scoreboard_async, list_with_info, read_past, read_upcoming, read_ongoing, register_to_contest
 from app.schemas import Scoreboard
 from app.schemas import ContestRead, ContestInfos, UpcomingContest
 from app.models.mapping import User
 from app.database import get_session
+from app.util.replica import get_async_read_session
 from app.util.jwt import get_current_user
 from app.util.role_checker import RoleChecker
 
@@ -14,7 +15,7 @@ router = APIRouter(
 )
 
 @router.get("/info", response_model=ContestInfos, summary="List contests info", dependencies=[Depends(RoleChecker([Role.GUEST]))])
-async def list_contests_info(session=Depends(get_session)):
+async def list_contests_info():
     """
     List contests info
 
@@ -23,7 +24,7 @@ async def list_contests_info(session=Depends(get_session)):
     """
 
     try:
-        contests = list_with_info(session)
+        contests = await list_with_info()
         return contests
     
     except HTTPException as e:
@@ -32,7 +33,7 @@ async def list_contests_info(session=Depends(get_session)):
         raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
 
 @router.post("/{id}/scoreboard", summary="Return the contest scoreboard", dependencies=[Depends(RoleChecker([Role.USER]))])
-async def add_user_to_contest(id: int, session=Depends(get_session)):
+async def add_user_to_contest(id: int, session=Depends(get_async_read_session)):
     """
     Get the current scoreboard for a specific contest
 
@@ -41,7 +42,7 @@ async def add_user_to_contest(id: int, session=Depends(get_session)):
     """
 
     try:
-        scoreboard : Scoreboard = get_scoreboard(id, session)
+        scoreboard : Scoreboard = await get_scoreboard_async(id, session)
         return scoreboard
     
     except HTTPException as e:
@@ -50,7 +51,7 @@ async def add_user_to_contest(id: int, session=Depends(get_session)):
         raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
 
 @router.get("/{id}/past", summary="Info about past contest", dependencies=[Depends(RoleChecker([Role.USER]))])
-async def get_past_contest(id: int, session=Depends(get_session)):
+async def get_past_contest(id: int):
     """
     Get past contest info
 
@@ -59,7 +60,7 @@ async def get_past_contest(id: int, session=Depends(get_session)):
     """
 
     try:
-        contest: ContestRead = read_past(id, session)
+        contest: ContestRead = await read_past(id)
         return contest
     
     except HTTPException as e:
@@ -68,7 +69,7 @@ async def get_past_contest(id: int, session=Depends(get_session)):
         raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
     
 @router.get("/{id}/upcoming", summary="Info about upcoming contest", dependencies=[Depends(RoleChecker([Role.USER]))])
-async def get_upcoming_contest(id: int, session=Depends(get_session)):
+async def get_upcoming_contest(id: int):
     """
     Get upcoming contest info
     
@@ -76,7 +77,7 @@ async def get_upcoming_contest(id: int, session=Depends(get_session)):
         id: int
     """
     try:
-        contest: UpcomingContest = read_upcoming(id, session)
+        contest: UpcomingContest = await read_upcoming(id)
         return contest
     
     except HTTPException as e:
@@ -85,7 +86,7 @@ async def get_upcoming_contest(id: int, session=Depends(get_session)):
         raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
 
 @router.get("/{id}/ongoing", summary="Info about ongoing contest", dependencies=[Depends(RoleChecker([Role.USER]))])
-async def get_ongoing_contest(id: int, user: User = Depends(get_current_user), session=Depends(get_session)):
+async def get_ongoing_contest(id: int, user: User = Depends(get_current_user), session=Depends(get_async_read_session)):
     """
     Get ongoing contest info
 
@@ -93,7 +94,7 @@ async def get_ongoing_contest(id: int, user: User = Depends(get_current_user), s
         id: int
     """
     try:
-        contest: ContestRead = read_ongoing(id, user, session)
+        contest: ContestRead = await read_ongoing(id, user, session)
         return contest
     
     except HTTPException as e:
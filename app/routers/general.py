@@ -1,7 +1,8 @@
 from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, WebSocket
+from fastapi import APIRouter, Depends, HTTPException, Response, WebSocket
 
-from app.database import get_session
+from app.config import settings
+from app.util.replica import get_async_read_session
 from app.models import Role
 from app.util.jwt import get_websocket_user
 from app.models.mapping.user import User
@@ -19,7 +20,8 @@ async def websocket(socket: WebSocket, user: Annotated[User, Depends(get_websock
     # to keep the connection alive
     while True:
         if socket.client_state.name != "CONNECTED":
-            websocket_manager.disconnect(user.id)
+            # only this connection, the other tabs of the user stay open
+            websocket_manager.remove(socket, user.id)
             break
         data = await socket.receive()
         print(f"Received data from user {user.id}: {data}")
@@ -29,12 +31,15 @@ router = APIRouter(
 )
 
 @router.get("/dashboard/stats", summary="Get dashboard statistics")
-async def dashboard_stats(session=Depends(get_session)):
+async def dashboard_stats(response: Response, session=Depends(get_async_read_session)):
     """
     Get dashboard statistics
     """
     try:
-        return get_dashboard_stats(session)
+        statistics = await get_dashboard_stats(session)
+        # the same for everyone, browsers and proxies can keep it for a while
+        response.headers["Cache-Control"] = f"public, max-age={settings.STATISTICS_MAX_AGE}"
+        return statistics
     
     except Exception as e:
         raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
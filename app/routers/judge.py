@@ -1,9 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, Body
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, Body, Query
+from fastapi.responses import JSONResponse, FileResponse
 from sqlalchemy.exc import SQLAlchemyError
 from app.util.role_checker import JudgeChecker
-from app.database import get_session
-from app.controllers.judge import get_versions, get_problem_info, accept, save_total as save_total_judge
+from app.database import get_async_session
+from app.controllers.judge import get_versions, get_problem_info, get_blob_path, accept, save_total as save_total_judge
 from app.schemas import SubmissionTestCaseResult, SubmissionCompleteResult
 from app.util.role_checker import get_judge
 
@@ -13,14 +13,14 @@ router = APIRouter(
 )
 
 @router.get("/problem_versions", summary="Get the problem versions", dependencies=[Depends(JudgeChecker())])
-async def get_problem_versions(session=Depends(get_session), judge=Depends(get_judge)):
+async def get_problem_versions(session=Depends(get_async_session), judge=Depends(get_judge)):
     """
     Get the problem versions
     """
 
     try:
         # get the problem versions
-        problems = get_versions(session, judge)
+        problems = await get_versions(session, judge)
         return problems
     
     except HTTPException as e:
@@ -29,27 +29,45 @@ async def get_problem_versions(session=Depends(get_session), judge=Depends(get_j
         raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
 
 @router.post("/problems/config/{id}", summary="Get the problem configuration", dependencies=[Depends(JudgeChecker())])
-async def get_problem_config(id: int, session=Depends(get_session), judge=Depends(get_judge)):
+async def get_problem_config(id: int, blobs: bool = Query(False), session=Depends(get_async_session), judge=Depends(get_judge)):
     """
     Get the problem configuration
     
     Args:
         id: int
+        blobs: bool (only the files up to TEST_CASE_INLINE_BYTES are inline, the larger ones are downloaded from /blobs/{hash})
     """
 
     try:
         # get the problem configuration
-        problem = get_problem_info(id, session, judge)
+        problem = await get_problem_info(id, session, judge, blobs)
         return problem
     
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
-    
+
+
+@router.get("/blobs/{digest}", summary="Download a test case file", dependencies=[Depends(JudgeChecker())])
+async def get_blob(digest: str):
+    """
+    Download a test case file by its sha256, streamed from the blob store
+
+    Args:
+        digest: str
+    """
+
+    try:
+        return FileResponse(get_blob_path(digest), media_type="application/octet-stream")
+
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
 
 @router.post("/submissions/{id}", summary="Accept the result of a submission", dependencies=[Depends(JudgeChecker())])
-async def accept_submission(id: int, body: SubmissionTestCaseResult = Body(), session = Depends(get_session)):
+async def accept_submission(id: int, body: SubmissionTestCaseResult = Body(), session = Depends(get_async_session)):
     """
     Accept the result of a submission
 
@@ -73,7 +91,7 @@ async def accept_submission(id: int, body: SubmissionTestCaseResult = Body(), se
         raise HTTPException(status_code=500, detail="Internal server error")
     
 @router.post("/submissions/{id}/total", summary="Get the total score of a submission", dependencies=[Depends(JudgeChecker())])
-async def save_total(id: int, complete_result: SubmissionCompleteResult = Body(), session = Depends(get_session)):
+async def save_total(id: int, complete_result: SubmissionCompleteResult = Body(), session = Depends(get_async_session)):
     """
     Get the total test case of a submission
 
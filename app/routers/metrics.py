@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Response
+
+from app.util.metrics import render
+
+router = APIRouter(
+    tags=["Metrics"],
+)
+
+@router.get("/metrics", summary="Prometheus metrics", include_in_schema=False)
+async def metrics():
+    """
+    The metrics of the API in the Prometheus text format, of all the workers when PROMETHEUS_MULTIPROC_DIR is set
+    """
+    content, content_type = render()
+    return Response(content=content, media_type=content_type)
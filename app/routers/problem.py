@@ -8,7 +8,7 @@ from app.util.jwt import get_current_user
 from app.util.role_checker import RoleChecker
 from app.controllers.problem import list_visible_problems, read
 from app.schemas import ProblemListResponse
-from app.database import get_session
+from app.util.replica import get_read_session
 
 router = APIRouter(
     tags=["Problems"],
@@ -17,7 +17,7 @@ router = APIRouter(
 
 
 @router.get("/", response_model=ProblemListResponse, summary="List problems", dependencies=[Depends(RoleChecker([Role.USER]))])
-async def list_problems(pagination: PaginationParams = Depends(get_pagination_params), session=Depends(get_session)):
+async def list_problems(pagination: PaginationParams = Depends(get_pagination_params), session=Depends(get_read_session)):
     """
     List problems
 
@@ -35,7 +35,7 @@ async def list_problems(pagination: PaginationParams = Depends(get_pagination_pa
         raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
     
 @router.get("/{id}", response_model=ProblemRead, summary="Get problem by id", dependencies=[Depends(RoleChecker([Role.GUEST]))])
-async def read_problem(id: int, user=Depends(get_current_user), session=Depends(get_session)):
+async def read_problem(id: int, user=Depends(get_current_user)):
     """
     Get problem by id
 
@@ -44,7 +44,7 @@ async def read_problem(id: int, user=Depends(get_current_user), session=Depends(
     """
 
     try:
-        problem: ProblemRead = read(id, user, session)
+        problem: ProblemRead = read(id, user)
         return problem
     
     except HTTPException as e:
@@ -53,7 +53,7 @@ async def read_problem(id: int, user=Depends(get_current_user), session=Depends(
         raise HTTPException(status_code=500, detail="An unexpected error occurred: " + str(e))
     
 @router.get("/languages/available", summary="Get the available languages", dependencies=[Depends(RoleChecker([Role.GUEST]))])
-async def list_languages(session=Depends(get_session)):
+async def list_languages():
     """
     Get all available languages
 
@@ -62,7 +62,7 @@ async def list_languages(session=Depends(get_session)):
     """
 
     try:
-        languages = list_available_languages(session)
+        languages = list_available_languages()
         return languages
     
     except HTTPException as e:
@@ -6,7 +6,8 @@ from app.models.role import Role
 from app.controllers.submission import create, get_submission_results, submission_by_problem
 
 from app.schemas import SubmissionCreate
-from app.database import get_session
+from app.database import get_async_session
+from app.util.replica import get_async_read_session
 from app.schemas import ProblemSubmissions, PaginationParams, get_pagination_params
 from app.util.role_checker import RoleChecker
 from app.util.jwt import get_current_user
@@ -17,7 +18,7 @@ router = APIRouter(
 )
 
 @router.get("/results", summary="Return a list of the saved possible states of a submission",  dependencies=[Depends(RoleChecker([Role.USER]))])
-async def get_submission_result_types(session = Depends(get_session)):
+async def get_submission_result_types():
     """
     Return a list of the saved possible states of a submission
 
@@ -26,7 +27,7 @@ async def get_submission_result_types(session = Depends(get_session)):
     """
 
     try:
-        return get_submission_results(session)
+        return await get_submission_results()
 
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -36,7 +37,7 @@ async def get_submission_result_types(session = Depends(get_session)):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.post("", summary="Submit a solution to a problem",  dependencies=[Depends(RoleChecker([Role.USER]))])
-async def submit_solution(submission: SubmissionCreate = Body(), session = Depends(get_session), user = Depends(get_current_user)):
+async def submit_solution(submission: SubmissionCreate = Body(), session = Depends(get_async_session), user = Depends(get_current_user)):
     """
     Submit a solution to a problem
 
@@ -47,7 +48,7 @@ async def submit_solution(submission: SubmissionCreate = Body(), session = Depen
         JSONResponse: The response
     """
     try:
-        submission = create(submission, session, user)
+        submission = await create(submission, session, user)
 
         return JSONResponse(content={"message": "submission sent successfully"}, status_code=201)
     
@@ -59,7 +60,7 @@ async def submit_solution(submission: SubmissionCreate = Body(), session = Depen
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/problem/{problem_id}", response_model=ProblemSubmissions, summary="Get all submissions sent", dependencies=[Depends(RoleChecker([Role.USER]))])
-async def get_submissions_by_problem(problem_id: int, pagination: PaginationParams = Depends(get_pagination_params), user = Depends(get_current_user), session = Depends(get_session)):
+async def get_submissions_by_problem(problem_id: int, pagination: PaginationParams = Depends(get_pagination_params), user = Depends(get_current_user), session = Depends(get_async_read_session)):
     """
     Get all submissions sent
 
@@ -71,7 +72,7 @@ async def get_submissions_by_problem(problem_id: int, pagination: PaginationPara
     """
 
     try:
-        return submission_by_problem(pagination, problem_id, user, session)
+        return await submission_by_problem(pagination, problem_id, user, session)
 
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -5,7 +5,7 @@ from app.util.role_checker import RoleChecker
 from app.util.jwt import get_current_user
 from app.controllers.user import read_me, get_profile_info, get_submission_history
 from app.schemas import UserResponse, ProfileResponse, SubmissionHistory
-from app.database import get_session
+from app.util.replica import get_read_session
 
 router = APIRouter(
     tags=["Users"],
@@ -13,7 +13,7 @@ router = APIRouter(
 )
 
 @router.get("/me", response_model=UserResponse, summary="Get the logged user", dependencies=[Depends(RoleChecker([Role.USER]))])
-async def read_user_me(current_user=Depends(get_current_user), session=Depends(get_session)):
+async def read_user_me(current_user=Depends(get_current_user), session=Depends(get_read_session)):
     """
     Get the logged user
     """
@@ -29,7 +29,7 @@ async def read_user_me(current_user=Depends(get_current_user), session=Depends(g
 
 
 @router.get("/profile/info", response_model=ProfileResponse, summary="Get information of the logged user", dependencies=[Depends(RoleChecker([Role.USER]))])
-async def read_user_profile(current_user=Depends(get_current_user), session=Depends(get_session)):
+async def read_user_profile(current_user=Depends(get_current_user), session=Depends(get_read_session)):
     """
     Get information of the logged user
     """
@@ -45,7 +45,7 @@ async def read_user_profile(current_user=Depends(get_current_user), session=Depe
     
 
 @router.get("/sub_history", response_model=SubmissionHistory, summary="Get the submission history of the logged user", dependencies=[Depends(RoleChecker([Role.USER]))])
-async def read_user_sub_history(pagination : PaginationParams = Depends(get_pagination_params), current_user=Depends(get_current_user), session=Depends(get_session)):
+async def read_user_sub_history(pagination : PaginationParams = Depends(get_pagination_params), current_user=Depends(get_current_user), session=Depends(get_read_session)):
     """
     Get the submission history of the logged user
     """
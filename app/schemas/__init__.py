@@ -7,7 +7,8 @@ from .pagination import PaginationParams, get_pagination_params
 from .judge import JudgeCreate, JudgeResponse, JudgeListResponse, JudgeProblem, Constraint, TestCase
 from .user import (
     UserCreate, UserUpdate, UserResponse, UserListResponse,
-    ProfileResponse, SubmissionHistory, SubmissionRecord
+    ProfileResponse, SubmissionHistory, SubmissionRecord,
+    UserImportError, UserImportResponse
 )
 from .submission import (
     SubmissionCreate, SubmissionResponse, SubmissionTestCaseResult, 
@@ -22,4 +23,6 @@ from .contest import (
 from .problem import (
     ProblemInfo, ProblemCreate, ProblemUpdate, ProblemRead,
     ProblemListResponse, ProblemConstraint, ProblemAuthor, ProblemTestCase,
-)
\ No newline at end of file
+    ProblemTestCaseRead, ProblemTestCasesUpload,
+)
+from .metrics import QueryProfilerUpdate
\ No newline at end of file
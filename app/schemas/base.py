@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic import BaseModel, ConfigDict
 
 # Request objects definition
@@ -16,7 +17,9 @@ class BaseResponse(BaseModel):
         )
 
 class BaseListResponse(BaseResponse):
-    count: int
+    # None when the count was not requested
+    count: Optional[int]
+    next_cursor: Optional[str] = None
 
     model_config = ConfigDict(
         from_attributes=True,
@@ -1,5 +1,6 @@
 from app.schemas.base import BaseRequest, BaseResponse, BaseListResponse
 from datetime import datetime
+from typing import Optional
 
 class JudgeCreate(BaseRequest):
     """
@@ -45,8 +46,17 @@ class Constraint(BaseResponse):
     time_limit: int
 
 class TestCase(BaseResponse):
-    input: str
-    output: str
+    """
+    A test case for the judges: the files are always inline, unless the judge asks for
+    blob references (?blobs=true), then only up to TEST_CASE_INLINE_BYTES and the larger
+    ones are null and downloaded from /blobs/{hash}
+    """
+    input: Optional[str] = None
+    output: Optional[str] = None
+    input_hash: Optional[str] = None
+    output_hash: Optional[str] = None
+    input_size: Optional[int] = None
+    output_size: Optional[int] = None
     points: int
     is_pretest: bool
     number: int
@@ -0,0 +1,19 @@
+from typing import Optional
+from pydantic import Field
+
+from app.schemas import BaseRequest
+
+
+class QueryProfilerUpdate(BaseRequest):
+    """
+    Query profiler settings DTO, the missing fields are left unchanged
+
+    Attributes
+        enabled (bool): Whether the statements are sampled
+        sample_rate (float): Share of the statements that are timed, between 0 and 1
+        slow_ms (float): Statements slower than this are logged
+
+    """
+    enabled: Optional[bool] = None
+    sample_rate: Optional[float] = Field(default=None, ge=0, le=1)
+    slow_ms: Optional[float] = Field(default=None, ge=0)
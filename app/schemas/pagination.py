@@ -1,5 +1,5 @@
 from pydantic import Field
-from typing import Optional
+from typing import Literal, Optional
 from app.schemas.base import BaseRequest
 from fastapi import Query
 
@@ -10,17 +10,23 @@ class PaginationParams(BaseRequest):
     Attributes
         page (int): The page number
         size (int): The page size
+        cursor (str): The opaque cursor of the next page, returned by the previous one
+        count (str): How the total is computed: exact, estimated or none
 
     """
     limit: int = Field(10, description="The maximum number of record to return")
-    offset: int = Field(0, description="The number of record to skip")
+    offset: int = Field(0, description="The number of record to skip (ignored with a cursor)")
     search_filter: Optional[str] = Field(None, description="Search filter string")
+    cursor: Optional[str] = Field(None, description="Cursor of the page, the next_cursor of the previous page")
+    count: Literal["exact", "estimated", "none"] = Field("exact", description="How the total count is computed")
 
 
 def get_pagination_params(
     limit: int = Query(15, ge=1),
     offset: int = Query(0, ge=0),
     search: str = Query(None),
+    cursor: str = Query(None),
+    count: Literal["exact", "estimated", "none"] = Query("exact"),
 ) -> PaginationParams:
-    return PaginationParams(limit=limit, offset=offset, search_filter=search)
+    return PaginationParams(limit=limit, offset=offset, search_filter=search, cursor=cursor, count=count)
 
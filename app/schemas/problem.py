@@ -1,14 +1,44 @@
+from pydantic import model_validator
 from app.schemas.base import BaseRequest, BaseResponse, BaseListResponse
 from typing import List, Optional
 from app.models import Difficulty
 
 class ProblemTestCase(BaseRequest):
-    input: str
-    output: str
+    """
+    A test case of a problem, its files either inline or as the hashes of uploaded blobs
+    (see POST /admin/problems/{id}/test_cases). On update, the stored notes are kept when
+    the notes are not sent
+    """
+    notes: Optional[str] = None
+    input: Optional[str] = None
+    output: Optional[str] = None
+    input_hash: Optional[str] = None
+    output_hash: Optional[str] = None
     points: int
     is_pretest: bool
     number: int
 
+    @model_validator(mode="after")
+    def check_files(self):
+        if self.input is None and self.input_hash is None:
+            raise ValueError("Either input or input_hash is required")
+        if self.output is None and self.output_hash is None:
+            raise ValueError("Either output or output_hash is required")
+        return self
+
+class ProblemTestCaseRead(BaseResponse):
+    """ A test case with its files, inline only when small (TEST_CASE_INLINE_BYTES) """
+    number: int
+    notes: Optional[str] = None
+    points: int
+    is_pretest: bool
+    input: Optional[str] = None
+    output: Optional[str] = None
+    input_hash: Optional[str] = None
+    output_hash: Optional[str] = None
+    input_size: Optional[int] = None
+    output_size: Optional[int] = None
+
 class ProblemConstraint(BaseRequest):
     language_id: int
     memory_limit: int
@@ -44,9 +74,12 @@ class ProblemRead(BaseResponse):
     is_public: bool
     author: ProblemAuthor
     difficulty: Difficulty
-    test_cases: List[ProblemTestCase]
+    test_cases: List[ProblemTestCaseRead]
     constraints: List[ProblemConstraint]
 
+class ProblemTestCasesUpload(BaseResponse):
+    config_version_number: int
+    test_cases: List[ProblemTestCaseRead]
 
 class ProblemInfo(BaseResponse):
     id: Optional[int] = None
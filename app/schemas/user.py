@@ -83,3 +83,31 @@ class SubmissionRecord(BaseResponse):
 
 class SubmissionHistory(BaseListResponse):
     submissions: list[SubmissionRecord]
+
+class UserImportError(BaseResponse):
+    """
+    User Import Error DTO
+
+    Attributes
+        row (int): The row number in the uploaded file (header excluded)
+        username (str): The username of the row, if any
+        detail (str): The reason why the row was not imported
+
+    """
+    row: int
+    username: str | None = None
+    detail: str
+
+class UserImportResponse(BaseResponse):
+    """
+    User Import Response DTO
+
+    Attributes
+        created (int): The number of created users
+        registered (int): The number of users registered to the contest
+        errors (List[UserImportError]): The rows that were not imported
+
+    """
+    created: int
+    registered: int
+    errors: list[UserImportError]
@@ -0,0 +1,48 @@
+"""
+Microbenchmark of the per request authentication overhead (token verification)
+
+Usage:
+    python -m app.test.benchmark.auth --iterations 2000
+"""
+import time
+import click
+from jose import jwt
+
+from app.config import settings
+from app.util.jwt import get_tokens, decode_token, token_cache
+
+def _measure(func, iterations: int) -> float:
+    """ Return the mean time per call in microseconds """
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+def _decode_before(token: str):
+    # the old behaviour: PEM parsing and signature verification on every request
+    jwt.decode(token, settings.PUBLIC_KEY, algorithms=[settings.ALGORITHM])
+
+def _decode_cold(token: str):
+    # parsed key, but every request is a new session
+    token_cache.clear()
+    decode_token(token)
+
+@click.command()
+@click.option("--iterations", default=2000, help="Number of decoded tokens per scenario")
+def main(iterations: int):
+    """ Compare the authentication overhead before and after the key/token caching """
+    token = get_tokens(1, "benchmark", 1)["access_token"]
+    decode_token(token)
+
+    results = {
+        "before (PEM parse + verify)": _measure(lambda: _decode_before(token), iterations),
+        "after, cold (parsed key + verify)": _measure(lambda: _decode_cold(token), iterations),
+        "after, warm (cached token)": _measure(lambda: decode_token(token), iterations),
+    }
+
+    baseline = results["before (PEM parse + verify)"]
+    for name, us in results.items():
+        click.echo(f"{name:<36} {us:10.2f} us/request  x{baseline / us:8.1f}")
+
+if __name__ == "__main__":
+    main()
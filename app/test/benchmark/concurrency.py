@@ -0,0 +1,81 @@
+"""
+Load benchmark of the read endpoints under concurrency, against a running server
+
+Every client keeps its own connection and sends requests back to back,
+the requests per second and the latency percentiles are reported per endpoint.
+Run it before and after a change on the same dataset to compare the throughput.
+
+Usage:
+    python -m app.test.benchmark.concurrency --clients 200 --requests 4000 --user-id 2 --username user
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import click
+import requests
+
+from app.test.mock import base_url
+from app.util.jwt import get_tokens
+
+DEFAULT_PATHS = [
+    "contests/info",
+    "submissions/results",
+]
+
+def _percentile(values: list, percentile: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percentile))]
+
+def _run(url: str, headers: dict, clients: int, total: int) -> dict:
+    local = threading.local()
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def request(_):
+        nonlocal errors
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+
+        start = time.perf_counter()
+        try:
+            ok = local.session.get(url, headers=headers, timeout=30).status_code < 500
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - start
+
+        with lock:
+            latencies.append(elapsed)
+            errors += not ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(request, range(total)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests_per_second": total / elapsed,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+        "errors": errors,
+    }
+
+@click.command()
+@click.option("--url", default=base_url, help="Base url of the running server")
+@click.option("--clients", default=200, help="Number of concurrent clients")
+@click.option("--requests", "total", default=4000, help="Total number of requests per endpoint")
+@click.option("--path", "paths", multiple=True, default=DEFAULT_PATHS, help="Endpoint to load (repeatable)")
+@click.option("--user-id", default=1, help="Id of the user the token is issued for")
+@click.option("--username", default="admin", help="Username the token is issued for")
+@click.option("--permissions", default=127, help="Permission mask of the token")
+def main(url: str, clients: int, total: int, paths: tuple, user_id: int, username: str, permissions: int):
+    """ Measure the requests per second of the read endpoints with many concurrent clients """
+    token = get_tokens(user_id, username, permissions)["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    for path in paths:
+        result = _run(url.rstrip("/") + "/" + path.lstrip("/"), headers, clients, total)
+        click.echo(f"{path:<24} {result['requests_per_second']:8.1f} req/s  p50 {result['p50_ms']:8.1f} ms  p99 {result['p99_ms']:8.1f} ms  errors {result['errors']}")
+
+if __name__ == "__main__":
+    main()
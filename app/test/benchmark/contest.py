@@ -0,0 +1,353 @@
+"""
+Load test of a live contest, against a running server with its Postgres and RabbitMQ
+
+A synthetic contest is seeded straight into the database (users, problems with their test
+cases, and a history of judged submissions), then the traffic of a contest start is replayed:
+
+- every user submits a solution at once (the burst), then keeps submitting now and then
+- judges consume the RabbitMQ queue of the server and post a result per test case and the total
+- users poll the scoreboard
+- users keep a WebSocket open and receive the results of their submissions
+
+The throughput and the p50/p95/p99 latency of every endpoint, and the time from a submission
+to its verdict on the WebSocket, are printed and saved as JSON (with the commit) to compare runs.
+Use a throwaway database: the seeded rows are not removed.
+
+Usage:
+    docker compose up -d postgres rabbitmq
+    python -m app.test.benchmark.contest --users 500 --problems 10 --history 20000 --duration 60
+    python -m app.test.benchmark.contest ... --compare benchmark-results/<previous run>.json
+"""
+import os
+import json
+import time
+import random
+import threading
+import subprocess
+from hashlib import sha256
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+import click
+import pika
+import requests
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+from websockets.sync.client import connect
+
+from app.config import settings
+from app.models.role import Role
+from app.models.enums import Difficulty
+from app.models.mapping import User, UserType, Language, Problem, ProblemConstraint, ProblemTestCase
+from app.models.mapping import Contest, ContestUser, ContestProblem, Submission, ContestSubmission, SubmissionTestCase
+from app.test.mock import base_url
+from app.util.blob_store import digest_of
+from app.util.jwt import get_tokens
+
+ACCEPTED = 1
+WRONG_ANSWER = 2
+
+@dataclass
+class SeededContest:
+    contest_id: int
+    users: list
+    problem_ids: list
+    test_cases: int
+    language_id: int
+    judge_token: str
+
+def _insert(session: Session, model, rows: list, batch: int = 5000) -> list:
+    # executemany with RETURNING, the ids in the order of the rows
+    ids = []
+    statement = insert(model).returning(model.id, sort_by_parameter_order=True)
+    for start in range(0, len(rows), batch):
+        ids.extend(session.scalars(statement, rows[start:start + batch]).all())
+    return ids
+
+def seed(users: int, problems: int, test_cases: int, history: int, seed_value: int) -> SeededContest:
+    """ Create an ongoing contest with its users, problems and judged submissions """
+    rng = random.Random(seed_value)
+    run = f"load{seed_value}_{int(time.time())}"
+    now = datetime.now()
+
+    with Session(create_engine(settings.get_connection_string)) as session:
+        user_type_id = session.scalar(select(UserType.id).filter(UserType.permissions == Role.USER))
+        judge_type_id = session.scalar(select(UserType.id).filter(UserType.permissions == Role.JUDGE))
+        language_id = session.scalar(select(Language.id).order_by(Language.id))
+        if user_type_id is None or judge_type_id is None or language_id is None:
+            raise click.ClickException("Run python manage.py loaddata first (user types and languages)")
+
+        # the password hash is never verified, the users authenticate with issued tokens
+        user_rows = [{
+            "username": f"{run}_user{i}",
+            "email": f"{run}_user{i}@example.com",
+            "password_hash": "-",
+            "salt": "",
+            "user_type_id": user_type_id,
+            "registered_at": now,
+        } for i in range(users)]
+        user_ids = _insert(session, User, user_rows)
+
+        judge_name = f"{run}_judge"
+        judge_hash = sha256(f"{judge_name}:{run}".encode()).hexdigest()
+        session.execute(insert(User), [{
+            "username": judge_name, "email": judge_name, "password_hash": judge_hash, "salt": "", "user_type_id": judge_type_id,
+        }])
+
+        problem_ids = _insert(session, Problem, [{
+            "title": f"{run} problem {i}",
+            "description": "Load test problem",
+            "points": 100,
+            "is_public": False,
+            "difficulty": rng.choice(list(Difficulty)),
+            "author_id": user_ids[0],
+        } for i in range(problems)])
+        session.execute(insert(ProblemConstraint), [
+            {"problem_id": problem_id, "language_id": language_id, "memory_limit": 256, "time_limit": 1000} for problem_id in problem_ids
+        ])
+        test_file = digest_of("1")
+        session.execute(insert(ProblemTestCase), [{
+            "problem_id": problem_id, "number": number, "input": "1", "output": "1",
+            "input_hash": test_file.digest, "output_hash": test_file.digest, "input_size": test_file.size, "output_size": test_file.size,
+            "points": 100 // test_cases, "is_pretest": number == 1,
+        } for problem_id in problem_ids for number in range(1, test_cases + 1)])
+
+        contest_id = _insert(session, Contest, [{
+            "name": f"{run} contest",
+            "description": "Load test contest",
+            "start_datetime": now - timedelta(hours=1),
+            "end_datetime": now + timedelta(hours=4),
+            "is_public": True,
+            "is_registration_open": False,
+        }])[0]
+        session.execute(insert(ContestUser), [{"contest_id": contest_id, "user_id": user_id, "score": 0} for user_id in user_ids])
+        session.execute(insert(ContestProblem), [{"contest_id": contest_id, "problem_id": problem_id, "publication_delay": 0} for problem_id in problem_ids])
+
+        # the judged submissions of the first hour of the contest
+        for start in range(0, history, 5000):
+            rows = []
+            results = []
+            for _ in range(min(5000, history - start)):
+                passed = [rng.random() < 0.6 for _ in range(test_cases)]
+                results.append(passed)
+                rows.append({
+                    "submitted_code": "print(input())",
+                    "problem_id": rng.choice(problem_ids),
+                    "user_id": rng.choice(user_ids),
+                    "language_id": language_id,
+                    "created_at": now - timedelta(seconds=rng.randint(60, 3600)),
+                    "score": sum(passed) * (100 // test_cases),
+                    "submission_result_id": ACCEPTED if all(passed) else WRONG_ANSWER,
+                    "is_pretest_run": False,
+                })
+            submission_ids = _insert(session, Submission, rows)
+            session.execute(insert(ContestSubmission), [{"contest_id": contest_id, "submission_id": id} for id in submission_ids])
+            session.execute(insert(SubmissionTestCase), [{
+                "submission_id": submission_id, "number": number + 1, "notes": "", "memory": 1024, "time": 0.01,
+                "result_id": ACCEPTED if ok else WRONG_ANSWER,
+            } for submission_id, passed in zip(submission_ids, results) for number, ok in enumerate(passed)])
+        session.commit()
+
+    return SeededContest(
+        contest_id=contest_id,
+        users=[(user_id, row["username"]) for user_id, row in zip(user_ids, user_rows)],
+        problem_ids=problem_ids,
+        test_cases=test_cases,
+        language_id=language_id,
+        judge_token=f"{judge_name}:{judge_hash}",
+    )
+
+@dataclass
+class Recorder:
+    """ Latencies (seconds) and errors per operation """
+    latencies: dict = field(default_factory=dict)
+    errors: dict = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def record(self, name: str, seconds: float, ok: bool = True):
+        with self.lock:
+            self.latencies.setdefault(name, []).append(seconds)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def timed(self, name: str, session: requests.Session, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=30, **kwargs)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            response, ok = None, False
+        self.record(name, time.perf_counter() - start, ok)
+        return response
+
+    def report(self, elapsed: float) -> dict:
+        report = {}
+        for name, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            report[name] = {
+                "count": len(values),
+                "per_second": round(len(values) / elapsed, 2),
+                "p50_ms": round(_percentile(values, 0.50) * 1000, 2),
+                "p95_ms": round(_percentile(values, 0.95) * 1000, 2),
+                "p99_ms": round(_percentile(values, 0.99) * 1000, 2),
+                "errors": self.errors.get(name, 0),
+            }
+        return report
+
+def _percentile(values: list, percentile: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * percentile))]
+
+def _user_headers(user: tuple) -> dict:
+    return {"Authorization": "Bearer " + get_tokens(user[0], user[1], int(Role.USER))["access_token"]}
+
+def _submitter(url: str, contest: SeededContest, user: tuple, recorder: Recorder, submitted: dict, stop: threading.Event, interval: float):
+    session = requests.Session()
+    session.headers.update(_user_headers(user))
+    rng = random.Random(user[0])
+    while True:
+        body = {
+            "problem_id": rng.choice(contest.problem_ids),
+            "language_id": contest.language_id,
+            "contest_id": contest.contest_id,
+            "submitted_code": "print(input())",
+            "notes": "",
+            "is_pretest_run": False,
+        }
+        submitted.setdefault(user[0], []).append(time.perf_counter())
+        recorder.timed("POST /submissions", session, "POST", url + "submissions", json=body)
+        # the next submission of the user, the rate limit allows 5 a minute
+        if stop.wait(rng.uniform(interval / 2, interval * 1.5)):
+            return
+
+def _judge(url: str, contest: SeededContest, recorder: Recorder, stop: threading.Event, delay: float):
+    session = requests.Session()
+    session.headers.update({"Authorization": f"Bearer {contest.judge_token}"})
+    credentials = pika.PlainCredentials(settings.RABBITMQ_USER, settings.RABBITMQ_PASS)
+    connection = pika.BlockingConnection(pika.ConnectionParameters(host=settings.RABBITMQ_HOST, port=settings.RABBITMQ_PORT, credentials=credentials))
+    channel = connection.channel()
+    channel.queue_declare(queue="submissions", durable=True)
+    channel.basic_qos(prefetch_count=1)
+    rng = random.Random()
+
+    while not stop.is_set():
+        method, _, body = channel.basic_get(queue="submissions")
+        if method is None:
+            connection.sleep(0.05)
+            continue
+        submission = json.loads(body)
+        id = submission["submission_id"]
+        passed = True
+        for number in range(1, contest.test_cases + 1):
+            # the time of the run
+            time.sleep(delay)
+            ok = rng.random() < 0.7
+            passed = passed and ok
+            recorder.timed("POST /submissions/{id}", session, "POST", url + f"submissions/{id}", json={
+                "result_id": ACCEPTED if ok else WRONG_ANSWER, "number": number, "notes": "", "memory": 1024, "time": delay,
+            })
+        recorder.timed("POST /submissions/{id}/total", session, "POST", url + f"submissions/{id}/total", json={
+            "result_id": ACCEPTED if passed else WRONG_ANSWER, "stderr": "",
+        })
+        channel.basic_ack(method.delivery_tag)
+    connection.close()
+
+def _scoreboard_poller(url: str, contest: SeededContest, user: tuple, recorder: Recorder, stop: threading.Event, interval: float):
+    session = requests.Session()
+    session.headers.update(_user_headers(user))
+    while not stop.is_set():
+        recorder.timed("POST /contests/{id}/scoreboard", session, "POST", url + f"contests/{contest.contest_id}/scoreboard")
+        stop.wait(interval)
+
+def _listener(url: str, user: tuple, recorder: Recorder, submitted: dict, stop: threading.Event):
+    token = get_tokens(user[0], user[1], int(Role.USER))["access_token"]
+    ws_url = url.replace("http", "ws", 1) + "general/ws"
+    try:
+        with connect(ws_url, additional_headers={"Cookie": f"token={token}"}, open_timeout=30) as socket:
+            while not stop.is_set():
+                try:
+                    message = json.loads(socket.recv(timeout=0.5))
+                except TimeoutError:
+                    continue
+                if message.get("type") == "total" and submitted.get(user[0]):
+                    # the verdict of the oldest submission of the user still waiting for one
+                    recorder.record("submit to verdict (websocket)", time.perf_counter() - submitted[user[0]].pop(0))
+    except Exception:
+        recorder.record("WS /general/ws", 0, ok=False)
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+def _print(report: dict, previous: dict = None):
+    for name, row in report.items():
+        line = f"{name:<34} {row['count']:7d}  {row['per_second']:8.1f}/s  p50 {row['p50_ms']:8.1f}  p95 {row['p95_ms']:8.1f}  p99 {row['p99_ms']:8.1f} ms  errors {row['errors']}"
+        if previous and name in previous:
+            line += f"  (p95 {row['p95_ms'] - previous[name]['p95_ms']:+.1f} ms)"
+        click.echo(line)
+
+@click.command()
+@click.option("--url", default=base_url, help="Base url of the running server")
+@click.option("--users", default=200, help="Users of the contest, all of them submit at the start")
+@click.option("--problems", default=8, help="Problems of the contest")
+@click.option("--test-cases", default=5, help="Test cases per problem")
+@click.option("--history", default=10000, help="Judged submissions already in the contest")
+@click.option("--duration", default=60, help="Seconds of traffic after the start of the burst")
+@click.option("--judges", default=4, help="Concurrent judges consuming the queue")
+@click.option("--judge-delay", default=0.01, help="Seconds a judge takes per test case")
+@click.option("--pollers", default=50, help="Users polling the scoreboard")
+@click.option("--poll-interval", default=5.0, help="Seconds between two polls of a user")
+@click.option("--listeners", default=100, help="Users with a WebSocket open")
+@click.option("--submit-interval", default=20.0, help="Mean seconds between two submissions of a user")
+@click.option("--seed", "seed_value", default=42, help="Seed of the generated data")
+@click.option("--output", default=None, help="Where to save the JSON results, by default benchmark-results/contest-<commit>-<time>.json")
+@click.option("--compare", default=None, type=click.Path(exists=True), help="Results of a previous run to compare with")
+def main(url: str, users: int, problems: int, test_cases: int, history: int, duration: int, judges: int, judge_delay: float,
+         pollers: int, poll_interval: float, listeners: int, submit_interval: float, seed_value: int, output: str, compare: str):
+    """ Seed a large contest and replay the traffic of its start """
+    url = url.rstrip("/") + "/"
+    parameters = {key: value for key, value in locals().items() if key not in ("output", "compare")}
+
+    click.echo(f"Seeding {users} users, {problems} problems, {history} submissions...")
+    start = time.perf_counter()
+    contest = seed(users, problems, test_cases, history, seed_value)
+    click.echo(f"Seeded contest {contest.contest_id} in {time.perf_counter() - start:.1f} s")
+
+    recorder = Recorder()
+    submitted: dict = {}
+    stop = threading.Event()
+    threads = [threading.Thread(target=_listener, args=(url, user, recorder, submitted, stop)) for user in contest.users[:listeners]]
+    threads += [threading.Thread(target=_judge, args=(url, contest, recorder, stop, judge_delay)) for _ in range(judges)]
+    threads += [threading.Thread(target=_scoreboard_poller, args=(url, contest, user, recorder, stop, poll_interval)) for user in contest.users[-pollers:]]
+    for thread in threads:
+        thread.start()
+    # the listeners are connected before the burst
+    time.sleep(2)
+
+    start = time.perf_counter()
+    submitters = [threading.Thread(target=_submitter, args=(url, contest, user, recorder, submitted, stop, submit_interval)) for user in contest.users]
+    for thread in submitters:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads + submitters:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    report = recorder.report(elapsed)
+    previous = None
+    if compare:
+        with open(compare) as file:
+            previous = json.load(file)["results"]
+    _print(report, previous)
+
+    commit = _commit()
+    if output is None:
+        os.makedirs("benchmark-results", exist_ok=True)
+        output = os.path.join("benchmark-results", f"contest-{commit}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(output, "w") as file:
+        json.dump({"commit": commit, "at": datetime.now().isoformat(), "parameters": parameters, "results": report}, file, indent=2)
+    click.echo(f"Results saved to {output}")
+
+if __name__ == "__main__":
+    main()
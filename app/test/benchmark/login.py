@@ -0,0 +1,68 @@
+"""
+Benchmark of the login password check under concurrency
+
+Compares hashing inline on the event loop with the bounded password hashing pool,
+reporting logins per second and the worst event loop stall seen by a ticker task
+
+Usage:
+    python -m app.test.benchmark.login --clients 50 --logins 200
+"""
+import time
+import asyncio
+import click
+
+from app.util.pwd import _hash_password, _verify_password, PasswordHasher
+
+async def _ticker(stalls: list, interval: float = 0.005):
+    # measures how late the event loop runs a task that should wake up every `interval`
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        stalls.append(time.perf_counter() - start - interval)
+
+async def _run(clients: int, logins: int, verify) -> dict:
+    password = "benchmark-password"
+    password_hash, salt = _hash_password(password)
+    semaphore = asyncio.Semaphore(clients)
+
+    async def login():
+        async with semaphore:
+            valid, _ = await verify(password, password_hash, salt)
+            assert valid
+
+    stalls = []
+    ticker = asyncio.create_task(_ticker(stalls))
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    ticker.cancel()
+
+    return {
+        "logins_per_second": logins / elapsed,
+        "max_loop_stall_ms": max(stalls, default=elapsed) * 1000,
+    }
+
+@click.command()
+@click.option("--clients", default=50, help="Number of concurrent clients")
+@click.option("--logins", default=200, help="Total number of logins")
+@click.option("--workers", default=4, help="Size of the hashing pool")
+def main(clients: int, logins: int, workers: int):
+    """ Compare the login throughput with inline and pooled password hashing """
+
+    async def inline(password, password_hash, salt):
+        return _verify_password(password, password_hash, salt)
+
+    hasher = PasswordHasher(workers)
+    scenarios = {
+        "inline (event loop)": inline,
+        f"pool ({workers} workers)": hasher.verify,
+    }
+
+    for name, verify in scenarios.items():
+        result = asyncio.run(_run(clients, logins, verify))
+        click.echo(f"{name:<24} {result['logins_per_second']:8.1f} logins/s  max loop stall {result['max_loop_stall_ms']:8.1f} ms")
+
+    hasher.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,7 @@ from sqlalchemy.exc import SQLAlchemyError
 
 from app.models import Contest, Language, SubmissionResult, Team, UserType, ContestTeam, User, ContestUser, Problem
 from app.models import TeamUser, ContestProblem, ProblemConstraint, ProblemTestCase, Submission, ContestSubmission, SubmissionTestCase
-from app.controllers.auth import _hash_password
+from app.util.pwd import _hash_password
 from app.config import settings
 
 # Database connection
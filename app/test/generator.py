@@ -0,0 +1,365 @@
+"""
+Synthetic datasets at production scale, for the scoreboard and history benchmarks
+
+The rows are streamed into Postgres with COPY FROM STDIN, straight from generators: nothing is
+built in memory but the contest memberships. Every table is split in chunks generated and copied
+by a pool of processes, each chunk with its own random generator seeded from the seed, the table
+and the chunk, so a seed always gives the same dataset whatever the number of workers.
+
+The ids are assigned here, after the highest existing ones, and the sequences are moved past them
+at the end: the dataset can be added to a database that already has data (e.g. the loaddata one).
+The names are derived from the ids, generate on a throwaway database or with a fresh seed.
+
+Usage:
+    python manage.py gendata --users 100000 --problems 5000 --submissions 1000000 --test-cases 10
+"""
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from multiprocessing import Pool
+from typing import Callable, Iterable, Iterator
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+from app.config import settings
+from app.models.role import Role
+from app.models.enums import Difficulty
+from app.models.mapping import Language, Statistic, UserType
+from app.util.blob_store import digest_of
+from app.util.pwd import _hash_password
+from app.util.statistics import COUNTERS
+
+ACCEPTED = 1
+WRONG_ANSWER = 2
+
+# rows per chunk, a chunk is copied in one transaction by one worker
+CHUNK_SIZE = 50_000
+# submissions per chunk, with their test cases
+SUBMISSION_CHUNK_SIZE = 20_000
+
+# the tables with a serial id, their sequences are moved past the generated ids
+SERIAL_TABLES = ("users", "problems", "problem_test_cases", "contests", "submissions", "submission_test_cases")
+
+@dataclass
+class Plan:
+    """
+    What to generate: the sizes, the first id of every table and the contests (windows,
+    participants and problems), shared by the workers so their chunks agree with each other
+    """
+    seed: int
+    now: datetime
+    users: int
+    problems: int
+    contests: int
+    submissions: int
+    test_cases: int
+    contest_share: float
+    user_type_id: int
+    language_ids: list
+    password_hash: str
+    salt: str
+    first_ids: dict
+    windows: list = field(default_factory=list)
+    members: list = field(default_factory=list)
+    problem_sets: list = field(default_factory=list)
+
+    def id(self, table: str, index: int) -> int:
+        return self.first_ids[table] + index
+
+    def started_contests(self) -> list:
+        return [index for index, (start, _) in enumerate(self.windows) if start < self.now]
+
+def _rng(plan: Plan, *key) -> random.Random:
+    # seeding with a string is stable across processes and runs, unlike hash()
+    return random.Random(":".join(str(part) for part in (plan.seed, *key)))
+
+def _value(value) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return str(value)
+
+def _line(*values) -> str:
+    """ A row in the text format of COPY, the generated values have no tabs nor backslashes """
+    return "\t".join(_value(value) for value in values) + "\n"
+
+class CopyStream:
+    """ A file-like reader over a generator of COPY lines, what copy_expert reads from """
+
+    def __init__(self, lines: Iterable[str]):
+        self._lines = iter(lines)
+        self._buffer = bytearray()
+        self.rows = 0
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line.encode()
+            self.rows += 1
+        if size < 0 or size > len(self._buffer):
+            size = len(self._buffer)
+        chunk = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return chunk
+
+    readline = read
+
+def copy(cursor, table: str, columns: tuple, lines: Iterable[str]) -> int:
+    """ Stream the lines into the table, returns the number of rows """
+    stream = CopyStream(lines)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", stream, size=1 << 16)
+    return stream.rows
+
+# row generators, one chunk [start, stop) of a table each
+
+def _users(plan: Plan, chunk: int, start: int, stop: int) -> Iterator[str]:
+    rng = _rng(plan, "users", chunk)
+    for index in range(start, stop):
+        user_id = plan.id("users", index)
+        registered_at = plan.now - timedelta(seconds=rng.randrange(2 * 365 * 86400))
+        yield _line(user_id, f"gen{plan.seed}_user{user_id}", f"gen{plan.seed}_user{user_id}@example.com",
+                    plan.password_hash, plan.salt, registered_at, plan.user_type_id)
+
+def _problems(plan: Plan, chunk: int, start: int, stop: int) -> Iterator[str]:
+    rng = _rng(plan, "problems", chunk)
+    difficulties = [difficulty.name for difficulty in Difficulty]
+    for index in range(start, stop):
+        problem_id = plan.id("problems", index)
+        created_at = plan.now - timedelta(seconds=rng.randrange(2 * 365 * 86400))
+        author_id = plan.id("users", rng.randrange(plan.users))
+        yield _line(problem_id, f"Generated problem {plan.seed}-{problem_id}", "Generated problem statement", 100,
+                    rng.random() < 0.8, 1, created_at, created_at, rng.choice(difficulties), author_id)
+
+def _problem_constraints(plan: Plan, chunk: int, start: int, stop: int) -> Iterator[str]:
+    rng = _rng(plan, "problem_constraints", chunk)
+    for index in range(start, stop):
+        for language_id in plan.language_ids:
+            yield _line(plan.id("problems", index), language_id, rng.choice((64, 128, 256, 512)), rng.choice((500, 1000, 2000)))
+
+def _problem_test_cases(plan: Plan, chunk: int, start: int, stop: int) -> Iterator[str]:
+    points = 100 // plan.test_cases
+    for index in range(start, stop):
+        problem_id = plan.id("problems", index)
+        for number in range(1, plan.test_cases + 1):
+            test_case_id = plan.id("problem_test_cases", index * plan.test_cases + number - 1)
+            # inline, as the test cases not moved to the blob store yet
+            input, output = f"{problem_id} {number}", str(problem_id * number)
+            input_blob, output_blob = digest_of(input), digest_of(output)
+            yield _line(test_case_id, number, None, input, output, input_blob.digest, output_blob.digest, input_blob.size, output_blob.size,
+                        points, number == 1, problem_id)
+
+def _contests(plan: Plan, chunk: int, start: int, stop: int) -> Iterator[str]:
+    for index in range(start, stop):
+        contest_id = plan.id("contests", index)
+        start_datetime, end_datetime = plan.windows[index]
+        yield _line(contest_id, f"Generated contest {plan.seed}-{contest_id}", "Generated contest",
+                    start_datetime, end_datetime, True, start_datetime > plan.now)
+
+def _contest_users(plan: Plan, chunk: int, start: int, stop: int) -> Iterator[str]:
+    # the scores are computed from the submissions at the end
+    for index in range(start, stop):
+        for user in plan.members[index]:
+            yield _line(plan.id("contests", index), plan.id("users", user), 0)
+
+def _contest_problems(plan: Plan, chunk: int, start: int, stop: int) -> Iterator[str]:
+    for index in range(start, stop):
+        for problem in plan.problem_sets[index]:
+            yield _line(plan.id("contests", index), plan.id("problems", problem), 0)
+
+def _submission_draws(plan: Plan, chunk: int, start: int, stop: int) -> Iterator[tuple]:
+    """
+    The submissions of a chunk: (index, user, problem, contest or None, created_at, language, passed test cases mask).
+    Drawn again, identical, for each of the tables they fill
+    """
+    rng = _rng(plan, "submissions", chunk)
+    started = plan.started_contests()
+    for index in range(start, stop):
+        contest = None
+        if started and rng.random() < plan.contest_share:
+            contest = rng.choice(started)
+            user = rng.choice(plan.members[contest])
+            problem = rng.choice(plan.problem_sets[contest])
+            window_start, window_end = plan.windows[contest]
+            length = (min(window_end, plan.now) - window_start).total_seconds()
+            created_at = window_start + timedelta(seconds=rng.random() * length)
+        else:
+            user = rng.randrange(plan.users)
+            problem = rng.randrange(plan.problems)
+            created_at = plan.now - timedelta(seconds=rng.randrange(365 * 86400))
+        language_id = rng.choice(plan.language_ids)
+        # a third of the submissions pass everything, the others a random subset
+        passed = (1 << plan.test_cases) - 1 if rng.random() < 0.33 else rng.getrandbits(plan.test_cases)
+        yield index, user, problem, contest, created_at, language_id, passed
+
+def _submissions(plan: Plan, chunk: int, start: int, stop: int) -> Iterator[str]:
+    everything = (1 << plan.test_cases) - 1
+    points = 100 // plan.test_cases
+    for index, user, problem, _, created_at, language_id, passed in _submission_draws(plan, chunk, start, stop):
+        result_id = ACCEPTED if passed == everything else WRONG_ANSWER
+        yield _line(plan.id("submissions", index), None, created_at, bin(passed).count("1") * points, "print(input())",
+                    plan.id("problems", problem), plan.id("users", user), language_id, result_id, False)
+
+def _submission_test_cases(plan: Plan, chunk: int, start: int, stop: int) -> Iterator[str]:
+    rng = _rng(plan, "submission_test_cases", chunk)
+    for index, _, _, _, _, _, passed in _submission_draws(plan, chunk, start, stop):
+        submission_id = plan.id("submissions", index)
+        for number in range(plan.test_cases):
+            test_case_id = plan.id("submission_test_cases", index * plan.test_cases + number)
+            result_id = ACCEPTED if passed >> number & 1 else WRONG_ANSWER
+            yield _line(test_case_id, number + 1, None, round(rng.uniform(1, 64), 2), round(rng.uniform(0.001, 1), 3), result_id, submission_id)
+
+def _contest_submissions(plan: Plan, chunk: int, start: int, stop: int) -> Iterator[str]:
+    for index, _, _, contest, _, _, _ in _submission_draws(plan, chunk, start, stop):
+        if contest is not None:
+            yield _line(plan.id("contests", contest), plan.id("submissions", index))
+
+COLUMNS = {
+    "users": ("id", "username", "email", "password_hash", "salt", "registered_at", "user_type_id"),
+    "problems": ("id", "title", "description", "points", "is_public", "config_version_number", "created_at", "updated_at", "difficulty", "author_id"),
+    "problem_constraints": ("problem_id", "language_id", "memory_limit", "time_limit"),
+    "problem_test_cases": ("id", "number", "notes", "input", "output", "input_hash", "output_hash", "input_size", "output_size",
+                           "points", "is_pretest", "problem_id"),
+    "contests": ("id", "name", "description", "start_datetime", "end_datetime", "is_public", "is_registration_open"),
+    "contest_users": ("contest_id", "user_id", "score"),
+    "contest_problems": ("contest_id", "problem_id", "publication_delay"),
+    "submissions": ("id", "notes", "created_at", "score", "submitted_code", "problem_id", "user_id", "language_id", "submission_result_id", "is_pretest_run"),
+    "submission_test_cases": ("id", "number", "notes", "memory", "time", "result_id", "submission_id"),
+    "contest_submissions": ("contest_id", "submission_id"),
+}
+
+# a job copies these tables in one transaction, in order (the foreign keys)
+JOBS: dict[str, tuple[tuple[str, Callable], ...]] = {
+    "users": (("users", _users),),
+    "problems": (("problems", _problems),),
+    "contests": (("contests", _contests),),
+    "problem_details": (("problem_constraints", _problem_constraints), ("problem_test_cases", _problem_test_cases)),
+    "contest_users": (("contest_users", _contest_users),),
+    "contest_problems": (("contest_problems", _contest_problems),),
+    "submissions": (("submissions", _submissions), ("submission_test_cases", _submission_test_cases),
+                    ("contest_submissions", _contest_submissions)),
+}
+
+# jobs of a phase run in parallel, a phase starts when the rows it refers to are committed
+PHASES = (("users",), ("problems", "contests"), ("problem_details", "contest_users", "contest_problems"), ("submissions",))
+
+_plan: Plan = None
+_engine = None
+
+def _init_worker(plan: Plan):
+    global _plan, _engine
+    _plan = plan
+    _engine = create_engine(settings.get_connection_string, poolclass=NullPool)
+
+def _run_job(job: tuple) -> dict[str, int]:
+    name, chunk, start, stop = job
+    connection = _engine.raw_connection()
+    try:
+        rows = {}
+        with connection.cursor() as cursor:
+            for table, generator in JOBS[name]:
+                rows[table] = copy(cursor, table, COLUMNS[table], generator(_plan, chunk, start, stop))
+        connection.commit()
+        return rows
+    finally:
+        connection.close()
+
+def _chunks(name: str, plan: Plan) -> list[tuple]:
+    count, size = {
+        "users": (plan.users, CHUNK_SIZE),
+        "problems": (plan.problems, CHUNK_SIZE),
+        "contests": (plan.contests, CHUNK_SIZE),
+        "problem_details": (plan.problems, max(CHUNK_SIZE // max(plan.test_cases, len(plan.language_ids)), 1)),
+        "contest_users": (plan.contests, 100),
+        "contest_problems": (plan.contests, CHUNK_SIZE),
+        "submissions": (plan.submissions, SUBMISSION_CHUNK_SIZE),
+    }[name]
+    return [(name, chunk, start, min(start + size, count)) for chunk, start in enumerate(range(0, count, size))]
+
+def make_plan(session: Session, seed: int, users: int, problems: int, contests: int, submissions: int, test_cases: int,
+              contest_users: int, contest_problems: int, contest_share: float) -> Plan:
+    """ Read the reference rows and the first free ids, and draw the contests """
+    user_type_id = session.scalar(select(UserType.id).filter(UserType.permissions == Role.USER))
+    language_ids = list(session.scalars(select(Language.id).order_by(Language.id)))
+    if user_type_id is None or not language_ids:
+        raise ValueError("Run python manage.py loaddata first (user types and languages)")
+    if submissions and (not users or not problems):
+        raise ValueError("The submissions need users and problems")
+    if problems and not users:
+        raise ValueError("The problems need users, their authors")
+    if not 1 <= test_cases <= 60:
+        raise ValueError("Between 1 and 60 test cases per problem")
+
+    first_ids = {table: session.scalar(text(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}")) for table in SERIAL_TABLES}
+    # every generated user shares the password "password", hashing it once
+    password_hash, salt = _hash_password("password")
+    plan = Plan(seed=seed, now=datetime.now().replace(microsecond=0), users=users, problems=problems, contests=contests,
+                submissions=submissions, test_cases=test_cases, contest_share=contest_share, user_type_id=user_type_id,
+                language_ids=language_ids, password_hash=password_hash, salt=salt, first_ids=first_ids)
+
+    rng = _rng(plan, "contests")
+    for _ in range(contests if users and problems else 0):
+        # mostly over the past year, some ongoing and some upcoming
+        start = plan.now - timedelta(days=rng.uniform(-30, 365))
+        plan.windows.append((start.replace(microsecond=0), (start + timedelta(hours=rng.choice((2, 3, 4, 5)))).replace(microsecond=0)))
+        plan.members.append(rng.sample(range(users), min(contest_users, users)))
+        plan.problem_sets.append(rng.sample(range(problems), min(contest_problems, problems)))
+    plan.contests = len(plan.windows)
+    return plan
+
+def _finish(session: Session, plan: Plan):
+    # the ids were explicit, the sequences continue after them
+    for table in SERIAL_TABLES:
+        session.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table}"))
+
+    # the contest scores: the best submission per problem, added up
+    session.execute(text("""
+        UPDATE contest_users cu SET score = best.score
+        FROM (
+            SELECT contest_id, user_id, SUM(score) AS score FROM (
+                SELECT cs.contest_id, s.user_id, s.problem_id, MAX(s.score) AS score
+                FROM contest_submissions cs JOIN submissions s ON s.id = cs.submission_id
+                WHERE cs.contest_id >= :first_contest
+                GROUP BY cs.contest_id, s.user_id, s.problem_id
+            ) per_problem GROUP BY contest_id, user_id
+        ) best
+        WHERE cu.contest_id = best.contest_id AND cu.user_id = best.user_id
+    """), {"first_contest": plan.first_ids["contests"]})
+
+    # the dashboard counters, recounted as the periodic reconciliation does
+    now = datetime.now()
+    for name, statement in COUNTERS.items():
+        value = session.scalar(statement)
+        session.execute(insert(Statistic).values(name=name, value=value, reconciled_at=now)
+                        .on_conflict_do_update(index_elements=[Statistic.name], set_={"value": value, "reconciled_at": now}))
+    session.commit()
+
+def generate(plan: Plan, workers: int, echo: Callable[[str], None] = print) -> dict[str, int]:
+    """
+    Generate the dataset of the plan with a pool of workers, phase by phase
+
+    Returns:
+        dict[str, int]: the rows copied per table
+    """
+    totals = {table: 0 for table in COLUMNS}
+    with Pool(workers, initializer=_init_worker, initargs=(plan,)) as pool:
+        for phase in PHASES:
+            jobs = [job for name in phase for job in _chunks(name, plan)]
+            started = time.perf_counter()
+            for rows in pool.imap_unordered(_run_job, jobs):
+                for table, count in rows.items():
+                    totals[table] += count
+            echo(f"{', '.join(phase)}: {len(jobs)} chunks in {time.perf_counter() - started:.1f}s")
+
+    engine = create_engine(settings.get_connection_string, poolclass=NullPool)
+    with Session(engine) as session:
+        _finish(session, plan)
+    # fresh planner statistics for the benchmarks, outside of a transaction
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("ANALYZE"))
+    return totals
@@ -1,3 +1,4 @@
+import pytest
 from datetime import timedelta
 from datetime import datetime, timezone
 from jose import jwt
@@ -44,4 +45,13 @@ user_headers = {
     'Content-Type': 'application/json'
 }
 
-base_url = 'http://localhost:9000/'
\ No newline at end of file
+base_url = 'http://localhost:9000/'
+def query_count(response) -> int:
+    # set by the server when it runs with QUERY_COUNT_HEADER=true
+    if "X-Query-Count" not in response.headers:
+        pytest.skip("The server does not send X-Query-Count (QUERY_COUNT_HEADER=true)")
+    return int(response.headers["X-Query-Count"])
+
+def assert_max_queries(response, limit: int):
+    count = query_count(response)
+    assert count <= limit, f"{count} SQL statements, expected at most {limit}"
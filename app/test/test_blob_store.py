@@ -0,0 +1,126 @@
+import io
+import os
+import zipfile
+import asyncio
+import hashlib
+import pytest
+import requests
+from fastapi import HTTPException
+
+from app.test.mock import admin_headers, base_url
+from app.schemas.judge import TestCase
+from app.util.blob_store import LocalBlobStore, BlobTooLarge, digest_of, fill_contents
+import app.util.blob_store as blob_store_module
+import app.controllers.admin.problem as problem_controller
+
+def _zip(files: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = LocalBlobStore(str(tmp_path), max_bytes=1024)
+    monkeypatch.setattr(problem_controller, "blob_store", store)
+    return store
+
+def test_content_addressed(store: LocalBlobStore):
+    blob = store.put_file(io.BytesIO(b"1 2\n" * 100))
+    assert blob.digest == hashlib.sha256(b"1 2\n" * 100).hexdigest()
+    assert blob == digest_of("1 2\n" * 100)
+    assert store.read_text(blob.digest) == "1 2\n" * 100
+
+    # the same content is stored once
+    assert store.put_bytes(b"1 2\n" * 100) == blob
+    assert os.listdir(os.path.join(store.root, "tmp")) == []
+
+    with pytest.raises(BlobTooLarge):
+        store.put_bytes(b"x" * 2000)
+    assert os.listdir(os.path.join(store.root, "tmp")) == []
+    assert not store.exists("../../etc/passwd")
+
+def test_collect(store: LocalBlobStore):
+    kept = store.put_bytes(b"kept")
+    dropped = store.put_bytes(b"dropped")
+    assert store.collect({kept.digest}, min_age=3600) == 0
+    assert store.collect({kept.digest}, min_age=-1) == 1
+    assert store.exists(kept.digest) and not store.exists(dropped.digest)
+
+def test_reuse_refreshes_mtime(store: LocalBlobStore):
+    blob = store.put_bytes(b"reused")
+    path = store.path(blob.digest)
+    os.utime(path, (0, 0))
+
+    # stored again while not referenced yet, collect must keep it
+    assert store.put_bytes(b"reused") == blob
+    assert store.collect(set(), min_age=3600) == 0
+
+    # the inline content or the hash of a test case
+    for content, digest in (("reused", None), (None, blob.digest)):
+        os.utime(path, (0, 0))
+        assert problem_controller._stored_file(content, digest, "input", None) == blob
+        assert store.collect(set(), min_age=3600) == 0
+    assert not store.touch(digest_of("missing").digest)
+
+def test_fill_contents(store: LocalBlobStore, monkeypatch):
+    monkeypatch.setattr(blob_store_module, "blob_store", store)
+    small, large = store.put_text("1 2"), store.put_text("9" * 500)
+
+    def test_cases():
+        return [TestCase(input_hash=small.digest, input_size=small.size, output_hash=large.digest, output_size=large.size,
+                         points=10, is_pretest=False, number=1)]
+
+    # judges asking for blob references download the large files
+    referenced = test_cases()
+    fill_contents(referenced, max_bytes=100)
+    assert referenced[0].input == "1 2" and referenced[0].output is None
+
+    # the others get every file inline
+    inline = test_cases()
+    fill_contents(inline, max_bytes=None)
+    assert inline[0].output == "9" * 500
+
+def test_spool(store: LocalBlobStore):
+    async def chunks():
+        for _ in range(3):
+            yield b"x" * 10
+
+    path = asyncio.run(store.spool(chunks(), max_bytes=100))
+    with open(path, "rb") as file:
+        assert file.read() == b"x" * 30
+    os.unlink(path)
+
+    with pytest.raises(BlobTooLarge):
+        asyncio.run(store.spool(chunks(), max_bytes=20))
+
+def test_extract_archive(store: LocalBlobStore, tmp_path):
+    path = tmp_path / "tests.zip"
+    path.write_bytes(_zip({"tests/1.in": "1", "tests/1.out": "2", "2.in": "3", "2.out": "4",
+                           "manifest.json": '{"1": {"is_pretest": true}}', "__MACOSX/._1.in": "x"}))
+    files, manifest = problem_controller._extract_archive(str(path))
+    assert sorted(files) == [1, 2]
+    assert files[2]["out"] == digest_of("4")
+    assert manifest == {"1": {"is_pretest": True}}
+
+    for invalid in ({"1.in": "1"}, {"1.txt": "1"}, {"1.in": "x" * 2000, "1.out": "1"}):
+        path.write_bytes(_zip(invalid))
+        with pytest.raises((HTTPException, BlobTooLarge)):
+            problem_controller._extract_archive(str(path))
+
+# POST upload_problem_test_cases
+def test_upload_test_cases():
+    url = base_url + 'admin/problems/1/test_cases'
+    archive = _zip({"1.in": "1 2", "1.out": "3", "2.in": "2 2", "2.out": "4", "manifest.json": '{"2": {"points": 100}}'})
+    response = requests.post(url=url, headers=dict(admin_headers, **{"Content-Type": "application/zip"}), data=archive)
+    assert response.status_code == 200
+    test_cases = response.json()["test_cases"]
+    assert [test_case["number"] for test_case in test_cases] == [1, 2]
+    assert test_cases[0]["input_hash"] == digest_of("1 2").digest
+    assert test_cases[1]["points"] == 100
+
+    response = requests.post(url=url, headers=dict(admin_headers, **{"Content-Type": "application/zip"}), data=b"not a zip")
+    assert response.status_code == 400
+    response = requests.post(url=url, headers=admin_headers, json={})
+    assert response.status_code == 415
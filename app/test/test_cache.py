@@ -0,0 +1,102 @@
+import time
+import asyncio
+import threading
+import pytest
+
+from app.util.cache import Cache, MemoryBackend
+
+@pytest.fixture
+def cache() -> Cache:
+    return Cache(MemoryBackend(max_entries=3), ttl=60)
+
+def test_lru_and_ttl(cache: Cache):
+    for key in ["a", "b", "c"]:
+        cache.get_or_compute_sync(key, lambda: key)
+    cache.get_or_compute_sync("a", lambda: "recomputed")
+    # b is the least recently used
+    cache.get_or_compute_sync("d", lambda: "d")
+    assert cache.get_or_compute_sync("a", lambda: "recomputed") == "a"
+    assert cache.get_or_compute_sync("b", lambda: "recomputed") == "recomputed"
+
+    cache.get_or_compute_sync("short", lambda: 1, ttl=0.05)
+    time.sleep(0.1)
+    assert cache.get_or_compute_sync("short", lambda: 2) == 2
+
+def test_tags(cache: Cache):
+    cache.get_or_compute_sync("problem:1", lambda: 1, tags=["problem:1", "problems"])
+    cache.get_or_compute_sync("problem:2", lambda: 2, tags=["problem:2", "problems"])
+
+    cache.invalidate("problem:1")
+    assert cache.get_or_compute_sync("problem:1", lambda: "new") == "new"
+    assert cache.get_or_compute_sync("problem:2", lambda: "new") == 2
+
+    cache.invalidate("problems")
+    assert cache.get_or_compute_sync("problem:2", lambda: "new") == "new"
+
+def test_errors_are_not_cached(cache: Cache):
+    def fail():
+        raise ValueError("no")
+    with pytest.raises(ValueError):
+        cache.get_or_compute_sync("key", fail)
+    assert cache.get_or_compute_sync("key", lambda: 1) == 1
+
+def test_invalidated_while_computing(cache: Cache):
+    def compute():
+        cache.invalidate("tag")
+        return "stale"
+    assert cache.get_or_compute_sync("key", compute, tags=["tag"]) == "stale"
+    assert cache.get_or_compute_sync("key", lambda: "fresh", tags=["tag"]) == "fresh"
+
+def test_single_flight_async(cache: Cache):
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return calls
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_compute("page", compute) for _ in range(50)))
+
+    assert asyncio.run(main()) == [1] * 50
+    assert calls == 1
+
+def test_single_flight_threads(cache: Cache):
+    calls = 0
+    results = []
+
+    def compute():
+        nonlocal calls
+        calls += 1
+        time.sleep(0.05)
+        return "page"
+
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute_sync("page", compute))) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["page"] * 20
+    assert calls == 1
+
+def test_wait_timeout(cache: Cache):
+    cache.wait_timeout = 0.05
+    started = threading.Event()
+    release = threading.Event()
+
+    def stuck():
+        started.set()
+        release.wait()
+        return "late"
+
+    thread = threading.Thread(target=lambda: cache.get_or_compute_sync("page", stuck))
+    thread.start()
+    started.wait()
+
+    # the waiter gives up and computes the value itself
+    assert cache.get_or_compute_sync("page", lambda: "page") == "page"
+
+    release.set()
+    thread.join()
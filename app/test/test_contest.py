@@ -1,6 +1,6 @@
 import pytest
 import requests
-from app.test.mock import admin_headers, user_headers, base_url
+from app.test.mock import admin_headers, user_headers, base_url, query_count, assert_max_queries
 
 url = base_url + 'contests/'
 
@@ -180,5 +180,26 @@ def test_remove_team_from_contest():
     response = requests.delete(url=url + '8/teams/', headers=user_headers, json=data)
     assert response.status_code == 403
 
+# GET admin contest submissions, users, results and problems come with the page
+def test_get_contest_submissions_queries():
+    submissions_url = base_url + 'admin/contests/1/submissions'
+    small = requests.get(url=submissions_url + '?limit=1&count=exact', headers=admin_headers)
+    large = requests.get(url=submissions_url + '?limit=50&count=exact', headers=admin_headers)
+    assert small.status_code == 200 and large.status_code == 200
+
+    assert query_count(large) == query_count(small)
+    assert_max_queries(large, 5)
+
+# GET contests info, the landing page overview is one query (none while cached)
+def test_get_contests_info_queries():
+    # anonymous (the cached guest principal), so the authentication adds no query to the count
+    response = requests.get(url=url + 'info')
+    assert response.status_code == 200
+    assert_max_queries(response, 1)
+    assert set(response.json().keys()) == {"past", "ongoing", "upcoming"}
+
+    response = requests.get(url=url + 'info')
+    assert_max_queries(response, 1)
+
 # endregion
 
@@ -0,0 +1,32 @@
+import requests
+from app.test.mock import admin_headers, base_url, assert_max_queries
+
+url = base_url + 'dashboard/stats'
+
+# GET dashboard stats, read from the counters
+def test_dashboard_stats():
+    response = requests.get(url=url)
+    assert response.status_code == 200
+    assert set(response.json().keys()) == {"users", "problems", "contests", "submissions"}
+    assert response.headers["Cache-Control"].startswith("public, max-age=")
+    assert_max_queries(response, 1)
+
+    # the counters follow the changes made through the API
+    before = response.json()["contests"]
+    contest = {
+        "name": "Statistics test contest",
+        "description": "A contest for the statistics test",
+        "start_datetime": "2030-01-01T10:00:00",
+        "end_datetime": "2030-01-01T12:00:00",
+        "is_public": False,
+        "is_registration_open": False,
+        "users": [],
+        "problems": []
+    }
+    response = requests.post(url=base_url + 'admin/contests', headers=admin_headers, json=contest)
+    assert response.status_code == 201
+    contest_id = response.json()["id"]
+    assert requests.get(url=url).json()["contests"] == before + 1
+
+    requests.delete(url=base_url + f'admin/contests/{contest_id}', headers=admin_headers)
+    assert requests.get(url=url).json()["contests"] == before
@@ -0,0 +1,105 @@
+import gzip
+import json
+import time
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+from app.util.log_shipping import LokiShippingHandler
+
+class _StubLoki(BaseHTTPRequestHandler):
+    # pushes received by the server, and the status it answers with
+    pushes = []
+    status = 204
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        type(self).pushes.append(json.loads(body))
+        self.send_response(type(self).status)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def loki():
+    _StubLoki.pushes = []
+    _StubLoki.status = 204
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubLoki)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield _StubLoki, f"http://127.0.0.1:{server.server_address[1]}/loki/api/v1/push"
+    server.shutdown()
+    server.server_close()
+
+def _logger(handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger("test_log_shipping")
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger
+
+def _lines(pushes: list) -> list:
+    return [value[1] for push in pushes for stream in push["streams"] for value in stream["values"]]
+
+def test_batches_by_size(loki):
+    stub, url = loki
+    handler = LokiShippingHandler(url, {"application": "test"}, batch_size=10, batch_interval=60)
+    logger = _logger(handler)
+    for i in range(20):
+        logger.info(f"record {i}")
+
+    deadline = time.monotonic() + 5
+    while handler.shipped < 20 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    handler.close()
+
+    assert len(stub.pushes) == 2
+    assert _lines(stub.pushes) == [f"record {i}" for i in range(20)]
+    assert stub.pushes[0]["streams"][0]["stream"] == {"application": "test", "level": "info", "logger": "test_log_shipping"}
+
+def test_batches_by_time(loki):
+    stub, url = loki
+    handler = LokiShippingHandler(url, {"application": "test"}, batch_size=100, batch_interval=0.1)
+    logger = _logger(handler)
+    logger.info("alone")
+    logger.warning("tagged", extra={"tags": {"path": "/problems"}})
+    time.sleep(0.5)
+
+    assert handler.shipped == 2
+    assert sorted(_lines(stub.pushes)) == ["alone", "tagged"]
+    assert any(stream["stream"].get("path") == "/problems" for push in stub.pushes for stream in push["streams"])
+    handler.close()
+
+def test_drops_the_oldest(loki):
+    stub, url = loki
+    handler = LokiShippingHandler(url, {"application": "test"}, batch_size=100, batch_interval=60, queue_size=5)
+    logger = _logger(handler)
+    for i in range(8):
+        logger.info(f"record {i}")
+    assert handler.dropped == 3
+
+    handler.close()
+    assert _lines(stub.pushes) == [f"record {i}" for i in range(3, 8)]
+
+def test_fallback_when_unavailable(loki, tmp_path):
+    stub, url = loki
+    stub.status = 500
+    fallback = logging.FileHandler(tmp_path / "fallback.log")
+    handler = LokiShippingHandler(url, {"application": "test"}, batch_size=100, batch_interval=60, retry_interval=60, fallback=fallback)
+    logger = _logger(handler)
+
+    logger.info("first")
+    handler.flush()
+    stub.status = 204
+    # still in the retry interval, Loki is not tried again
+    logger.info("second")
+    handler.close()
+    fallback.close()
+
+    assert handler.failed_pushes == 1
+    assert handler.fallback_records == 2
+    assert len(stub.pushes) == 1
+    assert (tmp_path / "fallback.log").read_text().splitlines() == ["first", "second"]
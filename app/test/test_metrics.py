@@ -0,0 +1,27 @@
+import os
+import sys
+import subprocess
+import requests
+
+from app.test.mock import base_url
+
+# GET the metrics of the API, the route template is the label of the requests
+def test_metrics():
+    requests.get(url=base_url + 'dashboard/stats')
+    response = requests.get(url=base_url + 'metrics')
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/plain")
+    assert 'http_requests_total{method="GET",route="/dashboard/stats",status="200"}' in response.text
+
+def _run(code: str, directory: str) -> str:
+    environment = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=directory)
+    result = subprocess.run([sys.executable, "-c", code], env=environment, capture_output=True, text=True, check=True)
+    return result.stdout
+
+# the samples of every worker process are aggregated
+def test_multiprocess_aggregation(tmp_path):
+    for _ in range(3):
+        _run("from app.util.metrics import SUBMISSIONS; SUBMISSIONS.labels(queued='true').inc()", str(tmp_path))
+
+    output = _run("from app.util.metrics import render; print(render()[0].decode())", str(tmp_path))
+    assert 'submissions_total{queued="true"} 3.0' in output
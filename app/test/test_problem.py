@@ -2,7 +2,8 @@ from re import sub
 import pytest
 from lorem_text import lorem
 import requests
-from app.test.mock import admin_headers, user_headers, base_url
+from app.test.mock import admin_headers, user_headers, base_url, query_count, assert_max_queries
+from app.util.pagination import encode_cursor
 
 url = base_url + 'problems/'
 
@@ -657,4 +658,39 @@ def test_update_problem_constraint():
     # edge_cases
     pass
 
-#endregion
\ No newline at end of file
+# GET list_problems with cursors
+def test_list_problems_cursor():
+    # walk the whole list one problem at a time, following next_cursor
+    seen = []
+    params = "?limit=1&count=none"
+    while True:
+        response = requests.get(url=url + params, headers=admin_headers)
+        assert response.status_code == 200
+        body = response.json()
+        assert body["count"] is None
+        seen += [problem["id"] for problem in body["problems"]]
+        if not body["next_cursor"]:
+            break
+        params = "?limit=1&count=none&cursor=" + body["next_cursor"]
+
+    assert len(seen) == len(set(seen))
+    assert seen == sorted(seen)
+
+    response = requests.get(url=url + "?cursor=not-a-cursor", headers=admin_headers)
+    assert response.status_code == 400
+
+    # well formed, but a string where the id is expected
+    response = requests.get(url=url + "?cursor=" + encode_cursor(("1",)), headers=admin_headers)
+    assert response.status_code == 400
+
+# GET list_problems, the languages are loaded for the whole page at once
+def test_list_problems_queries():
+    for list_url in [url, base_url + "admin/problems"]:
+        small = requests.get(url=list_url + "?limit=1&count=exact", headers=admin_headers)
+        large = requests.get(url=list_url + "?limit=50&count=exact", headers=admin_headers)
+        assert small.status_code == 200 and large.status_code == 200
+
+        assert query_count(large) == query_count(small)
+        assert_max_queries(large, 5)
+
+#endregion
@@ -0,0 +1,45 @@
+import asyncio
+from types import SimpleNamespace
+from hashlib import sha256
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.database import Base
+from app.models.mapping import User, UserType
+from app.models.role import Role
+from app.controllers.auth import login
+from app.util.pwd import SCRYPT_PREFIX, _legacy_hash
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[UserType.__table__, User.__table__])
+    with Session(engine) as session:
+        session.add_all([
+            UserType(id=1, code="user", permissions=Role.USER),
+            UserType(id=2, code="judge", permissions=Role.JUDGE),
+            # legacy salted SHA-256 user
+            User(id=1, username="user", email="user@test.com", password_hash=_legacy_hash("user123", bytes.fromhex("ab")), salt="ab", user_type_id=1),
+            # judges are stored as sha256("name:key") without a salt
+            User(id=2, username="judge", email="judge", password_hash=sha256(b"judge:key").hexdigest(), salt="", user_type_id=2),
+        ])
+        session.commit()
+        yield session
+
+def _login(session: Session, username: str, password: str):
+    return asyncio.run(login(SimpleNamespace(username=username, password=password), session))
+
+def test_legacy_hash_upgraded(session: Session):
+    _login(session, "user", "user123")
+    user = session.get(User, 1)
+    assert user.password_hash.startswith(SCRYPT_PREFIX + "$")
+
+    # the upgraded hash still verifies
+    _login(session, "user", "user123")
+
+def test_judge_hash_kept(session: Session):
+    _login(session, "judge", "judge:key")
+    judge = session.get(User, 2)
+    assert judge.password_hash == sha256(b"judge:key").hexdigest()
+    assert judge.salt == ""
@@ -0,0 +1,106 @@
+"""
+Query plan regression tests, run against a migrated and seeded local Postgres (see app/test/dataset.py)
+
+Sequential scans are disabled for the session, so the planner only picks one
+when no index can serve the query: the tests fail if a hot query loses its index.
+The statements are built by the same functions the controllers use.
+"""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, Query
+
+from app.database import engine
+from app.schemas import PaginationParams
+from app.controllers.contest import _scoreboard_statement
+from app.controllers.user import _SUBMISSION_KEYSET as _HISTORY_KEYSET, _submission_history_statement
+from app.controllers.submission import (_SUBMISSION_KEYSET, _contests_of_problem_statement,
+                                        _recent_submissions_statement, _problem_submissions_statement)
+from app.controllers.judge import _submission_test_cases_statement, _test_case_id_statement
+from app.controllers.problem import _visible_problems_query
+from app.controllers.admin.problem import _problems_query
+from app.controllers.admin.user import _users_query
+from app.controllers.admin.contest import _contest_submissions_query
+
+@pytest.fixture(scope="module")
+def connection():
+    try:
+        connection = engine.connect()
+    except OperationalError:
+        pytest.skip("Postgres is not reachable")
+
+    connection.exec_driver_sql("SET enable_seqscan = off")
+    yield connection
+    connection.rollback()
+    connection.close()
+
+@pytest.fixture(scope="module")
+def session(connection):
+    # only used to build the legacy queries, never executed
+    return Session(bind=connection)
+
+def _plan(connection, statement) -> str:
+    if isinstance(statement, Query):
+        statement = statement.statement
+    compiled = statement.compile(dialect=engine.dialect, compile_kwargs={"render_postcompile": True})
+    rows = connection.exec_driver_sql("EXPLAIN " + str(compiled), compiled.params).all()
+    return "\n".join(row[0] for row in rows)
+
+def _assert_no_seq_scan(connection, statement, *tables):
+    plan = _plan(connection, statement)
+    for table in tables:
+        assert f"Seq Scan on {table}" not in plan, plan
+
+# user.get_submission_history
+def test_submission_history(connection):
+    statement = _HISTORY_KEYSET.apply(_submission_history_statement(1), PaginationParams(limit=15))
+    _assert_no_seq_scan(connection, statement, "submissions")
+
+# submission._validate_submission, rate limit
+def test_submission_rate_limit(connection):
+    statement = _recent_submissions_statement(1, datetime.now() - timedelta(minutes=1))
+    _assert_no_seq_scan(connection, statement, "submissions")
+
+# submission.submission_by_problem
+def test_submissions_by_problem(connection):
+    statement = _SUBMISSION_KEYSET.apply(_problem_submissions_statement(1, 1), PaginationParams(limit=15))
+    _assert_no_seq_scan(connection, statement, "submissions")
+
+# judge.save_total
+def test_submission_test_cases(connection):
+    _assert_no_seq_scan(connection, _submission_test_cases_statement(1), "submission_test_cases")
+
+# judge.accept
+def test_problem_test_case_by_number(connection):
+    _assert_no_seq_scan(connection, _test_case_id_statement(1, 1), "problem_test_cases")
+
+# submission._validate_submission, contests of a problem
+def test_contests_of_problem(connection):
+    _assert_no_seq_scan(connection, _contests_of_problem_statement(1), "contest_problems")
+
+# contest.get_scoreboard
+def test_scoreboard(connection):
+    _assert_no_seq_scan(connection, _scoreboard_statement(1), "contest_submissions", "submission_test_cases")
+
+# problem.list_visible_problems
+def test_problem_search(connection, session):
+    query, _ = _visible_problems_query("sum", session)
+    _assert_no_seq_scan(connection, query, "problems")
+
+def test_problem_prefix_search(connection, session):
+    query, _ = _visible_problems_query("sum*", session)
+    _assert_no_seq_scan(connection, query, "problems")
+
+# admin problem list
+def test_admin_problem_search(connection, session):
+    query, _ = _problems_query("sum", session)
+    _assert_no_seq_scan(connection, query, "problems")
+
+# admin user list
+def test_user_search(connection, session):
+    query, _ = _users_query("adm", [3, 4], session)
+    _assert_no_seq_scan(connection, query, "users")
+
+# admin contest submissions, username and code search
+def test_submission_code_search(connection, session):
+    _assert_no_seq_scan(connection, _contest_submissions_query(1, "print", session), "submissions")
@@ -0,0 +1,64 @@
+import pytest
+import requests
+from sqlalchemy import create_engine, text
+
+from app.test.mock import admin_headers, base_url
+from app.util.query_profiler import QueryProfiler, parameter_shapes, profile_queries, profiler
+
+url = base_url + 'admin/metrics/queries'
+
+@pytest.fixture
+def sampling():
+    settings = (profiler.enabled, profiler.sample_rate, profiler.slow_ms)
+    profiler.reset()
+    yield profiler
+    profiler.configure(*settings)
+    profiler.reset()
+
+def test_parameter_shapes():
+    assert parameter_shapes({"id": 1, "ids": [1, 2, 3], "name": "x"}) == {"id": "int", "ids": "list[3]", "name": "str"}
+    assert parameter_shapes([{"id": 1}, {"id": 2}]) == {"rows": 2, "row": {"id": "int"}}
+    assert parameter_shapes((1, "x")) == ["int", "str"]
+
+def test_disabled():
+    assert not QueryProfiler(False, 1, 0).sampled()
+    assert not QueryProfiler(True, 0, 0).sampled()
+
+def test_top_statements_and_slow_log(sampling: QueryProfiler):
+    engine = create_engine("sqlite://")
+    profile_queries(engine)
+    sampling.configure(enabled=True, sample_rate=1, slow_ms=0)
+
+    with engine.connect() as connection:
+        for _ in range(3):
+            connection.execute(text("SELECT :value"), {"value": 1})
+        connection.execute(text("SELECT 2"))
+
+    snapshot = sampling.snapshot(10)
+    statements = {row["statement"]: row for row in snapshot["top"]}
+    assert statements["SELECT ?"]["count"] == 3
+    assert statements["SELECT 2"]["count"] == 1
+    # every statement is slow with a 0 threshold, logged with the test as the caller
+    slow = snapshot["recent_slow"][0]
+    assert slow["caller"].startswith("app.test.test_query_profiler.test_top_statements_and_slow_log:")
+    assert slow["parameters"] == ["int"]
+
+    sampling.configure(enabled=False)
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 2"))
+    assert {row["statement"]: row for row in sampling.snapshot(10)["top"]}["SELECT 2"]["count"] == 1
+
+# PUT, GET and DELETE the profiler of the server
+def test_admin_endpoints():
+    response = requests.put(url=url, headers=admin_headers, json={"enabled": True, "sample_rate": 1, "slow_ms": 1000})
+    assert response.status_code == 200
+    assert response.json()["enabled"] is True
+
+    requests.get(url=base_url + 'dashboard/stats')
+    response = requests.get(url=url, headers=admin_headers, params={"top": 5})
+    assert response.status_code == 200
+    assert len(response.json()["top"]) > 0
+
+    assert requests.put(url=url, headers=admin_headers, json={"sample_rate": 2}).status_code == 422
+    assert requests.delete(url=url, headers=admin_headers).status_code == 200
+    requests.put(url=url, headers=admin_headers, json={"enabled": False})
@@ -0,0 +1,55 @@
+"""
+Read replica routing, run with two local Postgres instances, e.g.
+
+    DATABASE_HOST=localhost DATABASE_PORT=5432 DATABASE_REPLICA_HOST=localhost DATABASE_REPLICA_PORT=5433 pytest app/test/test_replica.py
+
+The two instances do not need to replicate, a server that is not a standby reports no lag.
+"""
+import pytest
+from starlette.requests import Request
+
+from app.config import settings
+from app import database
+from app.util.jwt import get_tokens
+from app.util.replica import replica_router, get_read_session
+
+pytestmark = pytest.mark.skipif(not settings.DATABASE_REPLICA_HOST, reason="DATABASE_REPLICA_HOST is not configured")
+
+def _request(user_id: int = None) -> Request:
+    headers = []
+    if user_id is not None:
+        token = get_tokens(user_id, "replica-test", 1)["access_token"]
+        headers.append((b"authorization", f"Bearer {token}".encode()))
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+def _bound_engine(request: Request):
+    generator = get_read_session(request)
+    session = next(generator)
+    try:
+        return session.get_bind()
+    finally:
+        generator.close()
+
+@pytest.fixture(autouse=True)
+def reset_router():
+    max_lag = replica_router.max_lag
+    replica_router.reset()
+    yield
+    replica_router.max_lag = max_lag
+    replica_router.reset()
+
+def test_reads_go_to_replica():
+    assert _bound_engine(_request()) is database.replica_engine
+    assert _bound_engine(_request(1)) is database.replica_engine
+
+def test_read_your_writes():
+    replica_router.mark_write(1)
+
+    # the writer reads from the primary, the other users from the replica
+    assert _bound_engine(_request(1)) is database.engine
+    assert _bound_engine(_request(2)) is database.replica_engine
+
+def test_fallback_when_replica_lags():
+    replica_router.max_lag = -1
+
+    assert _bound_engine(_request()) is database.engine
@@ -0,0 +1,113 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import Session
+
+from app.database import Base
+from app.models.enums import Difficulty
+from app.models.mapping import Problem, ProblemTestCase
+from app.models.loading import TEST_CASE_FILES
+from app.schemas import ProblemTestCase as ProblemTestCaseDTO
+from app.util.blob_store import LocalBlobStore, digest_of
+import app.controllers.admin.problem as problem_controller
+from app.controllers.admin.problem import _sync_test_cases, _test_case_files
+
+def _row(number: int, input: str, output: str, points: int = 10, is_pretest: bool = False, notes: str = None) -> dict:
+    input_blob, output_blob = digest_of(input), digest_of(output)
+    return {
+        "number": number, "notes": notes, "points": points, "is_pretest": is_pretest,
+        "input_hash": input_blob.digest, "input_size": input_blob.size,
+        "output_hash": output_blob.digest, "output_size": output_blob.size,
+    }
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[Problem.__table__, ProblemTestCase.__table__])
+    with Session(engine) as session:
+        problem = Problem(id=1, title="Sum", description="", points=100, difficulty=Difficulty.EASY, author_id=1)
+        session.add(problem)
+        session.flush()
+        # one inline test case, as before the blob store
+        session.add(ProblemTestCase(problem_id=1, number=1, input="1 2", output="3", points=10, is_pretest=False))
+        session.commit()
+        yield session
+
+def _statements(session: Session) -> list:
+    statements = []
+    event.listen(session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2].split()[0]))
+    return statements
+
+def _test_cases(session: Session) -> dict:
+    return {test_case.number: test_case for test_case in session.scalars(select(ProblemTestCase))}
+
+def test_unchanged(session: Session):
+    problem = session.get(Problem, 1)
+    statements = _statements(session)
+    assert not _sync_test_cases(problem, [_row(1, "1 2", "3")], session)
+    assert statements == ["SELECT"]
+
+    # the notes do not matter to the judges
+    assert not _sync_test_cases(problem, [_row(1, "1 2", "3", notes="easy")], session)
+    session.commit()
+    assert _test_cases(session)[1].notes == "easy"
+
+    # notes not sent: the stored ones are kept
+    row = _row(1, "1 2", "3")
+    del row["notes"]
+    assert not _sync_test_cases(problem, [row], session)
+    session.commit()
+    assert _test_cases(session)[1].notes == "easy"
+    # the unchanged files stay inline
+    assert session.scalar(select(ProblemTestCase.input).filter(ProblemTestCase.number == 1)) == "1 2"
+
+def test_minimal_changes(session: Session):
+    problem = session.get(Problem, 1)
+    assert _sync_test_cases(problem, [_row(1, "1 2", "3"), _row(2, "2 2", "4")], session)
+    session.commit()
+    session.refresh(problem)
+
+    statements = _statements(session)
+    assert _sync_test_cases(problem, [_row(1, "1 2", "3", points=20), _row(3, "3 3", "6")], session)
+    # one select, then one bulk statement per kind of change
+    assert sorted(statements) == ["DELETE", "INSERT", "SELECT", "UPDATE"]
+    session.commit()
+
+    test_cases = _test_cases(session)
+    assert sorted(test_cases) == [1, 3]
+    assert test_cases[1].points == 20
+    assert test_cases[3].input_hash == digest_of("3 3").digest
+
+    # a new file replaces the inline one
+    assert _sync_test_cases(problem, [_row(1, "1 1", "3", points=20), _row(3, "3 3", "6")], session)
+    session.commit()
+    assert session.scalar(select(ProblemTestCase.input).filter(ProblemTestCase.number == 1)) is None
+    assert _test_cases(session)[1].input_hash == digest_of("1 1").digest
+
+# the heavy columns are not loaded unless asked for
+def test_deferred_files(session: Session):
+    test_case = session.scalars(select(ProblemTestCase)).first()
+    assert test_case.input_hash == digest_of("1 2").digest
+    with pytest.raises(InvalidRequestError):
+        test_case.input
+    assert session.scalars(select(ProblemTestCase).options(*TEST_CASE_FILES)).first().input == "1 2"
+
+def test_duplicate_numbers(session: Session):
+    with pytest.raises(HTTPException):
+        _sync_test_cases(session.get(Problem, 1), [_row(1, "1", "1"), _row(1, "2", "2")], session)
+
+# the hashes of the inline files, as returned by the reads, can be sent back
+def test_inline_file_hashes(session: Session, tmp_path, monkeypatch):
+    store = LocalBlobStore(str(tmp_path), max_bytes=1024)
+    monkeypatch.setattr(problem_controller, "blob_store", store)
+
+    input_hash, output_hash = digest_of("1 2").digest, digest_of("3").digest
+    dto = ProblemTestCaseDTO(input_hash=input_hash, output_hash=output_hash, points=10, is_pretest=False, number=1)
+    files = _test_case_files(dto, session)
+    assert files["input_hash"] == input_hash and files["output_size"] == 1
+    assert store.read_text(input_hash) == "1 2"
+
+    dto = ProblemTestCaseDTO(input_hash=digest_of("unknown").digest, output_hash=output_hash, points=10, is_pretest=False, number=1)
+    with pytest.raises(HTTPException):
+        _test_case_files(dto, session)
@@ -0,0 +1,94 @@
+import json
+import uuid
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import fastapi.routing
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.util.tracing import OtlpExporter, tracing, span, trace_engine, instrument_serialization, otlp_spans
+
+class _StubCollector(BaseHTTPRequestHandler):
+    # the OTLP payloads received by the collector
+    payloads = []
+
+    def do_POST(self):
+        type(self).payloads.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def collector():
+    _StubCollector.payloads = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubCollector)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield _StubCollector, f"http://127.0.0.1:{server.server_address[1]}/v1/traces"
+    server.shutdown()
+    server.server_close()
+
+def test_spans_outside_a_request():
+    # nothing to record to, and nothing fails
+    with span("queue", "publish"):
+        pass
+
+def test_summary():
+    with tracing(str(uuid.uuid4())) as trace:
+        with span("queue", "publish", queue="submissions"):
+            pass
+        with span("websocket", "send"):
+            pass
+        with span("websocket", "send"):
+            pass
+
+    summary = trace.summary()
+    assert summary["queue_count"] == 1
+    assert summary["websocket_count"] == 2
+    assert summary["db_count"] == 0
+    assert summary["db_ms"] == 0
+
+def test_database_spans():
+    engine = create_engine("sqlite://")
+    trace_engine(engine)
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        with tracing(str(uuid.uuid4())) as trace:
+            connection.execute(text("SELECT 1"))
+            connection.execute(text("SELECT 2"))
+    assert trace.summary()["db_count"] == 2
+
+def test_serialization_spans():
+    instrument_serialization()
+    instrument_serialization()
+
+    async def serialize():
+        with tracing(str(uuid.uuid4())) as trace:
+            content = await fastapi.routing.serialize_response(response_content={"id": 1})
+        return trace, content
+
+    trace, content = asyncio.run(serialize())
+    assert content == {"id": 1}
+    assert trace.summary()["serialization_count"] == 1
+
+def test_otlp_export(collector, monkeypatch):
+    stub, url = collector
+    monkeypatch.setattr("app.util.tracing.settings.TRACE_OTLP_URL", url)
+    request_id = str(uuid.uuid4())
+    with tracing(request_id) as trace:
+        with span("queue", "publish", queue="submissions"):
+            pass
+
+    exporter = OtlpExporter(url, "test", interval=60)
+    exporter.export(otlp_spans(trace, "POST /submissions", {"http.status_code": 201}, trace.start_ns + 1000))
+    exporter.close()
+
+    assert exporter.exported == 2
+    spans = stub.payloads[0]["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    root, child = spans
+    assert root["traceId"] == child["traceId"] == request_id.replace("-", "")
+    assert child["parentSpanId"] == root["spanId"]
+    assert child["name"] == "queue publish"
+    assert {"key": "queue", "value": {"stringValue": "submissions"}} in child["attributes"]
@@ -173,3 +173,24 @@ def test_update_user_permissions():
     json = {"user_type_id": ""}
     response = requests.patch(url=url + '7/' + sub_url, headers=admin_headers, json=json)
     assert response.status_code == 422
+
+# POST bulk_import
+def test_bulk_import():
+    import_url = base_url + 'admin/users/import'
+    headers = {**admin_headers, "Content-Type": "application/x-ndjson"}
+    body = '{"username": 123, "email": "bad"}\n["not", "an", "object"]\n'
+
+    # authentication
+    response = requests.post(url=import_url, headers={**user_headers, "Content-Type": "application/x-ndjson"}, data=body)
+    assert response.status_code == 403
+
+    # edge_cases
+    response = requests.post(url=import_url, headers=headers, data=body)
+    assert response.status_code == 200
+    assert response.json().get("created") == 0
+    errors = response.json().get("errors")
+    assert errors[0] == {"row": 1, "username": "123", "detail": "Invalid email"}
+    assert errors[1].get("username") is None
+
+    response = requests.post(url=import_url, headers={**admin_headers, "Content-Type": "text/plain"}, data=body)
+    assert response.status_code == 415
@@ -0,0 +1,177 @@
+"""
+Content addressed storage of the test case files
+
+Every file is stored once under its sha256 (<root>/ab/cd/abcd...), written chunk by chunk to a
+temporary file and moved in place, so a reader never sees a partial blob and the same content
+uploaded twice is stored once. The database keeps only the hashes and the sizes.
+"""
+import os
+import re
+import time
+import hashlib
+import tempfile
+from typing import AsyncIterator, BinaryIO, Iterator, NamedTuple, Optional
+
+from app.config import settings
+
+CHUNK_SIZE = 1 << 16
+
+_DIGEST = re.compile(r"^[0-9a-f]{64}$")
+
+class Blob(NamedTuple):
+    digest: str
+    size: int
+
+class BlobTooLarge(Exception):
+    pass
+
+def is_digest(value: str) -> bool:
+    return bool(value) and _DIGEST.match(value) is not None
+
+def digest_of(content: str) -> Blob:
+    """ The hash and the size a text content is stored with """
+    data = content.encode()
+    return Blob(hashlib.sha256(data).hexdigest(), len(data))
+
+class LocalBlobStore:
+    """
+    Blob store on the local filesystem (a directory shared by the API processes)
+
+    Attributes:
+        root (str): The directory of the blobs
+        max_bytes (int): The largest blob accepted
+    """
+    root: str
+    max_bytes: int
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+
+    def path(self, digest: str) -> str:
+        if not is_digest(digest):
+            raise ValueError(f"Invalid blob digest {digest!r}")
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest: str) -> bool:
+        return is_digest(digest) and os.path.isfile(self.path(digest))
+
+    def touch(self, digest: str) -> bool:
+        """ Refresh the mtime of a blob being reused, so collect does not take it for an old unreferenced one, False when it is not stored """
+        if not is_digest(digest):
+            return False
+        try:
+            os.utime(self.path(digest))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _temporary(self):
+        directory = os.path.join(self.root, "tmp")
+        os.makedirs(directory, exist_ok=True)
+        return tempfile.NamedTemporaryFile(dir=directory, delete=False)
+
+    def _commit(self, temporary_path: str, digest: str):
+        path = self.path(digest)
+        if self.touch(digest):
+            # already stored, same content
+            os.unlink(temporary_path)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temporary_path, path)
+
+    def _write(self, chunks: Iterator[bytes]) -> Blob:
+        sha = hashlib.sha256()
+        size = 0
+        temporary = self._temporary()
+        try:
+            with temporary:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise BlobTooLarge(f"File larger than {self.max_bytes} bytes")
+                    sha.update(chunk)
+                    temporary.write(chunk)
+            blob = Blob(sha.hexdigest(), size)
+            self._commit(temporary.name, blob.digest)
+            return blob
+        except BaseException:
+            if os.path.exists(temporary.name):
+                os.unlink(temporary.name)
+            raise
+
+    def put_file(self, file: BinaryIO) -> Blob:
+        """ Store the content of a file object, read chunk by chunk """
+        return self._write(iter(lambda: file.read(CHUNK_SIZE), b""))
+
+    def put_bytes(self, data: bytes) -> Blob:
+        return self._write(iter([data]))
+
+    def put_text(self, content: str) -> Blob:
+        return self.put_bytes(content.encode())
+
+    async def spool(self, chunks: AsyncIterator[bytes], max_bytes: int) -> str:
+        """
+        Write a stream (e.g. a request body) to a temporary file of the store, without hashing it
+
+        Returns:
+            str: the path of the file, to be removed by the caller
+        """
+        size = 0
+        temporary = self._temporary()
+        try:
+            with temporary:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise BlobTooLarge(f"Upload larger than {max_bytes} bytes")
+                    temporary.write(chunk)
+            return temporary.name
+        except BaseException:
+            os.unlink(temporary.name)
+            raise
+
+    def open(self, digest: str) -> BinaryIO:
+        return open(self.path(digest), "rb")
+
+    def read_text(self, digest: str) -> str:
+        with self.open(digest) as file:
+            return file.read().decode()
+
+    def inline(self, digest: Optional[str], size: Optional[int], max_bytes: Optional[int] = None) -> Optional[str]:
+        """ The content of a blob to be sent inside a JSON response, None when larger than max_bytes """
+        if digest is None or size is None or (max_bytes is not None and size > max_bytes):
+            return None
+        return self.read_text(digest)
+
+    def collect(self, referenced: set, min_age: float = 3600) -> int:
+        """
+        Delete the blobs no longer referenced, older than min_age seconds (so the ones just
+        uploaded, not committed to the database yet, are kept)
+
+        Returns:
+            int: the deleted blobs
+        """
+        deleted = 0
+        threshold = time.time() - min_age
+        for directory, _, files in os.walk(self.root):
+            temporary = os.path.basename(directory) == "tmp"
+            for name in files:
+                path = os.path.join(directory, name)
+                if (temporary or name not in referenced) and os.path.getmtime(path) < threshold:
+                    os.unlink(path)
+                    deleted += 1
+        return deleted
+
+def fill_contents(test_cases: list, max_bytes: Optional[int] = settings.TEST_CASE_INLINE_BYTES):
+    """
+    Fill in the input and output of the test case responses stored as blobs, up to max_bytes
+    (the larger ones are left null and downloaded by hash). Blocking, it reads the files
+    """
+    for test_case in test_cases:
+        if test_case.input is None:
+            test_case.input = blob_store.inline(test_case.input_hash, test_case.input_size, max_bytes)
+        if test_case.output is None:
+            test_case.output = blob_store.inline(test_case.output_hash, test_case.output_size, max_bytes)
+
+blob_store = LocalBlobStore(settings.BLOB_STORE_PATH, settings.TEST_CASE_MAX_BYTES)
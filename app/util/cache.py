@@ -0,0 +1,246 @@
+import time
+import pickle
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Iterable, Optional, Tuple, TypeVar
+from anyio import to_thread
+
+from app.config import settings
+
+T = TypeVar("T")
+# the time to live of an entry, or a function of the cached value returning it
+TTL = float | Callable[[Any], float]
+
+_MISSING = object()
+
+class MemoryBackend:
+    """
+    In-process LRU store with expiration and tags
+
+    Attributes:
+        max_entries (int): The least recently used entries are dropped above this size
+    """
+    max_entries: int
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # key -> (value, expiration, tags)
+        self._entries: OrderedDict[str, Tuple[Any, float, Tuple[str, ...]]] = OrderedDict()
+        self._keys_by_tag: dict[str, set] = {}
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            if entry[1] <= time.monotonic():
+                self._remove(key)
+                return _MISSING
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: Any, ttl: float, tags: Tuple[str, ...]):
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, time.monotonic() + ttl, tags)
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, tags: Iterable[str]):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._keys_by_tag.get(tag, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_tag.clear()
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+class RedisBackend:
+    """
+    Store shared by all the processes, the values are pickled and every tag is a set of keys.
+    Needs the redis package (pip install redis), it is not a dependency of the project
+
+    Attributes:
+        prefix (str): The prefix of the keys of the cache
+    """
+    prefix: str
+
+    def __init__(self, url: str, prefix: str = "byteblitz:cache:"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_REDIS_URL is set but the redis package is not installed")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Any:
+        data = self.client.get(self.prefix + key)
+        return _MISSING if data is None else pickle.loads(data)
+
+    def set(self, key: str, value: Any, ttl: float, tags: Tuple[str, ...]):
+        milliseconds = max(int(ttl * 1000), 1)
+        with self.client.pipeline() as pipeline:
+            pipeline.set(self.prefix + key, pickle.dumps(value), px=milliseconds)
+            for tag in tags:
+                pipeline.sadd(self.prefix + "tag:" + tag, key)
+                # the set outlives its entries, an invalidation of missing keys is harmless
+                pipeline.pexpire(self.prefix + "tag:" + tag, max(milliseconds, int(settings.CACHE_TTL * 1000)))
+            pipeline.execute()
+
+    def invalidate(self, tags: Iterable[str]):
+        for tag in tags:
+            tag_key = self.prefix + "tag:" + tag
+            keys = self.client.smembers(tag_key)
+            with self.client.pipeline() as pipeline:
+                for key in keys:
+                    pipeline.delete(self.prefix + key.decode())
+                pipeline.delete(tag_key)
+                pipeline.execute()
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(key)
+
+class Cache:
+    """
+    Cache of computed results (response DTOs) with tag based invalidation, e.g.
+
+        problem = await cache.get_or_compute(f"problem:{id}", in_own_session(compute), tags=[f"problem:{id}"])
+        ...
+        cache.invalidate(f"problem:{id}")
+
+    Concurrent misses of the same key wait for a single computation (no stampede when a page goes live).
+    The cached values are shared between the requests, they must not be modified.
+
+    Attributes:
+        backend (MemoryBackend | RedisBackend): Where the entries are stored
+        ttl (float): Default time to live of the entries, in seconds
+        wait_timeout (float): Longest wait of get_or_compute_sync for a computation of another thread
+    """
+    backend: MemoryBackend | RedisBackend
+    ttl: float
+    wait_timeout: float
+
+    def __init__(self, backend: MemoryBackend | RedisBackend, ttl: float, wait_timeout: float = 10):
+        self.backend = backend
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        # bumped by every invalidation, a result computed across an invalidation of its tags is not stored
+        self._tag_versions: dict[str, int] = {}
+        self._pending: dict[str, asyncio.Future] = {}
+        self._pending_sync: dict[str, threading.Event] = {}
+
+    def _versions(self, tags: Tuple[str, ...]) -> Tuple[int, ...]:
+        return tuple(self._tag_versions.get(tag, 0) for tag in tags)
+
+    def _store(self, key: str, value: Any, tags: Tuple[str, ...], ttl: Optional[TTL], versions: Tuple[int, ...]):
+        ttl = self.ttl if ttl is None else ttl
+        ttl = ttl(value) if callable(ttl) else ttl
+        if ttl <= 0 or self._versions(tags) != versions:
+            return
+        self.backend.set(key, value, ttl, tags)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[T]], tags: Iterable[str] = (), ttl: Optional[TTL] = None) -> T:
+        """
+        The cached value of the key, computed (once, for all the concurrent callers) when missing
+
+        Args:
+            key (str): the key of the value
+            compute (Callable): coroutine function computing the value, its exceptions are not cached.
+                It runs detached from the caller (and may outlive it), so it must not use the caller's
+                session: wrap it with app.database.in_own_session
+            tags (Iterable[str]): invalidating any of them drops the value
+            ttl (float | Callable): the time to live, by default CACHE_TTL
+
+        Returns:
+            the value
+        """
+        tags = tuple(tags)
+        value = self.backend.get(key) if isinstance(self.backend, MemoryBackend) else await to_thread.run_sync(self.backend.get, key)
+        if value is not _MISSING:
+            return value
+
+        pending = self._pending.get(key)
+        if pending is None:
+            versions = self._versions(tags)
+
+            async def run():
+                try:
+                    value = await compute()
+                    if isinstance(self.backend, MemoryBackend):
+                        self._store(key, value, tags, ttl, versions)
+                    else:
+                        await to_thread.run_sync(self._store, key, value, tags, ttl, versions)
+                    return value
+                finally:
+                    self._pending.pop(key, None)
+
+            # a caller that goes away does not cancel the computation the others are waiting for
+            pending = self._pending[key] = asyncio.ensure_future(run())
+        return await asyncio.shield(pending)
+
+    def get_or_compute_sync(self, key: str, compute: Callable[[], T], tags: Iterable[str] = (), ttl: Optional[TTL] = None) -> T:
+        """ Blocking counterpart of get_or_compute, for the sync controllers """
+        tags = tuple(tags)
+        while True:
+            value = self.backend.get(key)
+            if value is not _MISSING:
+                return value
+
+            with self._lock:
+                pending = self._pending_sync.get(key)
+                if pending is None:
+                    pending = self._pending_sync[key] = threading.Event()
+                    break
+            # another thread is computing it, then read its result (or compute it if it failed)
+            if not pending.wait(self.wait_timeout):
+                # stuck computation: do not hold the worker thread any longer, compute it here
+                versions = self._versions(tags)
+                value = compute()
+                self._store(key, value, tags, ttl, versions)
+                return value
+
+        try:
+            versions = self._versions(tags)
+            value = compute()
+            self._store(key, value, tags, ttl, versions)
+            return value
+        finally:
+            with self._lock:
+                del self._pending_sync[key]
+            pending.set()
+
+    def invalidate(self, *tags: str):
+        """ Drop every value with any of the tags """
+        with self._lock:
+            for tag in tags:
+                self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+        self.backend.invalidate(tags)
+
+    def clear(self):
+        self.backend.clear()
+
+def _backend() -> MemoryBackend | RedisBackend:
+    if settings.CACHE_REDIS_URL:
+        return RedisBackend(settings.CACHE_REDIS_URL)
+    return MemoryBackend(settings.CACHE_MAX_ENTRIES)
+
+cache = Cache(_backend(), settings.CACHE_TTL, settings.CACHE_WAIT_TIMEOUT)
@@ -0,0 +1,105 @@
+import time
+from dataclasses import dataclass
+from threading import Lock
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.mapping import User, UserType
+from app.models.role import Role
+
+@dataclass(frozen=True)
+class GuestUserType:
+    """
+    Read-only copy of the guest user type
+
+    Attributes:
+        id (int): The id of the user type
+        code (str): The code of the user type
+        permissions (int): The permission mask of the user type
+    """
+    id: int
+    code: str
+    permissions: int
+
+@dataclass(frozen=True)
+class GuestPrincipal:
+    """
+    Read-only copy of the guest user, returned for anonymous requests
+    instead of querying the database every time
+
+    Attributes:
+        id (int): The id of the guest user
+        username (str): The username of the guest user
+        email (str): The email of the guest user
+        user_type_id (int): The id of the guest user type
+        user_type (GuestUserType): The guest user type
+    """
+    id: int
+    username: str
+    email: str
+    user_type_id: int
+    user_type: GuestUserType
+    deletion_date: None = None
+    password_hash: str = ''
+
+_guest_principal: Optional[GuestPrincipal] = None
+_loaded_at: float = 0
+_guest_lock = Lock()
+
+def _load_guest_principal(session: Session) -> Optional[GuestPrincipal]:
+    user_type = session.query(UserType).filter(UserType.permissions == Role.GUEST).one_or_none()
+    if not user_type:
+        raise HTTPException(status_code=500, detail="Guest user type not found")
+
+    user: User = session.query(User).filter(User.user_type_id == user_type.id).first()
+    if user is None:
+        return None
+
+    return GuestPrincipal(
+        id=user.id,
+        username=user.username,
+        email=user.email,
+        user_type_id=user_type.id,
+        user_type=GuestUserType(id=user_type.id, code=user_type.code, permissions=user_type.permissions)
+    )
+
+def refresh_guest_principal(session: Session = None) -> Optional[GuestPrincipal]:
+    """
+    Reload the guest principal from the database
+
+    Args:
+        session (Session): an optional session, a new one is opened if not given
+
+    Returns:
+        GuestPrincipal: the guest principal, None if the guest user does not exist
+    """
+    global _guest_principal, _loaded_at
+
+    with _guest_lock:
+        if session is not None:
+            _guest_principal = _load_guest_principal(session)
+        else:
+            own_session = SessionLocal()
+            try:
+                _guest_principal = _load_guest_principal(own_session)
+            finally:
+                own_session.close()
+
+        _loaded_at = time.monotonic()
+        return _guest_principal
+
+def get_guest_principal() -> Optional[GuestPrincipal]:
+    """
+    Return the cached guest principal, loading it on first use and again once
+    older than GUEST_CACHE_TTL (changes made by other processes are picked up then)
+
+    Returns:
+        GuestPrincipal: the guest principal, None if the guest user does not exist
+    """
+    principal = _guest_principal
+    if principal is None or time.monotonic() - _loaded_at > settings.GUEST_CACHE_TTL:
+        principal = refresh_guest_principal()
+    return principal
@@ -1,10 +1,15 @@
 from app.config import settings
-from app.models.mapping import User, UserType
+from app.models.mapping import User
 from app.database import get_session
-from app.models.role import Role
+from app.util.guest import get_guest_principal
 
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from jose import ExpiredSignatureError, JWTError, jwt
+from functools import lru_cache
+from hashlib import sha256
+from threading import Lock
+from jose import ExpiredSignatureError, JWTError, jwt, jwk
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import Cookie, HTTPException, Query, Request, WebSocket, status, Depends
 from typing import Annotated
@@ -26,6 +31,67 @@ credentials_exception = HTTPException(
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+@lru_cache(maxsize=1)
+def _get_public_key():
+    # parse the PEM key only once
+    return jwk.construct(settings.PUBLIC_KEY, settings.ALGORITHM)
+
+@lru_cache(maxsize=1)
+def _get_private_key():
+    return jwk.construct(settings.PRIVATE_KEY, settings.ALGORITHM)
+
+class TokenCache:
+    """
+    Bounded LRU of the claims of already verified tokens, keyed by the token hash.
+    Entries are dropped once the token expires, so an expired token is always
+    verified again (and rejected) by python-jose
+
+    Attributes:
+        max_size (int): The maximum number of cached tokens
+    """
+    max_size: int
+    _entries: OrderedDict
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return sha256(token.encode()).digest()
+
+    def get(self, token: str) -> dict | None:
+        key = self._key(token)
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is None:
+                return None
+
+            if payload["exp"] <= time.time():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return payload
+
+    def put(self, token: str, payload: dict):
+        if self.max_size <= 0 or not isinstance(payload.get("exp"), (int, float)):
+            return
+
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = payload
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE)
+
 def _create_access_token(data: dict = None, expires_delta: timedelta = None):
     # data is the payload of the token
     to_encode = data.copy()
@@ -36,7 +102,7 @@ def _create_access_token(data: dict = None, expires_delta: timedelta = None):
         expire = datetime.now(timezone.utc) + timedelta(minutes=15)
     to_encode.update({"exp": expire})
     
-    return jwt.encode(to_encode, settings.PRIVATE_KEY, algorithm=settings.ALGORITHM)
+    return jwt.encode(to_encode, _get_private_key(), algorithm=settings.ALGORITHM)
 
 def get_tokens(user_id, username, user_permissions):
     # Generate access token
@@ -58,8 +124,12 @@ def get_tokens(user_id, username, user_permissions):
 
 def decode_token(token: Annotated[str, Depends(oauth2_scheme)]):
     try:
-        payload = jwt.decode(token, settings.PUBLIC_KEY, algorithms=[settings.ALGORITHM])
-        
+        # skip the signature verification for tokens already seen
+        payload = token_cache.get(token)
+        if payload is None:
+            payload = jwt.decode(token, _get_public_key(), algorithms=[settings.ALGORITHM])
+            token_cache.put(token, payload)
+
         user_id = payload.get("user_id")
         username = payload.get("sub")
         role = payload.get("user_permissions")
@@ -75,34 +145,24 @@ def decode_token(token: Annotated[str, Depends(oauth2_scheme)]):
     except JWTError as e:
         raise credentials_exception
 
+def _get_guest_user():
+    guest = get_guest_principal()
+    if guest is None:
+        raise credentials_exception
+    return guest
+
 def get_current_user(token: Annotated[str | None, Cookie()], api_token: Annotated[str | None, Depends(BearerScheme())], session: Session = Depends(get_session)):
     token = token or api_token
 
     try:
         if token == '':
-            user_type = session.query(UserType).filter(UserType.permissions == Role.GUEST).one_or_none()
-            if not user_type:
-                raise HTTPException(status_code=500, detail="Guest user type not found")
-            
-            user: User = session.query(User).filter(User.user_type_id == user_type.id).first()
-
-            if user is None:
-                raise credentials_exception
-            return user
+            return _get_guest_user()
 
         else:
             id, username = decode_token(token)
 
             if (id == '' or username == ''):
-                user_type = session.query(UserType).filter(UserType.permissions == Role.GUEST).one_or_none()
-                if not user_type:
-                    raise HTTPException(status_code=500, detail="Guest user type not found")
-            
-                user: User = session.query(User).filter(User.user_type_id == user_type.id).first()
-
-                if user is None:
-                    raise credentials_exception
-                return user
+                return _get_guest_user()
 
             user: User = session.query(User).filter(User.id == id, User.username == username).first()
 
@@ -0,0 +1,154 @@
+import gzip
+import json
+import time
+import logging
+import threading
+from collections import deque
+from typing import Optional
+import requests
+
+class LokiShippingHandler(logging.Handler):
+    """
+    Ships the records to Loki in batches from a background thread.
+
+    emit only appends the record to a bounded queue: when Loki is slower than the application
+    the oldest records are dropped (and counted) instead of growing the memory or blocking the requests.
+    A batch is pushed, gzipped, when it reaches batch_size records or after batch_interval seconds.
+    When a push fails the batch is written to the fallback handler (a file or the console),
+    and so are the next ones until retry_interval seconds have passed.
+
+    Attributes:
+        url (str): The Loki push endpoint
+        labels (dict): The labels of every stream, the level and the logger name are added per record
+        dropped (int): Records dropped because the queue was full
+        shipped (int): Records pushed to Loki
+        failed_pushes (int): Pushes that failed
+        fallback_records (int): Records written to the fallback handler instead of Loki
+    """
+    url: str
+    labels: dict
+    dropped: int
+    shipped: int
+    failed_pushes: int
+    fallback_records: int
+
+    def __init__(self, url: str, labels: dict, batch_size: int = 500, batch_interval: float = 1.0,
+                 queue_size: int = 10000, timeout: float = 5.0, retry_interval: float = 30.0,
+                 fallback: Optional[logging.Handler] = None):
+        super().__init__()
+        self.url = url
+        self.labels = labels
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self.fallback = fallback
+
+        self.dropped = 0
+        self.shipped = 0
+        self.failed_pushes = 0
+        self.fallback_records = 0
+
+        self._queue: deque = deque(maxlen=queue_size)
+        self._condition = threading.Condition()
+        self._closed = False
+        self._unavailable_until = 0.0
+        self._session = requests.Session()
+        self._thread = threading.Thread(target=self._run, name="loki-shipping", daemon=True)
+        self._thread.start()
+
+    def emit(self, record: logging.LogRecord):
+        # the record is formatted by the shipping thread, not on the request path
+        with self._condition:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append(record)
+            if len(self._queue) >= self.batch_size:
+                self._condition.notify()
+
+    def flush(self):
+        """ Ship the queued records now, blocking until they are pushed (or written to the fallback) """
+        while True:
+            with self._condition:
+                batch = self._take()
+            if not batch:
+                return
+            self._ship(batch)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join(self.timeout + 1)
+        self.flush()
+        self._session.close()
+        super().close()
+
+    def stats(self) -> dict:
+        """ The counters of the handler, and the records waiting in the queue """
+        return {
+            "queued": len(self._queue),
+            "dropped": self.dropped,
+            "shipped": self.shipped,
+            "failed_pushes": self.failed_pushes,
+            "fallback_records": self.fallback_records,
+        }
+
+    def _take(self) -> list:
+        return [self._queue.popleft() for _ in range(min(len(self._queue), self.batch_size))]
+
+    def _run(self):
+        while True:
+            with self._condition:
+                deadline = time.monotonic() + self.batch_interval
+                while not self._closed and len(self._queue) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                if self._closed:
+                    return
+                batch = self._take()
+            if batch:
+                self._ship(batch)
+
+    def _ship(self, batch: list):
+        if time.monotonic() >= self._unavailable_until:
+            try:
+                self._push(batch)
+                self.shipped += len(batch)
+                return
+            except Exception:
+                self.failed_pushes += 1
+                self._unavailable_until = time.monotonic() + self.retry_interval
+        self._write_fallback(batch)
+
+    def _push(self, batch: list):
+        streams = {}
+        for record in batch:
+            labels = dict(self.labels, level=record.levelname.lower(), logger=record.name)
+            extra = getattr(record, "tags", None)
+            if isinstance(extra, dict):
+                labels.update((str(name), str(value)) for name, value in extra.items())
+            key = tuple(sorted(labels.items()))
+            stream = streams.get(key)
+            if stream is None:
+                stream = streams[key] = {"stream": labels, "values": []}
+            stream["values"].append([str(int(record.created * 1e9)), self.format(record)])
+
+        body = gzip.compress(json.dumps({"streams": list(streams.values())}).encode())
+        response = self._session.post(
+            self.url,
+            data=body,
+            headers={"Content-Type": "application/json", "Content-Encoding": "gzip"},
+            timeout=self.timeout,
+        )
+        if response.status_code >= 300:
+            raise ValueError(f"Unexpected Loki response status code {response.status_code}")
+
+    def _write_fallback(self, batch: list):
+        if self.fallback is None:
+            return
+        for record in batch:
+            self.fallback.handle(record)
+        self.fallback_records += len(batch)
@@ -0,0 +1,59 @@
+"""
+Prometheus metrics of the API, the judge pipeline and the MQTT publisher
+
+With several uvicorn workers set PROMETHEUS_MULTIPROC_DIR to an empty directory (before the
+workers start): every process writes its samples there and /metrics aggregates all of them.
+Without it the metrics are the ones of the serving process.
+"""
+import os
+from datetime import datetime
+from prometheus_client import REGISTRY, CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, start_http_server
+from prometheus_client import multiprocess
+
+# seconds, from a fast API call to a judge queue under load
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PIPELINE_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+REQUEST_DURATION = Histogram("http_request_duration_seconds", "Duration of the requests, to the end of the response body",
+                             ["method", "route"], buckets=LATENCY_BUCKETS)
+REQUESTS = Counter("http_requests_total", "Served requests", ["method", "route", "status"])
+
+SUBMISSIONS = Counter("submissions_total", "Created submissions, by whether they reached the judge queue", ["queued"])
+SUBMISSION_QUEUE_LAG = Histogram("submission_queue_lag_seconds", "From the creation of a submission to the first test case result of the judge",
+                                 buckets=PIPELINE_BUCKETS)
+VERDICT_LATENCY = Histogram("judge_verdict_latency_seconds", "From the creation of a submission to its total result",
+                            buckets=PIPELINE_BUCKETS)
+VERDICTS = Counter("judge_verdicts_total", "Total results saved by the judges", ["result"])
+
+SCOREBOARD_DURATION = Histogram("scoreboard_compute_seconds", "Time to compute a contest scoreboard", buckets=LATENCY_BUCKETS)
+MQTT_MESSAGES = Counter("mqtt_messages_published_total", "Messages published to the MQTT broker", ["topic"])
+
+WEBSOCKET_CONNECTIONS = Gauge("websocket_connections", "Open WebSocket connections", multiprocess_mode="livesum")
+WEBSOCKET_MESSAGES = Counter("websocket_messages_total", "Messages sent on the WebSocket connections", ["status"])
+
+def _multiprocess() -> bool:
+    return "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+def registry() -> CollectorRegistry:
+    """ The registry to expose: the aggregate of all the processes in multiprocess mode """
+    if not _multiprocess():
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+def render() -> tuple[bytes, str]:
+    """ The metrics in the Prometheus text format, and their content type """
+    return generate_latest(registry()), CONTENT_TYPE_LATEST
+
+def start_metrics_server(port: int):
+    """ Serve /metrics on its own port, for the processes without an API (the MQTT publisher) """
+    start_http_server(port, registry=registry())
+
+def mark_process_dead():
+    """ Drop the live gauges of this process from the aggregate, when it exits """
+    if _multiprocess():
+        multiprocess.mark_process_dead(os.getpid())
+
+def seconds_since(moment: datetime) -> float:
+    return max((datetime.now() - moment).total_seconds(), 0)
@@ -0,0 +1,180 @@
+import json
+import time
+import base64
+from datetime import datetime
+from threading import Lock
+from typing import Any, Callable, List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import Select, func, select, text, tuple_
+from sqlalchemy.orm import Session, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.schemas import PaginationParams
+
+def encode_cursor(values: tuple) -> str:
+    """ Opaque cursor holding the sort key of the last row of a page """
+    payload = [{"$dt": value.isoformat()} if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def _matches(value: Any, column) -> bool:
+    # the value of a cursor has to be of the type of its column, or the comparison fails in the database
+    try:
+        expected = column.type.python_type
+    except (AttributeError, NotImplementedError):
+        # untyped expression, nothing to check against
+        return value is not None
+    if isinstance(value, bool):
+        return expected is bool
+    if expected is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, expected)
+
+def decode_cursor(cursor: str, columns: tuple) -> list:
+    """ The sort key values of a cursor, checked against the key columns (400 on a tampered cursor) """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(payload, list) or len(payload) != len(columns):
+            raise ValueError("Wrong cursor size")
+        values = [datetime.fromisoformat(value["$dt"]) if isinstance(value, dict) else value for value in payload]
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if not all(_matches(value, column) for value, column in zip(values, columns)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+class Keyset:
+    """
+    The sort key of a paginated list, it has to be unique (end with the primary key) and indexed.
+    With a cursor the page starts right after the last row of the previous one (WHERE key > cursor),
+    so every page costs the same regardless of its depth. Without a cursor the offset is still honoured.
+
+    Attributes:
+        columns (tuple): The columns of the sort key
+        descending (bool): Sort direction of all the columns
+    """
+    columns: tuple
+    descending: bool
+
+    def __init__(self, *columns, descending: bool = False):
+        self.columns = columns
+        self.descending = descending
+
+    def apply(self, statement: Select | Query, pagination: PaginationParams) -> Select | Query:
+        """ Order the statement by the key and restrict it to the requested page (plus one row, to detect the next page) """
+        statement = statement.order_by(*(column.desc() if self.descending else column.asc() for column in self.columns))
+
+        if pagination.cursor:
+            values = decode_cursor(pagination.cursor, self.columns)
+            key = tuple_(*self.columns)
+            statement = statement.filter(key < tuple_(*values) if self.descending else key > tuple_(*values))
+        elif pagination.offset:
+            statement = statement.offset(pagination.offset)
+
+        return statement.limit(pagination.limit + 1)
+
+    def page(self, rows: List[Any], pagination: PaginationParams, key: Callable[[Any], tuple] = None) -> Tuple[List[Any], Optional[str]]:
+        """
+        Split the rows fetched with apply() into the page and the cursor of the next page
+
+        Args:
+            rows (List): the fetched rows
+            pagination (PaginationParams): the pagination
+            key (Callable): returns the sort key of a row, by default the attributes named like the columns
+
+        Returns:
+            Tuple[List, str]: the rows of the page and the next cursor (None on the last page)
+        """
+        if len(rows) <= pagination.limit:
+            return rows, None
+
+        rows = rows[:pagination.limit]
+        last = rows[-1]
+        values = key(last) if key else tuple(getattr(last, column.key) for column in self.columns)
+        return rows, encode_cursor(values)
+
+# cached exact counts of filtered lists: statement -> (count, expiration)
+_counts: dict[str, Tuple[int, float]] = {}
+_counts_lock = Lock()
+
+def _count_key(statement: Select) -> str:
+    compiled = statement.compile()
+    return str(compiled) + repr(sorted(compiled.params.items(), key=lambda item: item[0]))
+
+def _cached_count(key: str) -> Optional[int]:
+    entry = _counts.get(key)
+    if entry and entry[1] > time.monotonic():
+        return entry[0]
+    return None
+
+def _store_count(key: str, count: int):
+    with _counts_lock:
+        if len(_counts) > 1024:
+            now = time.monotonic()
+            for stale in [k for k, (_, expiration) in _counts.items() if expiration <= now]:
+                del _counts[stale]
+        _counts[key] = (count, time.monotonic() + settings.PAGINATION_COUNT_CACHE_TTL)
+
+_ESTIMATE = text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)")
+
+def _count_statement(statement: Select | Query) -> Select:
+    if isinstance(statement, Query):
+        statement = statement.statement
+    return select(func.count()).select_from(statement.order_by(None).subquery())
+
+def count_rows(session: Session, statement: Select | Query, pagination: PaginationParams, table: str = None) -> Optional[int]:
+    """
+    Count the rows of a list according to pagination.count:
+    exact (COUNT(*)), estimated (planner statistics when the whole `table` is listed,
+    otherwise an exact count cached for PAGINATION_COUNT_CACHE_TTL seconds) or none
+
+    Args:
+        session (Session): the session
+        statement (Select | Query): the filtered statement, without ordering or pagination
+        pagination (PaginationParams): the pagination
+        table (str): the listed table, only when the statement has no filters
+
+    Returns:
+        int: the count, None when not requested
+    """
+    if pagination.count == "none":
+        return None
+
+    statement = _count_statement(statement)
+    if pagination.count == "exact":
+        return session.scalar(statement)
+
+    if table:
+        estimate = session.scalar(_ESTIMATE, {"table": table})
+        # -1 (or 0) until the table is analyzed
+        if estimate and estimate > 0:
+            return estimate
+
+    key = _count_key(statement)
+    count = _cached_count(key)
+    if count is None:
+        count = session.scalar(statement)
+        _store_count(key, count)
+    return count
+
+async def count_rows_async(session: AsyncSession, statement: Select, pagination: PaginationParams, table: str = None) -> Optional[int]:
+    """ Async counterpart of count_rows """
+    if pagination.count == "none":
+        return None
+
+    statement = _count_statement(statement)
+    if pagination.count == "exact":
+        return await session.scalar(statement)
+
+    if table:
+        estimate = await session.scalar(_ESTIMATE, {"table": table})
+        if estimate and estimate > 0:
+            return estimate
+
+    key = _count_key(statement)
+    count = _cached_count(key)
+    if count is None:
+        count = await session.scalar(statement)
+        _store_count(key, count)
+    return count
@@ -0,0 +1,94 @@
+import time
+from threading import Lock
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.mapping import User, UserType
+from app.models.role import Role
+
+# user_type_id -> permission mask
+_permissions: Optional[dict[int, Role]] = None
+_loaded_at: float = 0
+# user types still unknown after a reload, not reloaded again until the map expires
+_unknown: set[int] = set()
+_permissions_lock = Lock()
+
+def _load_permissions(session: Session) -> dict[int, Role]:
+    return {user_type.id: Role(user_type.permissions) for user_type in session.query(UserType).all()}
+
+def refresh_permissions(session: Session = None) -> dict[int, Role]:
+    """
+    Reload the permission map from the user_types table
+
+    Args:
+        session (Session): an optional session, a new one is opened if not given
+
+    Returns:
+        dict[int, Role]: the permission mask of every user type
+    """
+    global _permissions, _loaded_at
+
+    with _permissions_lock:
+        if session is not None:
+            permissions = _load_permissions(session)
+        else:
+            own_session = SessionLocal()
+            try:
+                permissions = _load_permissions(own_session)
+            finally:
+                own_session.close()
+
+        _permissions = permissions
+        _loaded_at = time.monotonic()
+        _unknown.clear()
+        return permissions
+
+def invalidate_permissions():
+    """ Drop the permission map, it is reloaded on the next role check """
+    global _permissions
+    _permissions = None
+
+def get_permissions(user_type_id: int) -> Role:
+    """
+    Return the permission mask of a user type without touching the database
+    (unless the map is not loaded, expired or the user type is unknown)
+
+    Args:
+        user_type_id (int): the id of the user type
+
+    Returns:
+        Role: the permission mask, Role.GUEST for unknown user types
+    """
+    permissions = _permissions
+    if permissions is None or time.monotonic() - _loaded_at > settings.PERMISSIONS_CACHE_TTL:
+        permissions = refresh_permissions()
+    elif user_type_id not in permissions and user_type_id not in _unknown:
+        # the user type may have been created by another process
+        permissions = refresh_permissions()
+        if user_type_id not in permissions:
+            _unknown.add(user_type_id)
+
+    return permissions.get(user_type_id, Role.GUEST)
+
+def get_user_permissions(user: User) -> Role:
+    return get_permissions(user.user_type_id)
+
+# any change to the user types made through the ORM invalidates the map, once committed
+# (invalidating at flush time would let a concurrent request reload the old rows)
+@event.listens_for(Session, "after_flush")
+def _on_flush(session, flush_context):
+    changed = (*session.new, *session.dirty, *session.deleted)
+    if any(isinstance(instance, UserType) for instance in changed):
+        session.info["user_types_changed"] = True
+
+@event.listens_for(Session, "after_commit")
+def _on_commit(session):
+    if session.info.pop("user_types_changed", False):
+        invalidate_permissions()
+
+@event.listens_for(Session, "after_rollback")
+def _on_rollback(session):
+    session.info.pop("user_types_changed", None)
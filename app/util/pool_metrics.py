@@ -0,0 +1,178 @@
+import time
+from threading import Lock
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+from app.config import settings
+
+# the scope of the current request, set by the logging middleware
+current_scope: ContextVar[dict | None] = ContextVar("current_scope", default=None)
+
+def current_route() -> str:
+    """
+    The method and the route template of the current request (e.g. GET /problems/{id}),
+    recorded with the connections held too long: a bounded set of keys, unlike the paths.
+    Empty outside of a request
+    """
+    scope = current_scope.get()
+    if scope is None:
+        return ""
+    # the router stores the matched route in the scope, the connections are checked out after that
+    return f"{scope['method']} {getattr(scope.get('route'), 'path', 'unmatched')}"
+
+# upper bounds of the checkout wait histogram, in milliseconds
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+class PoolMetrics:
+    """
+    Counters of a connection pool, updated by the instrumented pools and the checkout/checkin events
+
+    Attributes:
+        name (str): The name of the engine
+        long_hold_ms (float): Connections held longer than this are recorded with their route
+    """
+    name: str
+    long_hold_ms: float
+
+    def __init__(self, name: str, long_hold_ms: float):
+        self.name = name
+        self.long_hold_ms = long_hold_ms
+        self._lock = Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.wait_sum_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.max_overflow_used = 0
+        self.long_holds = 0
+        self.long_holds_by_route: dict[str, int] = {}
+        self.recent_long_holds = deque(maxlen=50)
+
+    def observe_checkout(self, wait_ms: float, overflow: int):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_sum_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            self.max_overflow_used = max(self.max_overflow_used, overflow)
+            for i, bound in enumerate(WAIT_BUCKETS_MS):
+                if wait_ms <= bound:
+                    self.wait_buckets[i] += 1
+                    break
+            else:
+                self.wait_buckets[-1] += 1
+
+    def observe_timeout(self, wait_ms: float):
+        with self._lock:
+            self.timeouts += 1
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def observe_hold(self, held_ms: float, route: str):
+        if held_ms < self.long_hold_ms:
+            return
+        with self._lock:
+            self.long_holds += 1
+            self.long_holds_by_route[route] = self.long_holds_by_route.get(route, 0) + 1
+            self.recent_long_holds.append({"route": route, "held_ms": round(held_ms, 2), "at": datetime.now().isoformat()})
+
+    def snapshot(self, pool: QueuePool) -> dict:
+        with self._lock:
+            cumulative = 0
+            histogram = []
+            for bound, count in zip(WAIT_BUCKETS_MS + ("+Inf",), self.wait_buckets):
+                cumulative += count
+                histogram.append({"le": bound, "count": cumulative})
+
+            return {
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "max_overflow_used": self.max_overflow_used,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_ms": {
+                    "sum": round(self.wait_sum_ms, 2),
+                    "max": round(self.max_wait_ms, 2),
+                    "histogram": histogram,
+                },
+                "long_holds": {
+                    "threshold_ms": self.long_hold_ms,
+                    "count": self.long_holds,
+                    "by_route": dict(self.long_holds_by_route),
+                    "recent": list(self.recent_long_holds),
+                },
+            }
+
+class _InstrumentedPool:
+    # measures how long Pool.connect() waits for a connection (queueing and connecting)
+    metrics: PoolMetrics = None
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            if self.metrics is not None:
+                self.metrics.observe_timeout((time.perf_counter() - start) * 1000)
+            raise
+
+        if self.metrics is not None:
+            self.metrics.observe_checkout((time.perf_counter() - start) * 1000, max(self.overflow(), 0))
+        return connection
+
+    def recreate(self):
+        # engine.dispose() replaces the pool, the counters carry over
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+class InstrumentedQueuePool(_InstrumentedPool, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    pass
+
+# engine name -> (engine, metrics)
+_engines: dict[str, tuple] = {}
+
+def instrument(engine, name: str) -> PoolMetrics:
+    """
+    Attach the metrics to an engine created with one of the instrumented pool classes
+
+    Args:
+        engine (Engine | AsyncEngine): the engine
+        name (str): the name the metrics are reported under
+
+    Returns:
+        PoolMetrics: the metrics of the engine
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+    metrics = PoolMetrics(name, settings.POOL_LONG_HOLD_MS)
+    sync_engine.pool.metrics = metrics
+
+    @event.listens_for(sync_engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checkout_at"] = time.perf_counter()
+        connection_record.info["route"] = current_route() or "(no route)"
+
+    @event.listens_for(sync_engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        if connection_record is None:
+            return
+        checkout_at = connection_record.info.pop("checkout_at", None)
+        route = connection_record.info.pop("route", "(no route)")
+        if checkout_at is not None:
+            metrics.observe_hold((time.perf_counter() - checkout_at) * 1000, route)
+
+    _engines[name] = (sync_engine, metrics)
+    return metrics
+
+def get_pool_metrics() -> dict:
+    """ Snapshot of the metrics of every instrumented engine """
+    return {
+        "process_role": settings.PROCESS_ROLE,
+        "engines": {name: metrics.snapshot(sync_engine.pool) for name, (sync_engine, metrics) in _engines.items()},
+    }
@@ -1,8 +1,113 @@
 import os
-from hashlib import sha256
+import asyncio
+from hashlib import sha256, scrypt
+from hmac import compare_digest
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple
 
-def _hash_password(password: str, salt: str = None):
+from app.config import settings
+
+SCRYPT_PREFIX = "scrypt"
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> str:
+    # memory needed by scrypt is ~128 * r * (n + p + 2) bytes
+    key = scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=128 * r * (n + p + 2) + 1024 * 1024, dklen=32)
+    return f"{SCRYPT_PREFIX}${n}${r}${p}${key.hex()}"
+
+def _legacy_hash(password: str, salt: bytes) -> str:
+    return sha256(salt + password.encode()).hexdigest()
+
+def _hash_password(password: str, salt: bytes = None):
+    """
+    Hash a password with scrypt (blocking, CPU and memory heavy).
+    Use password_hasher from async code.
+
+    Args:
+        password (str): the plain password
+        salt (bytes): an optional salt, a random one is generated if not given
+
+    Returns:
+        Tuple[str, str]: the encoded hash and the hex salt
+    """
     if not salt:
         salt = os.urandom(32)
-    key = sha256(salt + password.encode()).hexdigest()
-    return key, salt.hex()
\ No newline at end of file
+    key = _scrypt(password, salt, settings.SCRYPT_N, settings.SCRYPT_R, settings.SCRYPT_P)
+    return key, salt.hex()
+
+def _verify_password(password: str, password_hash: str, salt: str) -> Tuple[bool, bool]:
+    """
+    Check a password against a stored hash, either scrypt or the legacy salted SHA-256
+
+    Args:
+        password (str): the plain password
+        password_hash (str): the stored hash
+        salt (str): the stored hex salt
+
+    Returns:
+        Tuple[bool, bool]: whether the password is valid and whether the hash should be upgraded
+    """
+    if not password_hash:
+        return False, False
+
+    try:
+        salt_bytes = bytes.fromhex(salt)
+    except (ValueError, TypeError):
+        return False, False
+
+    if password_hash.startswith(SCRYPT_PREFIX + "$"):
+        try:
+            _, n, r, p, _ = password_hash.split("$")
+            n, r, p = int(n), int(r), int(p)
+        except ValueError:
+            return False, False
+
+        valid = compare_digest(_scrypt(password, salt_bytes, n, r, p), password_hash)
+        outdated = (n, r, p) != (settings.SCRYPT_N, settings.SCRYPT_R, settings.SCRYPT_P)
+        return valid, valid and outdated
+
+    valid = compare_digest(_legacy_hash(password, salt_bytes), password_hash)
+    return valid, valid
+
+class PasswordHasher:
+    """
+    Runs the password hashing on a bounded thread pool, so it never blocks the event loop
+    (hashlib.scrypt releases the GIL while hashing)
+
+    Attributes:
+        workers (int): The maximum number of concurrent hashes
+    """
+    workers: int
+    _executor: ThreadPoolExecutor | None
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pwd")
+        return self._executor
+
+    async def hash(self, password: str) -> Tuple[str, str]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, _hash_password, password)
+
+    async def verify(self, password: str, password_hash: str, salt: str) -> Tuple[bool, bool]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, _verify_password, password, password_hash, salt)
+
+    def hash_sync(self, password: str) -> Tuple[str, str]:
+        """ Blocking counterpart of hash, for the sync controllers (still bounded by the pool) """
+        return self.executor.submit(_hash_password, password).result()
+
+    def verify_sync(self, password: str, password_hash: str, salt: str) -> Tuple[bool, bool]:
+        """ Blocking counterpart of verify, for the sync controllers """
+        return self.executor.submit(_verify_password, password, password_hash, salt).result()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS)
@@ -0,0 +1,49 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+
+class QueryCounter:
+    """
+    The SQL statements executed while counting
+
+    Attributes:
+        count (int): The number of statements
+        statements (list): The executed SQL, to show which query repeats
+    """
+    count: int
+    statements: list
+
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+# the counter of the current request, shared with the threads and greenlets that serve it
+_counter: ContextVar[Optional[QueryCounter]] = ContextVar("query_counter", default=None)
+
+def count_queries(engine):
+    """ Count the statements executed by the engine (sync or async) while a counter is active """
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _on_execute(connection, cursor, statement, parameters, context, executemany):
+        counter = _counter.get()
+        if counter is not None:
+            counter.count += 1
+            counter.statements.append(statement)
+
+@contextmanager
+def counting():
+    """
+    Count the statements executed inside the block, e.g.
+
+        with counting() as counter:
+            list_problems(...)
+        assert counter.count <= 3
+    """
+    counter = QueryCounter()
+    token = _counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _counter.reset(token)
@@ -0,0 +1,174 @@
+import os
+import sys
+import time
+import random
+import threading
+from collections import deque
+from datetime import datetime
+from sqlalchemy import event
+
+from app.config import settings
+from app.logger import get_logger, LogEvent
+from app.util.pool_metrics import current_route
+
+# the app package, and its database plumbing that is skipped when looking for the caller
+_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+_SKIPPED = (os.path.join(_APP_DIR, "util") + os.sep, os.path.join(_APP_DIR, "database.py"))
+
+# distinct statements kept in the statistics, the cheapest are dropped above it
+MAX_STATEMENTS = 1000
+
+class StatementStats:
+    """
+    Timings of one SQL statement (the same text, whatever the parameters)
+
+    Attributes:
+        count (int): Sampled executions
+        total_ms (float): Total time of the sampled executions
+        max_ms (float): Slowest sampled execution
+        callers (set): Where it was issued from
+    """
+    __slots__ = ("count", "total_ms", "max_ms", "callers")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.callers = set()
+
+class QueryProfiler:
+    """
+    Samples the statements of the engines: the slow ones are logged with the code that issued them
+    and the shape of their parameters, all of them add up in the top statements by total time.
+    It can be switched on and off, and tuned, at runtime; the statistics are per process.
+
+    Attributes:
+        enabled (bool): Whether the statements are sampled
+        sample_rate (float): Share of the statements that are timed
+        slow_ms (float): Statements slower than this are logged
+    """
+    enabled: bool
+    sample_rate: float
+    slow_ms: float
+
+    def __init__(self, enabled: bool, sample_rate: float, slow_ms: float):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        self._statements: dict[str, StatementStats] = {}
+        self.recent_slow = deque(maxlen=50)
+        self.since = datetime.now()
+
+    def configure(self, enabled: bool = None, sample_rate: float = None, slow_ms: float = None):
+        if enabled is not None:
+            self.enabled = enabled
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if slow_ms is not None:
+            self.slow_ms = slow_ms
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+            self.recent_slow.clear()
+            self.since = datetime.now()
+
+    def sampled(self) -> bool:
+        return self.enabled and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+
+    def observe(self, statement: str, parameters, elapsed_ms: float):
+        caller = None
+        if elapsed_ms >= self.slow_ms:
+            # walking the stack is the expensive part, only for the slow ones
+            caller = _caller()
+            self._log_slow(statement, parameters, elapsed_ms, caller)
+
+        with self._lock:
+            stats = self._statements.get(statement)
+            if stats is None:
+                if len(self._statements) >= MAX_STATEMENTS:
+                    cheapest = min(self._statements, key=lambda key: self._statements[key].total_ms)
+                    del self._statements[cheapest]
+                stats = self._statements[statement] = StatementStats()
+            stats.count += 1
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+            if caller is not None and len(stats.callers) < 10:
+                stats.callers.add(caller)
+
+    def _log_slow(self, statement: str, parameters, elapsed_ms: float, caller: str):
+        entry = {
+            "at": datetime.now().isoformat(),
+            "elapsed_ms": round(elapsed_ms, 2),
+            "caller": caller,
+            "statement": statement[:2000],
+            "parameters": parameter_shapes(parameters),
+        }
+        self.recent_slow.append(entry)
+        get_logger().warning(LogEvent(event="slow_query", **entry))
+
+    def snapshot(self, top: int) -> dict:
+        """ Settings, the top statements by total time and the latest slow statements """
+        with self._lock:
+            statements = sorted(self._statements.items(), key=lambda item: item[1].total_ms, reverse=True)[:top]
+            return {
+                "enabled": self.enabled,
+                "sample_rate": self.sample_rate,
+                "slow_ms": self.slow_ms,
+                "since": self.since.isoformat(),
+                "top": [{
+                    "statement": statement,
+                    "count": stats.count,
+                    "total_ms": round(stats.total_ms, 2),
+                    "mean_ms": round(stats.total_ms / stats.count, 2),
+                    "max_ms": round(stats.max_ms, 2),
+                    "callers": sorted(stats.callers),
+                } for statement, stats in statements],
+                "recent_slow": list(self.recent_slow),
+            }
+
+def parameter_shapes(parameters) -> object:
+    """ The names and types of the bind parameters, never their values """
+    if isinstance(parameters, (list, tuple)) and parameters and isinstance(parameters[0], (dict, list, tuple)):
+        # executemany
+        return {"rows": len(parameters), "row": parameter_shapes(parameters[0])}
+    if isinstance(parameters, dict):
+        return {name: _shape(value) for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_shape(value) for value in parameters]
+    return type(parameters).__name__
+
+def _shape(value) -> str:
+    if isinstance(value, (list, tuple, set)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+def _caller() -> str:
+    # the innermost frame of the application outside the database plumbing, the async
+    # controllers run the statements in a greenlet without their frames: then the route
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_APP_DIR) and not filename.startswith(_SKIPPED):
+            module = "app." + filename[len(_APP_DIR):-3].replace(os.sep, ".")
+            return f"{module}.{frame.f_code.co_name}:{frame.f_lineno}"
+        frame = frame.f_back
+    return current_route() or "(unknown)"
+
+profiler = QueryProfiler(settings.QUERY_PROFILER_ENABLED, settings.QUERY_PROFILER_SAMPLE_RATE, settings.QUERY_SLOW_MS)
+
+def profile_queries(engine):
+    """ Feed the statements executed by the engine (sync or async) to the profiler """
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_execute(connection, cursor, statement, parameters, context, executemany):
+        if profiler.sampled():
+            context._profile_start = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_execute(connection, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_profile_start", None)
+        if start is not None:
+            profiler.observe(statement, parameters, (time.perf_counter() - start) * 1000)
@@ -0,0 +1,169 @@
+import time
+import asyncio
+from threading import Lock
+from typing import Optional
+from fastapi import HTTPException, Request
+from sqlalchemy import text
+from jose import JWTError
+from anyio import to_thread
+
+from app.config import settings
+from app import database
+from app.database import SessionLocal, AsyncSessionLocal
+from app.util.jwt import decode_token
+from app.util.cache import MemoryBackend, RedisBackend
+
+# 0 when the replica has replayed everything it received, otherwise the age of the last replayed transaction.
+# On a server that is not a standby both functions return NULL, the replica is then considered up to date
+_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() IS NULL OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+class ReplicaRouter:
+    """
+    Decides whether a read-only request can be served by the replica
+
+    A request goes to the primary when no replica is configured, when the user wrote
+    something in the last `window` seconds (read your writes) or when the replica lags
+    more than `max_lag` seconds. The lag is checked at most every `check_interval` seconds.
+    The write windows are shared by all the processes through redis when CACHE_REDIS_URL is set,
+    otherwise they are kept in memory, per process.
+
+    Attributes:
+        window (float): Seconds after a write during which the user reads from the primary
+        max_lag (float): Maximum replication lag tolerated, in seconds
+        check_interval (float): Minimum interval between two lag checks, in seconds
+        writes (MemoryBackend | RedisBackend): The users who wrote in the last `window` seconds
+    """
+    window: float
+    max_lag: float
+    check_interval: float
+    writes: MemoryBackend | RedisBackend
+
+    def __init__(self, window: float, max_lag: float, check_interval: float, writes: MemoryBackend | RedisBackend):
+        self.window = window
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.writes = writes
+        self._lock = Lock()
+        self._async_lock: Optional[asyncio.Lock] = None
+        self._lag: Optional[float] = None
+        self._checked_at: float = 0
+
+    @property
+    def configured(self) -> bool:
+        return database.replica_engine is not None
+
+    def mark_write(self, user_id: int):
+        """ Route the reads of the user to the primary for the next `window` seconds """
+        if self.window > 0:
+            # the entry expires with the window
+            self.writes.set(str(user_id), True, self.window, ())
+
+    async def mark_write_async(self, user_id: int):
+        if isinstance(self.writes, MemoryBackend):
+            self.mark_write(user_id)
+        else:
+            await to_thread.run_sync(self.mark_write, user_id)
+
+    def in_write_window(self, user_id: Optional[int]) -> bool:
+        if user_id is None:
+            return False
+        return self.writes.get(str(user_id)) is True
+
+    async def in_write_window_async(self, user_id: Optional[int]) -> bool:
+        if user_id is None or isinstance(self.writes, MemoryBackend):
+            return self.in_write_window(user_id)
+        return await to_thread.run_sync(self.in_write_window, user_id)
+
+    def _lag_is_fresh(self) -> bool:
+        return time.monotonic() - self._checked_at < self.check_interval
+
+    def _lag_ok(self) -> bool:
+        return self._lag is not None and self._lag <= self.max_lag
+
+    def replica_usable(self) -> bool:
+        """ Check the replica lag from synchronous code """
+        if not self.configured:
+            return False
+        if not self._lag_is_fresh():
+            with self._lock:
+                if not self._lag_is_fresh():
+                    try:
+                        with database.replica_engine.connect() as connection:
+                            self._lag = float(connection.execute(_LAG_QUERY).scalar())
+                    except Exception:
+                        # an unreachable replica is treated as infinitely late
+                        self._lag = None
+                    self._checked_at = time.monotonic()
+        return self._lag_ok()
+
+    async def replica_usable_async(self) -> bool:
+        """ Check the replica lag without blocking the event loop """
+        if not self.configured:
+            return False
+        if not self._lag_is_fresh():
+            if self._async_lock is None:
+                self._async_lock = asyncio.Lock()
+            async with self._async_lock:
+                if not self._lag_is_fresh():
+                    try:
+                        async with database.async_replica_engine.connect() as connection:
+                            self._lag = float((await connection.execute(_LAG_QUERY)).scalar())
+                    except Exception:
+                        self._lag = None
+                    self._checked_at = time.monotonic()
+        return self._lag_ok()
+
+    def reset(self):
+        """ Forget the write windows and the last lag check """
+        self.writes.clear()
+        with self._lock:
+            self._lag = None
+            self._checked_at = 0
+
+def _writes_backend() -> MemoryBackend | RedisBackend:
+    if settings.CACHE_REDIS_URL:
+        return RedisBackend(settings.CACHE_REDIS_URL, prefix="byteblitz:writes:")
+    return MemoryBackend(max_entries=65536)
+
+replica_router = ReplicaRouter(settings.READ_YOUR_WRITES_SECONDS, settings.REPLICA_MAX_LAG_SECONDS, settings.REPLICA_LAG_CHECK_INTERVAL, _writes_backend())
+
+def _request_user_id(request: Request) -> Optional[int]:
+    # the user id is read from the (cached) token, without loading the user
+    token = request.cookies.get("token")
+    if not token:
+        authorization = request.headers.get("Authorization")
+        if authorization and authorization.startswith("Bearer "):
+            token = authorization.split(" ")[1]
+    if not token:
+        return None
+
+    try:
+        user_id, _ = decode_token(token)
+        return user_id or None
+    except (HTTPException, JWTError):
+        return None
+
+def get_read_session(request: Request):
+    """ Session for read-only endpoints, bound to the replica when it can serve the request """
+    if not replica_router.in_write_window(_request_user_id(request)) and replica_router.replica_usable():
+        db = database.ReplicaSessionLocal()
+    else:
+        db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_session(request: Request):
+    """ Async session for read-only endpoints, bound to the replica when it can serve the request """
+    if not await replica_router.in_write_window_async(_request_user_id(request)) and await replica_router.replica_usable_async():
+        session_factory = database.AsyncReplicaSessionLocal
+    else:
+        session_factory = AsyncSessionLocal
+    async with session_factory() as db:
+        yield db
@@ -2,6 +2,7 @@ from typing import Annotated
 from app.models.mapping import User
 from fastapi import Depends, HTTPException
 from app.util.jwt import get_current_user, get_judge
+from app.util.permissions import get_user_permissions
 from app.models.role import Role
 
 #TODO: merged stuff + TO_TEST every endpoint
@@ -10,14 +11,15 @@ class RoleChecker:
         self.allowed_roles = allowed_roles
 
     def __call__(self, user: Annotated[User, Depends(get_current_user)]):
+        permissions = get_user_permissions(user)
         for required_role in self.allowed_roles:
-            if user.user_type.permissions & required_role == required_role:    
+            if permissions & required_role == required_role:
                 return True
         raise HTTPException(status_code=403, detail="You do not have permission to perform this action")
 
     @staticmethod
     def hasRole(user: User, required_role: Role) -> bool:
-        return (user.user_type.permissions & required_role) == required_role
+        return (get_user_permissions(user) & required_role) == required_role
 
 class JudgeChecker:
     def __init__(self):
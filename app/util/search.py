@@ -0,0 +1,70 @@
+from typing import Any, List, Optional, Tuple
+from sqlalchemy import Float, func, or_
+from sqlalchemy.orm import Query
+
+from app.schemas import PaginationParams
+from app.util.pagination import Keyset
+
+_LIKE_SPECIAL = ("\\", "%", "_")
+_REGEX_SPECIAL = "\\.^$|?*+()[]{}"
+
+def _escape_like(term: str) -> str:
+    for char in _LIKE_SPECIAL:
+        term = term.replace(char, "\\" + char)
+    return term
+
+def _escape_regex(term: str) -> str:
+    return "".join("\\" + char if char in _REGEX_SPECIAL else char for char in term)
+
+class Search:
+    """
+    Text search over some columns, served by their pg_trgm GIN indexes
+
+    A term ending with `*` is a prefix search (words starting with the term),
+    otherwise the term can appear anywhere. Results are ranked by trigram word similarity.
+
+    Attributes:
+        term (str): The searched text, without the prefix marker
+        prefix (bool): Whether the term is a word prefix
+        columns (tuple): The searched columns
+    """
+    term: str
+    prefix: bool
+    columns: tuple
+
+    def __init__(self, term: str, *columns):
+        term = term.strip()
+        self.prefix = term.endswith("*")
+        self.term = term.rstrip("*").strip()
+        self.columns = columns
+
+    def clause(self):
+        """ The filter, either ILIKE '%term%' or a case insensitive word prefix regex (both use the trigram indexes) """
+        if self.prefix:
+            pattern = "\\m" + _escape_regex(self.term)
+            return or_(*(column.regexp_match(pattern, flags="i") for column in self.columns))
+
+        pattern = f"%{_escape_like(self.term)}%"
+        return or_(*(column.ilike(pattern, escape="\\") for column in self.columns))
+
+    def rank(self):
+        ranks = [func.word_similarity(self.term, func.coalesce(column, ""), type_=Float) for column in self.columns]
+        return func.greatest(*ranks, type_=Float) if len(ranks) > 1 else ranks[0]
+
+    def page(self, query: Query, pagination: PaginationParams, id_column) -> Tuple[List[Any], Optional[str]]:
+        """
+        Fetch a page of the (already filtered) query, best matches first
+
+        Args:
+            query (Query): the query of a single entity, filtered with clause()
+            pagination (PaginationParams): the pagination, the cursor holds the rank and the id of the last row
+            id_column: the primary key of the entity, to break ties
+
+        Returns:
+            Tuple[List, str]: the entities of the page and the next cursor
+        """
+        rank = self.rank()
+        keyset = Keyset(rank, id_column, descending=True)
+        rows = keyset.apply(query.add_columns(rank.label("search_rank")), pagination).all()
+        rows, next_cursor = keyset.page(rows, pagination, key=lambda row: (row.search_rank, getattr(row[0], id_column.key)))
+        return [row[0] for row in rows], next_cursor
@@ -0,0 +1,80 @@
+import asyncio
+from datetime import datetime
+from sqlalchemy import func, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.logger import get_logger
+from app.models.mapping import Contest, Problem, Statistic, Submission, User
+
+# counter -> the statement that recounts it, the counters mirror these exactly
+COUNTERS = {
+    "users": select(func.count()).select_from(User),
+    "problems": select(func.count()).select_from(Problem).filter(Problem.is_public == True),
+    "contests": select(func.count()).select_from(Contest),
+    "submissions": select(func.count()).select_from(Submission),
+}
+
+# only one process recounts at a time, the others skip the round
+_RECONCILE_LOCK = text("SELECT pg_try_advisory_xact_lock(hashtext('statistics_reconcile'))")
+
+def _increment_statement(name: str, delta: int):
+    if name not in COUNTERS:
+        raise ValueError(f"Unknown statistic {name}")
+    return update(Statistic).where(Statistic.name == name).values(value=Statistic.value + delta)
+
+def increment(session: Session, name: str, delta: int = 1):
+    """
+    Update a counter in the transaction of the session, so it is committed together with the change it counts
+
+    Args:
+        session (Session): the session of the change
+        name (str): the counter
+        delta (int): the change, negative on deletions
+    """
+    if delta:
+        session.execute(_increment_statement(name, delta))
+
+async def increment_async(session: AsyncSession, name: str, delta: int = 1):
+    """ Async counterpart of increment """
+    if delta:
+        await session.execute(_increment_statement(name, delta))
+
+async def read_statistics(session: AsyncSession) -> dict[str, int]:
+    """ The current value of every counter, 0 for the counters not reconciled yet """
+    values = dict((await session.execute(select(Statistic.name, Statistic.value))).all())
+    return {name: values.get(name, 0) for name in COUNTERS}
+
+async def reconcile(session: AsyncSession) -> bool:
+    """
+    Recount every counter from its table, fixing the drift left by the changes
+    that bypass the controllers (cascades, manual edits, concurrent recounts)
+
+    Returns:
+        bool: False when another process is already recounting
+    """
+    if not await session.scalar(_RECONCILE_LOCK):
+        await session.rollback()
+        return False
+
+    now = datetime.now()
+    for name, statement in COUNTERS.items():
+        value = await session.scalar(statement)
+        await session.execute(
+            insert(Statistic).values(name=name, value=value, reconciled_at=now)
+            .on_conflict_do_update(index_elements=[Statistic.name], set_={"value": value, "reconciled_at": now})
+        )
+    await session.commit()
+    return True
+
+async def reconcile_periodically(session_factory):
+    """ Recount the statistics every STATISTICS_RECONCILE_INTERVAL seconds, starting right away """
+    while True:
+        try:
+            async with session_factory() as session:
+                await reconcile(session)
+        except Exception as e:
+            get_logger().warning(f"Could not reconcile the statistics: {e}")
+        await asyncio.sleep(settings.STATISTICS_RECONCILE_INTERVAL)
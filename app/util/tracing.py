@@ -0,0 +1,259 @@
+"""
+Request scoped tracing: where the time of a request goes (database, queue, websockets, serialization)
+
+Every request gets a Trace (set by the logging middleware) and the instrumented calls add their
+spans to it, e.g.
+
+    with span("queue", "publish", queue="submissions"):
+        channel.basic_publish(...)
+
+The totals per kind end in the request_end log record. With TRACE_OTLP_URL set the spans of the
+sampled requests are also exported to an OpenTelemetry collector (OTLP/HTTP JSON), the trace id
+is the request id.
+"""
+import os
+import time
+import random
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+import requests
+from sqlalchemy import event
+
+from app.config import settings
+
+# the kinds reported in the summary of a request
+KINDS = ("db", "queue", "websocket", "serialization")
+
+# OTLP span kinds
+_SPAN_KIND_INTERNAL = 1
+_SPAN_KIND_SERVER = 2
+_SPAN_KIND_CLIENT = 3
+
+class Trace:
+    """
+    The spans of a request
+
+    Attributes:
+        trace_id (str): The request id as 32 hex digits
+        start_ns (int): The start of the request, in nanoseconds since the epoch
+        spans (list | None): The recorded spans, None when the request is not exported
+        totals (dict): kind -> [number of spans, total milliseconds]
+    """
+    trace_id: str
+    start_ns: int
+    spans: Optional[list]
+    totals: dict
+
+    def __init__(self, request_id: str, record_spans: bool):
+        self.trace_id = request_id.replace("-", "")
+        self.start_ns = time.time_ns()
+        self.spans = [] if record_spans else None
+        self.totals = {kind: [0, 0.0] for kind in KINDS}
+
+    def add(self, kind: str, name: str, start_ns: int, end_ns: int, attributes: dict):
+        total = self.totals[kind]
+        total[0] += 1
+        total[1] += (end_ns - start_ns) / 1_000_000
+        if self.spans is not None and len(self.spans) < settings.TRACE_MAX_SPANS:
+            self.spans.append((kind, name, start_ns, end_ns, attributes))
+
+    def summary(self) -> dict:
+        """ Number and milliseconds of the spans of every kind, for the request log """
+        summary = {}
+        for kind, (count, ms) in self.totals.items():
+            summary[f"{kind}_count"] = count
+            summary[f"{kind}_ms"] = round(ms, 2)
+        return summary
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+@contextmanager
+def tracing(request_id: str):
+    """ Collect the spans of the block (a request) in a new Trace """
+    record = bool(settings.TRACE_OTLP_URL) and random.random() < settings.TRACE_SAMPLE_RATE
+    trace = Trace(request_id, record)
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+@contextmanager
+def span(kind: str, name: str, **attributes):
+    """ Time the block as a span of the current request, nothing is recorded outside a request """
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.time_ns()
+    try:
+        yield
+    finally:
+        trace.add(kind, name, start, time.time_ns(), attributes)
+
+def trace_engine(engine):
+    """ Record a span for every statement executed by the engine (sync or async) during a request """
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_execute(connection, cursor, statement, parameters, context, executemany):
+        if _trace.get() is not None:
+            context._trace_start = time.time_ns()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_execute(connection, cursor, statement, parameters, context, executemany):
+        trace = _trace.get()
+        start = getattr(context, "_trace_start", None)
+        if trace is not None and start is not None:
+            trace.add("db", statement.split(None, 1)[0].upper() if statement else "SQL", start, time.time_ns(),
+                      {"db.statement": statement[:500]})
+
+def instrument_serialization():
+    """ Record the validation and serialization of the response models as spans """
+    import fastapi.routing
+
+    serialize_response = fastapi.routing.serialize_response
+    if getattr(serialize_response, "_traced", False):
+        return
+
+    async def traced_serialize_response(**kwargs):
+        field = kwargs.get("field")
+        with span("serialization", "serialize_response", model=str(field.type_) if field is not None else ""):
+            return await serialize_response(**kwargs)
+
+    traced_serialize_response._traced = True
+    fastapi.routing.serialize_response = traced_serialize_response
+
+def _attributes(attributes: dict) -> list:
+    values = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            values.append({"key": key, "value": {"boolValue": value}})
+        elif isinstance(value, int):
+            values.append({"key": key, "value": {"intValue": str(value)}})
+        elif isinstance(value, float):
+            values.append({"key": key, "value": {"doubleValue": value}})
+        else:
+            values.append({"key": key, "value": {"stringValue": str(value)}})
+    return values
+
+def _span_id() -> str:
+    return os.urandom(8).hex()
+
+def otlp_spans(trace: Trace, name: str, attributes: dict, end_ns: int) -> list:
+    """ The spans of a finished trace in the OTLP JSON encoding, under a root span for the request """
+    root_id = _span_id()
+    spans = [{
+        "traceId": trace.trace_id,
+        "spanId": root_id,
+        "name": name,
+        "kind": _SPAN_KIND_SERVER,
+        "startTimeUnixNano": str(trace.start_ns),
+        "endTimeUnixNano": str(end_ns),
+        "attributes": _attributes(attributes),
+    }]
+    for kind, span_name, start_ns, span_end_ns, span_attributes in trace.spans or ():
+        spans.append({
+            "traceId": trace.trace_id,
+            "spanId": _span_id(),
+            "parentSpanId": root_id,
+            "name": f"{kind} {span_name}",
+            "kind": _SPAN_KIND_INTERNAL if kind == "serialization" else _SPAN_KIND_CLIENT,
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(span_end_ns),
+            "attributes": _attributes({"kind": kind, **span_attributes}),
+        })
+    return spans
+
+class OtlpExporter:
+    """
+    Sends the spans to an OpenTelemetry collector from a background thread, every interval seconds.
+    Above queue_size pending spans the oldest are dropped, a failed export is not retried.
+
+    Attributes:
+        url (str): The OTLP/HTTP traces endpoint, e.g. http://localhost:4318/v1/traces
+        service_name (str): The service.name of the spans
+        exported (int): Spans accepted by the collector
+        dropped (int): Spans dropped because the queue was full or the export failed
+    """
+    url: str
+    service_name: str
+    exported: int
+    dropped: int
+
+    def __init__(self, url: str, service_name: str, interval: float = 5.0, queue_size: int = 10000, timeout: float = 5.0):
+        self.url = url
+        self.service_name = service_name
+        self.interval = interval
+        self.timeout = timeout
+        self.exported = 0
+        self.dropped = 0
+        self._queue: deque = deque(maxlen=queue_size)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._session = requests.Session()
+        self._thread = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, spans: list):
+        with self._lock:
+            overflow = len(self._queue) + len(spans) - self._queue.maxlen
+            if overflow > 0:
+                self.dropped += overflow
+            self._queue.extend(spans)
+
+    def flush(self):
+        """ Send the pending spans now """
+        with self._lock:
+            spans = list(self._queue)
+            self._queue.clear()
+        if not spans:
+            return
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": _attributes({"service.name": self.service_name})},
+            "scopeSpans": [{"scope": {"name": "app.util.tracing"}, "spans": spans}],
+        }]}
+        try:
+            response = self._session.post(self.url, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            self.exported += len(spans)
+        except Exception:
+            self.dropped += len(spans)
+
+    def close(self):
+        self._stopped.set()
+        self._thread.join(self.timeout + 1)
+        self.flush()
+        self._session.close()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.flush()
+
+_exporter: Optional[OtlpExporter] = None
+_exporter_lock = threading.Lock()
+
+def get_exporter() -> Optional[OtlpExporter]:
+    """ The exporter of the process, None when TRACE_OTLP_URL is not set """
+    global _exporter
+    if not settings.TRACE_OTLP_URL:
+        return None
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = OtlpExporter(settings.TRACE_OTLP_URL, settings.APP_NAME, settings.TRACE_EXPORT_INTERVAL, settings.TRACE_QUEUE_SIZE)
+    return _exporter
+
+def finish_trace(trace: Trace, name: str, attributes: dict):
+    """ Export the spans of a recorded trace, once the request is over """
+    if trace.spans is None:
+        return
+    exporter = get_exporter()
+    if exporter is not None:
+        exporter.export(otlp_spans(trace, name, attributes, time.time_ns()))
@@ -0,0 +1,71 @@
+import csv
+import json
+import codecs
+from typing import AsyncIterator, Optional, Tuple
+
+# (row number, parsed row, parsing error)
+ParsedRow = Tuple[int, Optional[dict], Optional[str]]
+
+async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """
+    Split a byte stream (e.g. request.stream()) into text lines without buffering the whole body
+
+    Args:
+        stream (AsyncIterator[bytes]): the byte stream
+
+    Returns:
+        AsyncIterator[str]: the lines, without the line terminator
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in stream:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+async def iter_csv_rows(stream: AsyncIterator[bytes]) -> AsyncIterator[ParsedRow]:
+    """
+    Parse a streamed CSV file with a header line (fields containing newlines are not supported)
+    """
+    header = None
+    row_number = 0
+    async for line in iter_lines(stream):
+        if not line.strip():
+            continue
+
+        values = next(csv.reader([line]))
+        if header is None:
+            header = [value.strip().lower() for value in values]
+            continue
+
+        row_number += 1
+        if len(values) != len(header):
+            yield row_number, None, f"Expected {len(header)} fields, got {len(values)}"
+            continue
+        yield row_number, dict(zip(header, values)), None
+
+async def iter_json_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[ParsedRow]:
+    """
+    Parse a streamed JSON lines file (one object per line)
+    """
+    row_number = 0
+    async for line in iter_lines(stream):
+        if not line.strip():
+            continue
+
+        row_number += 1
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield row_number, None, f"Invalid JSON: {e.msg}"
+            continue
+
+        if not isinstance(data, dict):
+            yield row_number, None, "Expected a JSON object"
+            continue
+        yield row_number, data, None
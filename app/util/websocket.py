@@ -1,5 +1,8 @@
 from fastapi import WebSocket
 
+from app.util.metrics import WEBSOCKET_CONNECTIONS, WEBSOCKET_MESSAGES
+from app.util.tracing import span
+
 class WebsocketManager:
     connections: dict[int, list[WebSocket]]
 
@@ -12,6 +15,7 @@ class WebsocketManager:
 
         await websocket.accept()
         self.connections[client_id].append(websocket)
+        WEBSOCKET_CONNECTIONS.inc()
 
     async def send_message(self, client_id: int, message: object):
         if client_id not in self.connections:
@@ -23,28 +27,44 @@ class WebsocketManager:
         for connection in self.connections[client_id]:
             try:
                 print(connection.client_state)
-                await connection.send_json(message)
+                with span("websocket", "send", client_id=client_id):
+                    await connection.send_json(message)
+                WEBSOCKET_MESSAGES.labels(status="sent").inc()
             except Exception as e:
                 print(e)
+                WEBSOCKET_MESSAGES.labels(status="failed").inc()
                 failed_connections.append(connection)
 
         # Remove failed connections after iteration
         for connection in failed_connections:
             self.connections[client_id].remove(connection)
+            WEBSOCKET_CONNECTIONS.dec()
 
     async def broadcast(self, data: object):
         for client_id in self.connections:
             for i in range(len(self.connections[client_id])):
                 connection = self.connections[client_id][i]
                 try:
-                    await connection.send_json(data)
+                    with span("websocket", "broadcast", client_id=client_id):
+                        await connection.send_json(data)
+                    WEBSOCKET_MESSAGES.labels(status="sent").inc()
                 except Exception:
+                    WEBSOCKET_MESSAGES.labels(status="failed").inc()
                     self.connections[client_id].pop(i)
+                    WEBSOCKET_CONNECTIONS.dec()
+
+    def remove(self, websocket: WebSocket, client_id: int):
+        """ Forget a connection closed by the client """
+        connections = self.connections.get(client_id, [])
+        if websocket in connections:
+            connections.remove(websocket)
+            WEBSOCKET_CONNECTIONS.dec()
 
     async def disconnect(self, client_id: int):
         if client_id in self.connections:
             for connection in self.connections[client_id]:
                 await connection.close()
+            WEBSOCKET_CONNECTIONS.dec(len(self.connections[client_id]))
             del self.connections[client_id]
 
 websocket_manager = WebsocketManager()
\ No newline at end of file
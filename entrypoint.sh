@@ -3,4 +3,10 @@ python manage.py migrate
 
 python manage.py loaddata
 
+# the multiprocess metrics of the previous run are stale
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
 exec uvicorn main:app --host 0.0.0.0 --port 9000
\ No newline at end of file
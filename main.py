@@ -1,13 +1,49 @@
 import uvicorn
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 from app.logger import LoggingMiddleware, get_logger
-from app.routers import auth, contest, problem, submission, user, general, judge
-from app.routers.admin import contest as contest_admin, problem as problem_admin, user as user_admin, judge as judge_admin
+from app.routers import auth, contest, problem, submission, user, general, judge, metrics
+from app.routers.admin import contest as contest_admin, problem as problem_admin, user as user_admin, judge as judge_admin, metrics as metrics_admin
 from app.config import settings
+from app.database import async_engine, async_replica_engine, AsyncSessionLocal
+from app.util.guest import refresh_guest_principal
+from app.util.permissions import refresh_permissions
+from app.util.pwd import password_hasher
+from app.util.statistics import reconcile_periodically
+from app.util.tracing import instrument_serialization, get_exporter
+from app.util.metrics import mark_process_dead
 
-app = FastAPI(title="ByteBlitz", description="API for ByteBlitz", version="0.1")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # resolve the guest principal and the user type permissions once,
+    # anonymous requests and role checks are served from memory
+    try:
+        refresh_guest_principal()
+        refresh_permissions()
+    except Exception as e:
+        get_logger().warning(f"Could not load the identity caches at startup, they will be loaded on first use: {e}")
+    # the dashboard counters drift with the cascades, recount them now and then
+    reconciler = asyncio.create_task(reconcile_periodically(AsyncSessionLocal))
+    yield
+    reconciler.cancel()
+    password_hasher.shutdown()
+    await async_engine.dispose()
+    if async_replica_engine is not None:
+        await async_replica_engine.dispose()
+    exporter = get_exporter()
+    if exporter is not None:
+        exporter.close()
+    mark_process_dead()
+
+
+# the response model serialization is timed as a span of the request
+instrument_serialization()
+
+app = FastAPI(title="ByteBlitz", description="API for ByteBlitz", version="0.1", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -35,10 +71,14 @@ app.include_router(contest_admin.router)
 app.include_router(problem_admin.router)
 app.include_router(user_admin.router)
 app.include_router(judge_admin.router)
+app.include_router(metrics_admin.router)
 
 # judge routers
 app.include_router(judge.router)
 
+# prometheus scrape endpoint
+app.include_router(metrics.router)
+
 
 @app.get("/")
 async def root(logger = Depends(get_logger)):
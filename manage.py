@@ -1,3 +1,7 @@
+import os
+# selects the connection pool sizes, before the settings are loaded
+os.environ.setdefault("PROCESS_ROLE", "worker")
+
 import click
 from sqlalchemy_utils import create_database, database_exists, drop_database
 from sqlalchemy.orm import Session
@@ -39,6 +43,54 @@ def migrate():
     except Exception as e:
         click.echo(f"Error: {e}")
 
+@cli.command()
+@click.option("--batch", default=500, show_default=True, help="Test cases per transaction")
+def moveblobs(batch):
+    """ Move the test case files still stored inline in the database to the blob store """
+    from sqlalchemy import select
+    from sqlalchemy.orm import undefer
+    from app.models.mapping import ProblemTestCase
+    from app.util.blob_store import blob_store
+
+    moved = 0
+    with Session(engine) as session:
+        while True:
+            test_cases = session.scalars(
+                select(ProblemTestCase)
+                .options(undefer(ProblemTestCase.input), undefer(ProblemTestCase.output))
+                .filter((ProblemTestCase.input != None) | (ProblemTestCase.output != None))
+                .order_by(ProblemTestCase.id).limit(batch)
+            ).all()
+            if not test_cases:
+                break
+            for test_case in test_cases:
+                if test_case.input is not None:
+                    test_case.input_hash, test_case.input_size = blob_store.put_text(test_case.input)
+                    test_case.input = None
+                if test_case.output is not None:
+                    test_case.output_hash, test_case.output_size = blob_store.put_text(test_case.output)
+                    test_case.output = None
+            session.commit()
+            moved += len(test_cases)
+            click.echo(f"{moved} test cases moved")
+    click.echo("Test case files moved successfully")
+
+@cli.command()
+@click.option("--min-age", default=3600, show_default=True, help="Seconds, the newer blobs are kept")
+def gcblobs(min_age):
+    """ Delete the blobs no longer referenced by a test case """
+    from sqlalchemy import select, union
+    from app.models.mapping import ProblemTestCase
+    from app.util.blob_store import blob_store
+
+    with Session(engine) as session:
+        referenced = set(session.scalars(union(
+            select(ProblemTestCase.input_hash).filter(ProblemTestCase.input_hash != None),
+            select(ProblemTestCase.output_hash).filter(ProblemTestCase.output_hash != None),
+        )))
+    deleted = blob_store.collect(referenced, min_age)
+    click.echo(f"{deleted} blobs deleted")
+
 @cli.command()
 def loaddata():
     """ Load the necessary data """
@@ -215,6 +267,37 @@ def loaddata():
 
     click.echo("Data loaded successfully")
 
+@cli.command()
+@click.option("--users", default=100_000, show_default=True)
+@click.option("--problems", default=5_000, show_default=True)
+@click.option("--contests", default=500, show_default=True)
+@click.option("--submissions", default=1_000_000, show_default=True)
+@click.option("--test-cases", default=10, show_default=True, help="Test cases per problem, and per submission")
+@click.option("--contest-users", default=200, show_default=True, help="Participants per contest")
+@click.option("--contest-problems", default=8, show_default=True, help="Problems per contest")
+@click.option("--contest-share", default=0.5, show_default=True, help="Share of the submissions made in a contest")
+@click.option("--seed", default=1, show_default=True)
+@click.option("--workers", default=os.cpu_count() or 1, show_default=True, help="Processes generating the chunks")
+def gendata(users, problems, contests, submissions, test_cases, contest_users, contest_problems, contest_share, seed, workers):
+    """ Generate a large synthetic dataset with COPY (after loaddata, on a throwaway database) """
+    from app.test.generator import generate, make_plan
+
+    try:
+        with Session(engine) as session:
+            plan = make_plan(session, seed, users, problems, contests, submissions, test_cases,
+                             contest_users, contest_problems, contest_share)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    # the workers open their own connections
+    engine.dispose()
+
+    click.echo(f"Generating {users} users, {problems} problems, {plan.contests} contests, "
+               f"{submissions} submissions with {submissions * test_cases} test cases...")
+    totals = generate(plan, workers, echo=click.echo)
+    for table, rows in totals.items():
+        click.echo(f"  {table}: {rows}")
+    click.echo("Data generated successfully")
+
 
 if __name__ == "__main__":
     cli()
\ No newline at end of file
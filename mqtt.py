@@ -1,9 +1,14 @@
+import os
+# selects the connection pool sizes, before the settings are loaded
+os.environ.setdefault("PROCESS_ROLE", "mqtt")
+
 import paho.mqtt.client as mqtt
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from app.connections.mqtt import MQTTClient
 from app.config import settings
 from app.controllers.mqtt import scoreboard, notification
+from app.util.metrics import start_metrics_server
 
 scheduler = BackgroundScheduler()
 
@@ -14,6 +19,8 @@ sc_intervals['scoreboard'] = IntervalTrigger(seconds=5)
 sc_intervals['notificaBerna'] = IntervalTrigger(seconds=10)
 
 def main():
+    start_metrics_server(settings.MQTT_METRICS_PORT)
+
     mqtt_client = MQTTClient("ByteBlitz", settings.MQTT_HOST, settings.MQTT_PORT, settings.MQTT_USER, settings.MQTT_PASS)
     mqtt_client.connect()
     mqtt_client.start()